@@ -147,6 +147,10 @@ rst_prolog = """
 .. |CM[i][j] = 1| replace:: :math:`CM_{i,j} = 1`
 .. |BigMip| replace:: :class:`pyphi.models.BigMip`
 .. |Concept| replace:: :class:`pyphi.models.Concept`
+.. |Constellation| replace:: :class:`pyphi.models.Constellation`
+.. |Network| replace:: :class:`pyphi.network.Network`
+.. |Subsystem| replace:: :class:`pyphi.subsystem.Subsystem`
+.. |Node| replace:: :class:`pyphi.node.Node`
 """
 
 # -- Options for Napoleon (docstring format extension) --------------------
@@ -54,6 +54,28 @@ You can download an example configuration file `here
 
 See the documentation for :mod:`pyphi.constants` for a description of the
 options and their defaults.
+
+
+Precomputation
+~~~~~~~~~~~~~~
+
+The parts of a calculation that don't depend on mechanisms can be computed and
+stored ahead of time with :func:`pyphi.precompute`, so that other processes
+start warm. See :mod:`pyphi.warmup`.
+
+
+Cache statistics
+~~~~~~~~~~~~~~~~
+
+The hit, miss, and eviction counts of PyPhi's caches can be inspected with
+:mod:`pyphi.cache_stats`.
+
+
+Archives
+~~~~~~~~
+
+Results can be stored in a compact, memory-mappable binary format with
+:mod:`pyphi.archive`.
 """
 
 __title__ = 'pyphi'
@@ -67,7 +89,8 @@ __copyright__ = 'Copyright 2014 Will Mayner'
 
 from .network import Network
 from .subsystem import Subsystem
-from . import compute, constants, config, db, examples
+from . import compute, constants, config, db, examples, cache_stats
+from .warmup import precompute
 
 import logging
 import logging.config
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# archive.py
+"""
+A binary file format for archives of results.
+
+The JSON representation of a |BigMip| (see :mod:`pyphi.json`) expands every
+repertoire to the whole network and writes it as nested lists of floats, which
+is large and slow to write and parse. An archive instead stores any number of
+|BigMip|, |Constellation|, and |Network| objects as:
+
+- blocks of raw NumPy array data, one per object (holding all of its
+  repertoires, in the compact encoding of :mod:`pyphi.serialize`) and one for
+  each array of each distinct network;
+- an index, written as JSON at the end of the file, describing the blocks and
+  the objects, including the summary of each |BigMip| (see
+  :func:`pyphi.serialize.summary`).
+
+Networks are stored once, however many objects refer to them, and states
+of a network share its arrays. Objects can be added one at a time, so
+archives of many results are written without keeping them in memory::
+
+    with archive.ArchiveWriter('results.pyphi') as writer:
+        for subsystem in subsystems:
+            writer.add(compute.big_mip(subsystem))
+
+When an archive is loaded, the file is memory-mapped by default, so only the
+index is read up front; each object is decoded (along with its subsystem and
+network) when it is accessed, and its repertoires are only read from disk when
+they are used::
+
+    with archive.load('results.pyphi') as results:
+        phis = [summary['phi'] for summary in results.summaries()]
+        big_mip = results[phis.index(max(phis))]
+
+The format is versioned; archives written with another version are not read.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from . import serialize
+from .models import BigMip, Constellation, Cut
+from .network import Network
+from .subsystem import Subsystem
+
+
+# The version of the archive format. Archives with a different version are not
+# read.
+FORMAT_VERSION = 1
+# The bytes that every archive starts and ends with.
+MAGIC = b'PYPHIARC'
+_HEADER = struct.Struct('>8sB')
+# The offset and length of the index, followed by the magic bytes.
+_TRAILER = struct.Struct('>QQ8s')
+# Blocks start at multiples of this many bytes.
+_ALIGNMENT = 64
+
+
+class ArchiveWriter:
+
+    """Writes objects to an archive file.
+
+    Use it as a context manager, or call :meth:`close` when done; the archive
+    can't be read until it is closed. If an exception escapes the context, the
+    index isn't written, so the incomplete archive can't be loaded.
+
+    Args:
+        filename (str): The file to write. It is overwritten if it exists.
+
+    Keyword Args:
+        float32 (bool): Whether to store repertoires in single precision.
+    """
+
+    def __init__(self, filename, float32=False):
+        self.dtype = np.float32 if float32 else np.float64
+        self._file = open(filename, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, FORMAT_VERSION))
+        self._blocks = []
+        self._records = []
+        self._networks = []
+        self._network_arrays = []
+        # Map network digests and states to their indices in the tables.
+        self._network_index = dict()
+        self._arrays_index = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def _add_block(self, array):
+        array = np.ascontiguousarray(array)
+        padding = -self._file.tell() % _ALIGNMENT
+        self._file.write(b'\0' * padding)
+        self._blocks.append({'offset': self._file.tell(),
+                             'dtype': array.dtype.str,
+                             'shape': array.shape})
+        self._file.write(array.tobytes())
+        return len(self._blocks) - 1
+
+    def _add_network(self, network):
+        digest = network._get_arrays_digest()
+        if digest not in self._arrays_index:
+            self._arrays_index[digest] = len(self._network_arrays)
+            self._network_arrays.append({
+                'tpm': self._add_block(network.tpm),
+                'connectivity_matrix': self._add_block(
+                    network.connectivity_matrix),
+                'perturb_vector': self._add_block(network.perturb_vector),
+            })
+        key = (digest, network.current_state, network.past_state)
+        if key not in self._network_index:
+            self._network_index[key] = len(self._networks)
+            self._networks.append({
+                'arrays': self._arrays_index[digest],
+                'current_state': network.current_state,
+                'past_state': network.past_state,
+            })
+        return self._network_index[key]
+
+    def _subsystem_record(self, subsystem):
+        if subsystem is None:
+            return {'network': None, 'node_indices': None, 'cut': None}
+        return {'network': self._add_network(subsystem.network),
+                'node_indices': subsystem.node_indices,
+                'cut': (None if subsystem.cut == subsystem.null_cut else
+                        tuple(subsystem.cut))}
+
+    def add(self, obj):
+        """Add a |BigMip|, |Constellation|, or |Network| to the archive.
+
+        Returns:
+            ``int`` -- The position of the object in the archive.
+
+        Raises:
+            TypeError: If the object is of another type.
+        """
+        arrays = serialize.ArrayWriter(self.dtype)
+        if isinstance(obj, BigMip):
+            record = self._subsystem_record(obj.subsystem)
+            record['value'] = serialize._encode_big_mip_into(obj, arrays)
+        elif isinstance(obj, Constellation):
+            record = self._subsystem_record(
+                obj[0].subsystem if obj else None)
+            record['value'] = serialize._encode_constellation(obj, arrays)
+        elif isinstance(obj, Network):
+            record = {'network': self._add_network(obj)}
+        else:
+            raise TypeError('Cannot archive objects of type '
+                            '{}.'.format(type(obj).__name__))
+        record['type'] = type(obj).__name__
+        if arrays.arrays:
+            record['data'] = self._add_block(arrays.data())
+        self._records.append(record)
+        return len(self._records) - 1
+
+    def close(self):
+        """Write the index and close the file."""
+        if self._file.closed:
+            return
+        index = json.dumps({
+            'blocks': self._blocks,
+            'networks': self._networks,
+            'network_arrays': self._network_arrays,
+            'records': self._records,
+        }, default=_json_default).encode('utf-8')
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(_TRAILER.pack(offset, len(index), MAGIC))
+        self._file.close()
+
+
+def _json_default(obj):
+    # Indices and states may be NumPy scalars.
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
+def save(filename, objects, float32=False):
+    """Write objects to an archive file.
+
+    Args:
+        filename (str): The file to write.
+        objects (Iterable): The |BigMip|, |Constellation|, and |Network|
+            objects to archive.
+
+    Keyword Args:
+        float32 (bool): Whether to store repertoires in single precision.
+
+    Returns:
+        ``int`` -- The number of objects written.
+    """
+    with ArchiveWriter(filename, float32=float32) as writer:
+        for obj in objects:
+            writer.add(obj)
+    return len(writer._records)
+
+
+def _tuples(obj):
+    """Convert the lists in an object loaded from JSON back to tuples."""
+    if isinstance(obj, list):
+        return tuple(_tuples(item) for item in obj)
+    if isinstance(obj, dict):
+        return {key: _tuples(value) for key, value in obj.items()}
+    return obj
+
+
+class Archive:
+
+    """An archive file opened for reading (see :func:`load`).
+
+    Objects are decoded when they are accessed by position, with
+    ``archive[i]``, or by iterating over the archive. Subsystems and networks
+    are only created once for all the objects that refer to them.
+
+    Use it as a context manager, or call :meth:`close` when done. Objects
+    decoded from a memory-mapped archive may refer to the file's data, so it is
+    only unmapped once they are no longer used.
+    """
+
+    def __init__(self, filename, mmap=True):
+        if mmap:
+            self._buffer = np.memmap(filename, dtype=np.uint8, mode='r')
+        else:
+            self._buffer = np.fromfile(filename, dtype=np.uint8)
+        magic, version = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise serialize.FormatError('{} is not a PyPhi '
+                                        'archive.'.format(filename))
+        if version != FORMAT_VERSION:
+            raise serialize.FormatError(
+                'Cannot read archive format version {} (expected '
+                '{}).'.format(version, FORMAT_VERSION))
+        offset, length, magic = _TRAILER.unpack_from(
+            self._buffer, len(self._buffer) - _TRAILER.size)
+        if magic != MAGIC:
+            raise serialize.FormatError('{} is incomplete; was it '
+                                        'closed?'.format(filename))
+        index = json.loads(
+            self._buffer[offset:offset + length].tobytes().decode('utf-8'))
+        index = _tuples(index)
+        self._blocks = index['blocks']
+        self._networks = index['networks']
+        self._network_arrays = index['network_arrays']
+        self._records = index['records']
+        self._network_cache = dict()
+        self._subsystem_cache = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the archive's data. Objects can't be decoded afterwards."""
+        self._buffer = None
+        self._network_cache.clear()
+        self._subsystem_cache.clear()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, i):
+        return self._decode(self._records[i])
+
+    def __iter__(self):
+        for record in self._records:
+            yield self._decode(record)
+
+    def types(self):
+        """Return the type name of each object in the archive."""
+        return [record['type'] for record in self._records]
+
+    def summaries(self):
+        """Return the summary of each object, without decoding it.
+
+        Returns:
+            ``list(dict)`` -- The summary of each |BigMip| (see
+            :func:`pyphi.serialize.summary`), or ``None`` for other objects.
+        """
+        return [record['value']['summary'] if record['type'] == 'BigMip'
+                else None for record in self._records]
+
+    def _block(self, i):
+        if self._buffer is None:
+            raise ValueError('The archive is closed.')
+        block = self._blocks[i]
+        dtype = np.dtype(block['dtype'])
+        size = int(np.prod(block['shape'], dtype=int)) * dtype.itemsize
+        offset = block['offset']
+        return (self._buffer[offset:offset + size].view(dtype)
+                .reshape(block['shape']))
+
+    def network(self, i):
+        """Return the network at position ``i`` of the network table."""
+        if i not in self._network_cache:
+            entry = self._networks[i]
+            arrays = {name: self._block(block) for name, block in
+                      self._network_arrays[entry['arrays']].items()}
+            # Networks with the same arrays share their caches.
+            same_arrays = [network for j, network in
+                           self._network_cache.items()
+                           if self._networks[j]['arrays'] == entry['arrays']]
+            if same_arrays:
+                network = same_arrays[0].with_state(entry['current_state'],
+                                                    entry['past_state'])
+            else:
+                network = Network(
+                    arrays['tpm'], entry['current_state'],
+                    entry['past_state'],
+                    connectivity_matrix=arrays['connectivity_matrix'],
+                    perturb_vector=arrays['perturb_vector'])
+            self._network_cache[i] = network
+        return self._network_cache[i]
+
+    def _subsystem(self, record):
+        if record['network'] is None:
+            return None
+        key = (record['network'], record['node_indices'], record['cut'])
+        if key not in self._subsystem_cache:
+            cut = None if record['cut'] is None else Cut(*record['cut'])
+            self._subsystem_cache[key] = Subsystem(
+                record['node_indices'], self.network(record['network']),
+                cut=cut)
+        return self._subsystem_cache[key]
+
+    def _decode(self, record):
+        if record['type'] == 'Network':
+            return self.network(record['network'])
+        data = (self._block(record['data']) if 'data' in record else
+                np.empty(0))
+        subsystem = self._subsystem(record)
+        if record['type'] == 'BigMip':
+            return serialize._decode_big_mip_from(record['value'], data,
+                                                  subsystem)
+        if subsystem is None:
+            return Constellation()
+        return serialize._decode_constellation(record['value'], data,
+                                               subsystem)
+
+
+def load(filename, mmap=True):
+    """Open an archive file for reading.
+
+    Args:
+        filename (str): The archive file.
+
+    Keyword Args:
+        mmap (bool): Whether to memory-map the file, so that repertoires are
+            only read from disk when they are used.
+
+    Returns:
+        ``Archive`` -- The archive.
+
+    Raises:
+        FormatError: If the file isn't a complete archive of this format
+            version.
+    """
+    return Archive(filename, mmap=mmap)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# cache_namespace.py
+"""
+Namespaces that separate cached values computed with different settings.
+
+Cached values are only valid for the settings they were computed with. Every
+persistent cache is therefore divided into namespaces, one for each
+combination of the settings that affect results, the version of PyPhi, and the
+version of the encoding of cached values (see :mod:`pyphi.serialize`). Values
+are only ever looked up in the namespace of the current settings, so settings
+can be changed without invalidating the values cached with other settings.
+
+The namespace is part of every database key and is a subdirectory of
+``PERSISTENT_CACHE_DIRECTORY`` for the filesystem cache. The namespaces in the
+current caching backend can be listed with :func:`namespaces` and the ones no
+longer needed removed with :func:`prune`. This can also be done from the
+command line::
+
+    python -m pyphi.cache_namespace list
+    python -m pyphi.cache_namespace prune
+"""
+
+import argparse
+import json
+import os
+import shutil
+from collections import OrderedDict
+
+from . import __version__, config, constants, utils
+
+
+# The settings that affect the results of computations.
+RESULT_SETTINGS = ('PRECISION', 'SINGLE_NODES_WITH_SELFLOOPS_HAVE_PHI',
+                   'NORMALIZE_TPMS')
+# The namespace of values cached before namespaces were introduced.
+LEGACY = ''
+# The name of the file (or key suffix) the fingerprint of a namespace is
+# recorded in.
+_FINGERPRINT = 'fingerprint'
+
+
+def fingerprint():
+    """Return the settings and versions that identify the current namespace.
+
+    Returns:
+        ``OrderedDict`` -- The values of the settings in
+        :data:`RESULT_SETTINGS`, whether repertoires are stored in single
+        precision, the PyPhi version, and the encoding format version.
+    """
+    # Import here to avoid a circular import.
+    from .serialize import FORMAT_VERSION
+    settings = OrderedDict((name, getattr(config, name))
+                           for name in RESULT_SETTINGS)
+    settings['float32'] = config.CACHE_ENCODING['float32']
+    settings['version'] = __version__
+    settings['format_version'] = FORMAT_VERSION
+    return settings
+
+
+def current():
+    """Return the name of the namespace of the current settings."""
+    return utils.stable_hash(fingerprint())[:16]
+
+
+def key(name, namespace=None):
+    """Return a database key in a namespace.
+
+    Args:
+        name (str): The key within the namespace.
+
+    Keyword Args:
+        namespace (str): The namespace. Defaults to the current one.
+    """
+    return '{}:{}'.format(current() if namespace is None else namespace, name)
+
+
+def namespace_of(key):
+    """Return the namespace of a database key."""
+    key = str(key)
+    return key.split(':', 1)[0] if ':' in key else LEGACY
+
+
+def fingerprint_key(namespace=None):
+    """Return the database key the fingerprint of a namespace is stored
+    with."""
+    return key(_FINGERPRINT, namespace)
+
+
+# The namespaces whose fingerprint each store has recorded in this process.
+_recorded = set()
+
+
+def new_fingerprints(store, keys):
+    """Return the fingerprint entries a store should write along with values
+    with the given keys.
+
+    The fingerprint of the current namespace is recorded the first time a
+    store writes a value in it in each process, so that :func:`namespaces` can
+    describe it. Once the entries have been written, the store must call
+    :func:`fingerprints_written`; until then, they are returned again.
+
+    Args:
+        store (str): The name of the store.
+        keys (Iterable): The keys of the values being written.
+
+    Returns:
+        ``list(tuple)`` -- Pairs of keys and values to write.
+    """
+    namespace = current()
+    if ((store, namespace) in _recorded or
+            not any(namespace_of(k) == namespace for k in keys)):
+        return []
+    return [(fingerprint_key(namespace), fingerprint())]
+
+
+def fingerprints_written(store, entries):
+    """Record that a store has written the entries returned by
+    :func:`new_fingerprints`."""
+    _recorded.update((store, namespace_of(k)) for k, _ in entries)
+
+
+def forget_fingerprints(store):
+    """Forget which fingerprints a store has recorded, so that they are
+    recorded again (*e.g.* after the store is cleared)."""
+    _recorded.difference_update({item for item in _recorded
+                                 if item[0] == store})
+
+
+def record_fingerprint(directory):
+    """Record the current fingerprint in a namespace directory of the
+    filesystem cache, if it isn't there already."""
+    filename = os.path.join(directory, _FINGERPRINT + '.json')
+    if not os.path.exists(filename):
+        os.makedirs(directory, exist_ok=True)
+        with open(filename, 'w') as f:
+            json.dump(fingerprint(), f, indent=2)
+
+
+def _filesystem_namespaces():
+    root = config.PERSISTENT_CACHE_DIRECTORY
+    found = OrderedDict()
+    if not os.path.isdir(root):
+        return found
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if name == 'joblib':
+            # Cached before namespaces were introduced. The directory itself
+            # is always created, so only count it if it isn't empty.
+            if os.listdir(path):
+                found[LEGACY] = None
+        elif os.path.isdir(os.path.join(path, 'joblib')):
+            filename = os.path.join(path, _FINGERPRINT + '.json')
+            fingerprint = None
+            if os.path.exists(filename):
+                with open(filename) as f:
+                    fingerprint = json.load(f,
+                                            object_pairs_hook=OrderedDict)
+            found[name] = fingerprint
+    return found
+
+
+def _store():
+    # Import here to avoid a circular import.
+    from . import db, sqlite_db
+    return sqlite_db if config.CACHING_BACKEND == constants.SQLITE else db
+
+
+def namespaces():
+    """Return the namespaces in the current caching backend.
+
+    Returns:
+        ``OrderedDict`` -- A mapping from namespace names to their
+        fingerprints, or to ``None`` if the fingerprint wasn't recorded. Values
+        cached before namespaces were introduced are in the namespace
+        :data:`LEGACY`.
+    """
+    if config.CACHING_BACKEND == constants.FILESYSTEM:
+        return _filesystem_namespaces()
+    store = _store()
+    names = sorted(store.namespaces())
+    fingerprints = store.find_many([fingerprint_key(name) for name in names
+                                    if name != LEGACY])
+    return OrderedDict(
+        (name, fingerprints.get(fingerprint_key(name))) for name in names)
+
+
+def prune(keep=None):
+    """Remove all the namespaces in the current caching backend except the
+    given ones.
+
+    Keyword Args:
+        keep (Iterable(str)): The namespaces to keep. Defaults to the current
+            one.
+
+    Returns:
+        ``list(str)`` -- The namespaces that were removed.
+    """
+    keep = {current()} if keep is None else set(keep)
+    removed = [name for name in namespaces() if name not in keep]
+    for name in removed:
+        if config.CACHING_BACKEND == constants.FILESYSTEM:
+            shutil.rmtree(os.path.join(config.PERSISTENT_CACHE_DIRECTORY,
+                                       name or 'joblib'))
+        else:
+            _store().delete_namespace(name)
+    return removed
+
+
+def main(argv=None):
+    """List or prune the namespaces of the current caching backend."""
+    parser = argparse.ArgumentParser(
+        prog='python -m pyphi.cache_namespace',
+        description='List or prune the namespaces of the PyPhi cache.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('list', help='list the namespaces')
+    prune_parser = subparsers.add_parser(
+        'prune', help='remove all namespaces except the current one')
+    prune_parser.add_argument('--keep', nargs='*', default=[],
+                              help='other namespaces to keep')
+    args = parser.parse_args(argv)
+    if args.command == 'list':
+        for name, settings in namespaces().items():
+            marker = '*' if name == current() else ' '
+            print(marker, name or '(legacy)',
+                  '' if settings is None else json.dumps(settings))
+    elif args.command == 'prune':
+        for name in prune(keep=[current()] + args.keep):
+            print('removed', name or '(legacy)')
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
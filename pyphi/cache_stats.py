@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# cache_stats.py
+"""
+A registry of PyPhi's caches, with their hit, miss, and eviction counts, the
+number of entries they hold, and an estimate of the memory or disk space they
+use.
+
+Every cache registers itself here when it is created: the in-memory LRU-caches
+(see :mod:`pyphi.lru_cache`), the MICE cache used by |Subsystem| objects, the
+persistent |BigMip| cache (see :mod:`pyphi.memory`), and the concept cache (see
+:mod:`pyphi.concept_caching`).
+
+Statistics are read with :func:`snapshot`, and the change over a computation
+can be obtained by taking the difference of two snapshots with :func:`diff`:
+
+    >>> from pyphi import cache_stats
+    >>> before = cache_stats.snapshot()
+    >>> # ... run some computation ...
+    >>> delta = cache_stats.diff(before, cache_stats.snapshot())
+
+Alternatively, the counters can be set back to zero with :func:`reset` before a
+computation.
+"""
+
+import sys
+import threading
+from collections import namedtuple, OrderedDict
+import numpy as np
+
+
+_CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'size',
+                                        'nbytes'])
+
+
+class CacheStats(_CacheStats):
+
+    """Statistics for a single cache.
+
+    Attributes:
+        hits (int): The number of lookups that were served by the cache.
+        misses (int): The number of lookups that were not.
+        evictions (int): The number of entries removed to make room for new
+            ones.
+        size (int): The number of entries in the cache, or ``None`` if it
+            cannot be determined (*e.g.* if the database is unreachable).
+        nbytes (int): An estimate of the number of bytes used by the entries,
+            or ``None`` if it cannot be determined.
+    """
+
+    @property
+    def hit_rate(self):
+        """``float`` -- The fraction of lookups that were hits, or ``None`` if
+        there were no lookups."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+
+class Counter:
+
+    """Hit, miss, and eviction counts for a cache that manages its own
+    storage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def hit(self, n=1):
+        with self._lock:
+            self.hits += n
+
+    def miss(self, n=1):
+        with self._lock:
+            self.misses += n
+
+    def evict(self, n=1):
+        with self._lock:
+            self.evictions += n
+
+    def reset(self):
+        """Set all the counts back to zero."""
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self, size=None, nbytes=None):
+        """Return the counts as a :class:`CacheStats`, with the given size and
+        number of bytes."""
+        return CacheStats(self.hits, self.misses, self.evictions, size, nbytes)
+
+
+# Maps cache names to a tuple of callables ``(stats, reset, clear)``.
+_registry = OrderedDict()
+_registry_lock = threading.RLock()
+
+
+def register(name, stats, reset=None, clear=None):
+    """Register a cache.
+
+    Registering a cache under a name that is already in use replaces the
+    previous registration.
+
+    Args:
+        name (str): The name of the cache.
+        stats (function): A function of no arguments returning the current
+            :class:`CacheStats` of the cache.
+
+    Keyword Args:
+        reset (function): A function that sets the cache's counters back to
+            zero, without removing any entries.
+        clear (function): A function that removes all the cache's entries.
+    """
+    with _registry_lock:
+        _registry[name] = (stats, reset, clear)
+
+
+def unregister(name):
+    """Remove a cache from the registry."""
+    with _registry_lock:
+        _registry.pop(name, None)
+
+
+def names():
+    """Return the names of all registered caches."""
+    with _registry_lock:
+        return tuple(_registry.keys())
+
+
+def snapshot(*cache_names):
+    """Return the current statistics of the registered caches.
+
+    Args:
+        *cache_names (str): The caches to include. If none are given, all
+            registered caches are included.
+
+    Returns:
+        ``OrderedDict`` -- A mapping from cache names to :class:`CacheStats`.
+    """
+    with _registry_lock:
+        entries = [(name, _registry[name][0]) for name in
+                   (cache_names or _registry.keys()) if name in _registry]
+    return OrderedDict((name, stats()) for name, stats in entries)
+
+
+def _subtract(a, b):
+    if a is None or b is None:
+        return None
+    return a - b
+
+
+def diff(before, after):
+    """Return the change in cache statistics between two snapshots.
+
+    Hits, misses, and evictions are the number that occurred between the
+    snapshots; ``size`` and ``nbytes`` are the change in the number of entries
+    and bytes. Caches that were registered after the first snapshot was taken
+    are treated as if they were empty at that time.
+
+    Args:
+        before (dict): A snapshot returned by :func:`snapshot`.
+        after (dict): A later snapshot.
+
+    Returns:
+        ``OrderedDict`` -- A mapping from cache names to :class:`CacheStats`.
+    """
+    empty = CacheStats(0, 0, 0, 0, 0)
+    return OrderedDict(
+        (name, CacheStats(*(_subtract(a, b) for a, b in
+                            zip(stats, before.get(name, empty)))))
+        for name, stats in after.items())
+
+
+def reset(clear=False):
+    """Set the counters of all registered caches back to zero.
+
+    Keyword Args:
+        clear (bool): If ``True``, also remove all entries from the caches that
+            support it. Persistent caches are never cleared.
+    """
+    with _registry_lock:
+        entries = list(_registry.values())
+    for _, reset_counts, clear_entries in entries:
+        if reset_counts is not None:
+            reset_counts()
+        if clear and clear_entries is not None:
+            clear_entries()
+
+
+def format_snapshot(stats):
+    """Return a table of cache statistics as a string.
+
+    Args:
+        stats (dict): A snapshot or difference of snapshots.
+    """
+    def fmt(value):
+        return '-' if value is None else str(value)
+
+    header = ('cache', 'hits', 'misses', 'evictions', 'size', 'nbytes')
+    rows = [header] + [(name,) + tuple(fmt(v) for v in s)
+                       for name, s in stats.items()]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return '\n'.join(
+        '  '.join(cell.ljust(width) if i == 0 else cell.rjust(width)
+                  for i, (cell, width) in enumerate(zip(row, widths)))
+        for row in rows)
+
+
+def estimate_nbytes(obj):
+    """Return a rough estimate of the number of bytes used by an object.
+
+    NumPy arrays are counted by the size of their data, and tuples, lists,
+    sets, and dictionaries are counted recursively. Objects referenced more
+    than once are only counted once. The attributes of other objects are not
+    followed, so *e.g.* the subsystem referenced by a |Concept| is not
+    counted.
+    """
+    seen = set()
+
+    def estimate(o):
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+        if isinstance(o, np.ndarray):
+            return o.nbytes
+        size = sys.getsizeof(o)
+        if isinstance(o, dict):
+            size += sum(estimate(k) + estimate(v) for k, v in o.items())
+        elif isinstance(o, (tuple, list, set, frozenset)):
+            size += sum(estimate(item) for item in o)
+        return size
+
+    return estimate(obj)
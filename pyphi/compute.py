@@ -7,16 +7,21 @@ Methods for computing concepts, constellations, and integrated information of
 subsystems.
 """
 
+import contextlib
 import logging
 import functools
+import itertools
+import threading
+from collections import OrderedDict, defaultdict
 import numpy as np
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, cpu_count
 from scipy.sparse.csgraph import connected_components
 from scipy.sparse import csr_matrix
 
-from . import utils, constants, config, memory
-from .concept_caching import concept as _concept
-from .models import Concept, Cut, BigMip
+from . import utils, constants, config, convert, memory, symmetry
+from .concept_caching import (concept as _concept, concepts as _concepts,
+                              flush as _flush_concepts)
+from .models import Concept, Constellation, Cut, BigMip
 from .network import Network
 from .subsystem import Subsystem
 from .lru_cache import lru_cache
@@ -26,6 +31,37 @@ from .lru_cache import lru_cache
 log = logging.getLogger(__name__)
 
 
+class _WorkerState(threading.local):
+    # Whether this thread is running a job of a parallel loop.
+    active = False
+
+
+_worker = _WorkerState()
+
+
+def _parallel():
+    """Return a ``joblib.Parallel`` object for the configured number of
+    cores and backend."""
+    return Parallel(n_jobs=config.NUMBER_OF_CORES,
+                    verbose=config.PARALLEL_VERBOSITY,
+                    backend=config.PARALLEL_BACKEND)
+
+
+def _in_worker(function, *args):
+    """Call a function as a job of a parallel loop.
+
+    Jobs evaluate everything else sequentially: worker processes can't start
+    processes of their own, and nested thread pools would only oversubscribe
+    the cores. This is tracked per thread, rather than by changing the
+    configuration, since with the threading backend the jobs share it."""
+    active = _worker.active
+    _worker.active = True
+    try:
+        return function(*args)
+    finally:
+        _worker.active = active
+
+
 def concept(subsystem, mechanism):
     """Return the concept specified by the a mechanism within a subsytem.
 
@@ -42,12 +78,27 @@ def concept(subsystem, mechanism):
     .. note::
         The output can be persistently cached to avoid recomputation. This may
         be enabled in the configuration file---however, it is only available if
-        the caching backend is a database (not the filesystem). See the
-        documentation for :mod:`pyphi.concept_caching` and
-        :mod:`pyphi.constants`.
+        the caching backend is a database (MongoDB or SQLite, not the
+        filesystem). See the documentation for :mod:`pyphi.concept_caching`
+        and :mod:`pyphi.constants`.
     """
     # Pre-checks:
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    trivial_concept = _trivial_concept(subsystem, mechanism)
+    if trivial_concept is not None:
+        return trivial_concept
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    # Passed prechecks; pass it over to the concept caching logic if enabled.
+    # Concept caching is only available if the caching backend is a database.
+    if _caching_concepts():
+        return _concept(subsystem, mechanism)
+    else:
+        return subsystem.concept(mechanism)
+
+
+def _trivial_concept(subsystem, mechanism):
+    """Return the concept specified by a mechanism if it can be found without
+    any computation, or ``None`` otherwise."""
     # If the mechanism is empty, there is no concept.
     if not mechanism:
         return subsystem.null_concept
@@ -59,14 +110,57 @@ def concept(subsystem, mechanism):
             subsystem._any_connect_to_all(subsystem.nodes, mechanism)):
         return Concept(mechanism=mechanism, phi=0.0, cause=None, effect=None,
                        subsystem=subsystem)
-    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-    # Passed prechecks; pass it over to the concept caching logic if enabled.
-    # Concept caching is only available if the caching backend is a database.
-    if (config.CACHE_CONCEPTS and
-            config.CACHING_BACKEND == constants.DATABASE):
-        return _concept(subsystem, mechanism)
-    else:
-        return subsystem.concept(mechanism)
+    return None
+
+
+def _cached_concepts(subsystem, mechanisms):
+    """Return the concepts specified by several mechanisms, looking up and
+    storing those that need computing in the concept cache all at once."""
+    mechanisms = list(mechanisms)
+    concepts = [_trivial_concept(subsystem, mechanism)
+                for mechanism in mechanisms]
+    remaining = [i for i, c in enumerate(concepts) if c is None]
+    cached = _concepts(subsystem, [mechanisms[i] for i in remaining])
+    for i, c in zip(remaining, cached):
+        concepts[i] = c
+    # Store any concepts the caching backend has buffered, so they aren't lost
+    # if this is a worker process.
+    _flush_concepts()
+    return concepts
+
+
+def _compute_concepts(subsystem, mechanisms):
+    """Return the concepts specified by several mechanisms, using the concept
+    cache if it is enabled."""
+    if _caching_concepts():
+        return _cached_concepts(subsystem, mechanisms)
+    return [concept(subsystem, mechanism) for mechanism in mechanisms]
+
+
+def _parallel_concepts(subsystem, mechanisms):
+    """Return the concepts specified by several mechanisms, computing them in
+    parallel.
+
+    The mechanisms are dealt out to one job per core, so that each job gets
+    mechanisms of every size."""
+    mechanisms = list(mechanisms)
+    n_jobs = min(_number_of_jobs(config.NUMBER_OF_CORES), len(mechanisms))
+    if n_jobs < 2:
+        return _compute_concepts(subsystem, mechanisms)
+    chunks = _parallel()(
+        delayed(_in_worker)(_compute_concepts, subsystem,
+                            mechanisms[i::n_jobs])
+        for i in range(n_jobs))
+    concepts = [None] * len(mechanisms)
+    for i, chunk in enumerate(chunks):
+        concepts[i::n_jobs] = chunk
+    return concepts
+
+
+def _caching_concepts():
+    """Return whether concepts are cached."""
+    return (config.CACHE_CONCEPTS and
+            config.CACHING_BACKEND in (constants.DATABASE, constants.SQLITE))
 
 
 def constellation(subsystem):
@@ -77,12 +171,27 @@ def constellation(subsystem):
             constellation.
 
     Returns:
-        ``tuple(Concept)`` -- A tuple of all the Concepts in the constellation.
+        ``Constellation`` -- All the concepts in the constellation.
+
+    .. note::
+        If ``REUSE_SYMMETRIC_CONCEPTS`` is enabled, only one concept is
+        computed for each set of mechanisms related by a symmetry of the
+        subsystem. See :mod:`pyphi.symmetry`. If
+        ``PARALLEL_CONCEPT_EVALUATION`` is enabled, the concepts are computed
+        in parallel.
     """
-    concepts = [concept(subsystem, mechanism) for mechanism in
-                utils.powerset(subsystem.nodes)]
+    if config.PARALLEL_CONCEPT_EVALUATION and not _worker.active:
+        compute_concepts = functools.partial(_parallel_concepts, subsystem)
+    else:
+        compute_concepts = functools.partial(_compute_concepts, subsystem)
+    mechanisms = utils.powerset(subsystem.nodes)
+    if config.REUSE_SYMMETRIC_CONCEPTS:
+        concepts = symmetry.constellation_concepts(subsystem, mechanisms,
+                                                   compute_concepts)
+    else:
+        concepts = compute_concepts(mechanisms)
     # Filter out falsy concepts, i.e. those with effectively zero Phi.
-    return tuple(filter(None, concepts))
+    return Constellation(filter(None, concepts))
 
 
 @lru_cache(maxmem=config.MAXIMUM_CACHE_MEMORY_PERCENTAGE)
@@ -106,6 +215,58 @@ def concept_distance(c1, c2):
                           c2.expand_effect_repertoire())])
 
 
+def concept_distances(C1, C2):
+    """Return the distances between every pair of concepts in two sequences
+    of concepts in concept-space.
+
+    This gives the same result as :func:`concept_distance` for each pair, but
+    uses the expanded repertoire columns of the constellations and computes
+    the EMD once for each pair of distinct repertoires.
+
+    Args:
+        C1 (Iterable(Concept)): The first concepts.
+        C2 (Iterable(Concept)): The second concepts.
+
+    Returns:
+        ``np.ndarray`` -- The matrix whose entry |i,j| is the distance between
+        the |ith| concept in ``C1`` and the |jth| concept in ``C2``.
+    """
+    C1, C2 = _as_constellation(C1), _as_constellation(C2)
+    if not C1 or not C2:
+        return np.zeros((len(C1), len(C2)))
+    return (
+        utils.hamming_emd_matrix(C1.expanded_cause_repertoires,
+                                 C2.expanded_cause_repertoires) +
+        utils.hamming_emd_matrix(C1.expanded_effect_repertoires,
+                                 C2.expanded_effect_repertoires))
+
+
+def _as_constellation(concepts):
+    if isinstance(concepts, Constellation):
+        return concepts
+    return Constellation(concepts)
+
+
+def _concepts_only_in(C1, C2):
+    """Return the concepts in ``C1`` that aren't equal to any concept in
+    ``C2`` according to :meth:`Concept.emd_eq`.
+
+    Concepts are indexed by their fingerprint, so each concept is only
+    compared with the concepts that have the same fingerprint.
+
+    Returns:
+        ``Constellation`` -- The concepts, with the columns of ``C1`` that
+        have been computed.
+    """
+    C1 = _as_constellation(C1)
+    index = defaultdict(list)
+    for c2 in C2:
+        index[c2.fingerprint].append(c2)
+    return C1.take(
+        i for i, c1 in enumerate(C1)
+        if not any(c1.emd_eq(c2) for c2 in index[c1.fingerprint]))
+
+
 def _constellation_distance_simple(C1, C2, subsystem):
     """Return the distance between two constellations in concept-space,
     assuming the only difference between them is that some concepts have
@@ -113,9 +274,9 @@ def _constellation_distance_simple(C1, C2, subsystem):
     # Make C1 refer to the bigger constellation
     if len(C2) > len(C1):
         C1, C2 = C2, C1
-    destroyed = [c1 for c1 in C1 if not any(c1.emd_eq(c2) for c2 in C2)]
-    return sum(c.phi * concept_distance(c, subsystem.null_concept)
-               for c in destroyed)
+    destroyed = _concepts_only_in(C1, C2)
+    distances = concept_distances(destroyed, [subsystem.null_concept])
+    return float(np.dot(destroyed.phis, distances[:, 0]))
 
 
 def _constellation_distance_emd(unique_C1, unique_C2, subsystem):
@@ -124,13 +285,10 @@ def _constellation_distance_emd(unique_C1, unique_C2, subsystem):
     # We need the null concept to be the partitioned constellation, in case a
     # concept is destroyed by a cut (and needs to be moved to the null
     # concept).
-    unique_C2 = unique_C2 + [subsystem.null_concept]
+    unique_C2 = Constellation(unique_C2 + (subsystem.null_concept,))
     # Get the concept distances from the concepts in the unpartitioned
     # constellation to the partitioned constellation.
-    distances = np.array([
-        [concept_distance(i, j) for j in unique_C2]
-        for i in unique_C1
-    ])
+    distances = concept_distances(unique_C1, unique_C2)
     # Now we make the distance matrix.
     # It has blocks of zeros in the upper left and bottom right to make the
     # distance matrix square, and to ensure that we're only moving mass from
@@ -144,15 +302,15 @@ def _constellation_distance_emd(unique_C1, unique_C2, subsystem):
     distance_matrix[N:, :N] = distances.T
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     # Construct the two phi distributions.
-    d1 = [c.phi for c in unique_C1] + [0] * M
-    d2 = [0] * N + [c.phi for c in unique_C2]
+    d1 = np.concatenate([unique_C1.phis, np.zeros(M)])
+    d2 = np.concatenate([np.zeros(N), unique_C2.phis])
     # Calculate how much phi disappeared and assign it to the null concept (the
     # null concept is the last element in the second distribution).
-    d2[-1] = sum(d1) - sum(d2)
+    d2[-1] = d1.sum() - d2.sum()
     # The sum of the two signatures should be the same.
-    assert utils.phi_eq(sum(d1), sum(d2))
+    assert utils.phi_eq(d1.sum(), d2.sum())
     # Calculate!
-    return utils.emd(np.array(d1), np.array(d2), distance_matrix)
+    return utils.emd(d1, d2, distance_matrix)
 
 
 @lru_cache(maxmem=config.MAXIMUM_CACHE_MEMORY_PERCENTAGE)
@@ -160,8 +318,8 @@ def constellation_distance(C1, C2, subsystem):
     """Return the distance between two constellations in concept-space.
 
     Args:
-        C1 (tuple(Concept)): The first constellation.
-        C2 (tuple(Concept)): The second constellation.
+        C1 (Constellation): The first constellation.
+        C2 (Constellation): The second constellation.
         null_concept (Concept): The null concept of a candidate set, *i.e* the
             "origin" of the concept space in which the given constellations
             reside.
@@ -170,10 +328,8 @@ def constellation_distance(C1, C2, subsystem):
         ``float`` -- The distance between the two constellations in
         concept-space.
     """
-    concepts_only_in_C1 = [
-        c1 for c1 in C1 if not any(c1.emd_eq(c2) for c2 in C2)]
-    concepts_only_in_C2 = [
-        c2 for c2 in C2 if not any(c2.emd_eq(c1) for c1 in C1)]
+    concepts_only_in_C1 = _concepts_only_in(C1, C2)
+    concepts_only_in_C2 = _concepts_only_in(C2, C1)
     # If the only difference in the constellations is that some concepts
     # disappeared, then we don't need to use the EMD.
     if not concepts_only_in_C1 or not concepts_only_in_C2:
@@ -260,11 +416,9 @@ def _evaluate_partition(uncut_subsystem, partition,
     return min(forward_mip, backward_mip)
 
 
-# TODO document big_mip
-@memory.cache(ignore=["subsystem"])
-def _big_mip(cache_key, subsystem):
-    log.info("Calculating Phi data for " + str(subsystem) + "...")
-
+def _degenerate_mip(subsystem):
+    """Return the MIP of a subsystem if it can be found without computing any
+    constellations, or ``None`` otherwise."""
     # Special case for single-node subsystems.
     if len(subsystem) == 1:
         return _single_node_mip(subsystem)
@@ -286,6 +440,17 @@ def _big_mip(cache_key, subsystem):
     if num_components > 1:
         return _null_mip(subsystem)
     # =========================================================================
+    return None
+
+
+# TODO document big_mip
+@memory.cache(ignore=["subsystem"])
+def _big_mip(cache_key, subsystem):
+    log.info("Calculating Phi data for " + str(subsystem) + "...")
+
+    degenerate_mip = _degenerate_mip(subsystem)
+    if degenerate_mip is not None:
+        return degenerate_mip
 
     # The first bipartition is the null cut (trivial bipartition), so skip it.
     bipartitions = utils.bipartition(subsystem.node_indices)[1:]
@@ -294,13 +459,12 @@ def _big_mip(cache_key, subsystem):
     unpartitioned_constellation = constellation(subsystem)
     log.info("    Found unpartitioned constellation.")
 
-    if config.PARALLEL_CUT_EVALUATION:
+    if config.PARALLEL_CUT_EVALUATION and not _worker.active:
         # Parallel loop over all partitions, using the specified number of
         # cores.
-        mip_candidates = Parallel(n_jobs=(config.NUMBER_OF_CORES),
-                                  verbose=config.PARALLEL_VERBOSITY)(
-            delayed(_evaluate_partition)(subsystem, partition,
-                                         unpartitioned_constellation)
+        mip_candidates = _parallel()(
+            delayed(_in_worker)(_evaluate_partition, subsystem, partition,
+                                unpartitioned_constellation)
             for partition in bipartitions)
         result = min(mip_candidates)
     else:
@@ -322,9 +486,9 @@ def _big_mip(cache_key, subsystem):
     return result
 
 
-# Wrapper to ensure that the cache key is the native hash of the subsystem, so
+# Wrapper to ensure that the cache key is the stable hash of the subsystem, so
 # joblib doesn't mistakenly recompute things when the subsystem's MICE cache is
-# changed.
+# changed, and so cached results are found by other processes.
 @functools.wraps(_big_mip)
 def big_mip(subsystem):
     """Return the MIP of a subsystem.
@@ -337,7 +501,35 @@ def big_mip(subsystem):
         intermediate calculations. The top level contains the basic MIP
         information for the given subsystem. See :class:`models.BigMip`.
     """
-    return _big_mip(hash(subsystem), subsystem)
+    return _big_mip(utils.stable_hash(subsystem), subsystem)
+
+
+def big_mip_summary(subsystem):
+    """Return the summary of the cached MIP of a subsystem, without loading the
+    whole |BigMip| from the cache.
+
+    Args:
+        subsystem (Subsystem): The candidate set of nodes.
+
+    Returns:
+        ``dict`` -- The |big_phi| value, the node indices, the cut, and the
+        mechanisms and |small_phi| values of the concepts (see
+        :func:`pyphi.serialize.summary`), or ``None`` if the MIP isn't cached.
+    """
+    return memory.load_summary(_big_mip, utils.stable_hash(subsystem),
+                               subsystem)
+
+
+def cached_big_mip_summaries():
+    """Return the summaries of all the MIPs in the filesystem cache.
+
+    This doesn't load the cached |BigMip| objects, so it is fast even when the
+    cache is large. See :func:`big_mip_summary`.
+
+    Returns:
+        ``list(dict)`` -- The summaries.
+    """
+    return list(memory.cached_summaries(_big_mip))
 
 
 @lru_cache(maxmem=config.MAXIMUM_CACHE_MEMORY_PERCENTAGE)
@@ -346,15 +538,94 @@ def big_phi(subsystem):
     return big_mip(subsystem).phi
 
 
+def _complex_candidates(network):
+    """Return the node indices of the subsystems of a network that can have
+    positive |big_phi|, in the order of :func:`subsystems`.
+
+    A subsystem with more than one node can only have positive |big_phi| if it
+    is strongly connected, since otherwise some unidirectional cut severs no
+    connections. A strongly connected set of nodes lies within a single
+    strongly connected component of the network, so the subsets that span
+    several components are discarded without examining them."""
+    cm = network.connectivity_matrix
+    _, components = connected_components(csr_matrix(cm), connection='strong')
+    candidates = []
+    for subset in utils.powerset(network.node_indices):
+        if not subset or len(set(components[list(subset)])) > 1:
+            continue
+        if len(subset) > 1:
+            num_components, _ = connected_components(
+                csr_matrix(cm[np.ix_(subset, subset)]), connection='strong')
+            if num_components > 1:
+                continue
+        candidates.append(subset)
+    return candidates
+
+
+def _candidate_mips(network):
+    """Return the MIPs of the subsystems returned by
+    :func:`_complex_candidates`, keyed by their node indices.
+
+    The largest subsystems are evaluated first. If
+    ``PARALLEL_COMPLEX_EVALUATION`` is enabled, the subsystems with at least as
+    many cuts as there are cores are evaluated one at a time (with their cuts
+    in parallel if ``PARALLEL_CUT_EVALUATION`` is enabled), and the others
+    are evaluated concurrently, one per core."""
+    candidates = [Subsystem(subset, network)
+                  for subset in _complex_candidates(network)]
+    # Schedule the largest subsystems first, so that the longest jobs don't
+    # start last.
+    scheduled = sorted(candidates, key=len, reverse=True)
+    n_jobs = _number_of_jobs(config.NUMBER_OF_CORES)
+    sequential, concurrent = [], []
+    for subsystem in scheduled:
+        if config.PARALLEL_COMPLEX_EVALUATION and (
+                not config.PARALLEL_CUT_EVALUATION or
+                2 ** (len(subsystem) - 1) - 1 < n_jobs):
+            concurrent.append(subsystem)
+        else:
+            sequential.append(subsystem)
+    log.info("Evaluating {} of the {} subsystems of {}...".format(
+        len(candidates), 2 ** network.size, network))
+    mips = dict()
+    for i, subsystem in enumerate(sequential):
+        mips[subsystem.node_indices] = big_mip(subsystem)
+        log.info("    [{} of {}] Evaluated {}.".format(
+            i + 1, len(candidates), subsystem))
+    if concurrent:
+        log.info("    Evaluating {} subsystems concurrently...".format(
+            len(concurrent)))
+        results = _parallel()(
+            delayed(_in_worker)(big_mip, subsystem)
+            for subsystem in concurrent)
+        for subsystem, mip in zip(concurrent, results):
+            mips[subsystem.node_indices] = mip
+    return OrderedDict((subsystem.node_indices, mips[subsystem.node_indices])
+                       for subsystem in candidates)
+
+
 @lru_cache(maxmem=config.MAXIMUM_CACHE_MEMORY_PERCENTAGE)
 def main_complex(network):
-    """Return the main complex of the network."""
+    """Return the main complex of the network.
+
+    Only the subsystems that can have positive |big_phi| are evaluated (see
+    ``PARALLEL_COMPLEX_EVALUATION`` in :mod:`pyphi.config` for how they are
+    scheduled). If none of them has positive |big_phi|, the result is the MIP
+    of the whole network, which is null if the network isn't strongly
+    connected.
+    """
     if not isinstance(network, Network):
         raise ValueError(
             """Input must be a Network (perhaps you passed a Subsystem
             instead?)""")
     log.info("Calculating main complex for " + str(network) + "...")
-    result = max(complexes(network))
+    mips = _candidate_mips(network)
+    result = max(mips.values()) if mips else None
+    if not result:
+        if network.node_indices in mips:
+            result = mips[network.node_indices]
+        else:
+            result = _null_mip(Subsystem(network.node_indices, network))
     log.info("Finished calculating main complex for" + str(network) + ".")
     log.debug("RESULT: \n" + str(result))
     return result
@@ -378,3 +649,201 @@ def complexes(network):
             """Input must be a Network (perhaps you passed a Subsystem
             instead?)""")
     return (big_mip(subsystem) for subsystem in subsystems(network))
+
+
+def _state_pair(state):
+    """Return a ``(past_state, current_state)`` pair, where a state given on
+    its own is taken as both the past and the current state."""
+    if np.ndim(state) == 2:
+        past_state, current_state = state
+    else:
+        past_state = current_state = state
+    return tuple(past_state), tuple(current_state)
+
+
+def _state_pairs(states, size):
+    if states is None:
+        states = itertools.product((0, 1), repeat=size)
+    return [_state_pair(state) for state in states]
+
+
+def _big_phis_of_states(network, node_indices, pairs):
+    """Return the |big_phi| values of a subsystem in several states of a
+    network."""
+    return [big_mip(Subsystem(node_indices,
+                              network.with_state(current_state,
+                                                 past_state))).phi
+            for past_state, current_state in pairs]
+
+
+def _number_of_jobs(n_jobs):
+    # Interpret negative numbers of cores like joblib does.
+    if n_jobs < 0:
+        n_jobs = cpu_count() + 1 + n_jobs
+    return max(n_jobs, 1)
+
+
+def _big_phis_in_chunks(parallel, network, node_indices, pairs):
+    """Compute the |big_phi| values of several states with a
+    ``joblib.Parallel`` object.
+
+    Each worker is given a contiguous chunk of states, so that the parts of
+    calculations that are cached in a process are shared by all the states in
+    its chunk."""
+    n_chunks = min(_number_of_jobs(config.NUMBER_OF_CORES), len(pairs))
+    bounds = np.linspace(0, len(pairs), n_chunks + 1).astype(int)
+    chunks = parallel(
+        delayed(_in_worker)(_big_phis_of_states, network, node_indices,
+                            pairs[start:stop])
+        for start, stop in zip(bounds[:-1], bounds[1:]))
+    return list(itertools.chain.from_iterable(chunks))
+
+
+def _template_network(network_tpm, pair, cm, perturb_vector):
+    # Validate and hash the TPM, connectivity matrix, and perturbation vector
+    # once; every state is a copy of this network.
+    return Network(network_tpm, pair[1], pair[0], connectivity_matrix=cm,
+                   perturb_vector=perturb_vector)
+
+
+def big_phi_by_state(network_tpm, states=None, cm=None, node_indices=None,
+                     perturb_vector=None, parallel=True):
+    """Return the |big_phi| value of a subsystem in each of several states of
+    a network.
+
+    The network is validated and its TPM hashed only once, and the parts of
+    the calculation that don't depend on the state (the TPMs and Marbls of
+    nodes with the same boundary conditions, the Hamming matrices, and the
+    tables of bipartitions) are computed once per process and shared by all
+    the states. The states are divided evenly among ``NUMBER_OF_CORES``
+    processes.
+
+    Args:
+        network_tpm (np.ndarray): The TPM of the network.
+
+    Keyword Args:
+        states (Iterable): The states. Each is either a current state, which
+            is also taken as the past state, or a pair of a past state and a
+            current state. Defaults to every state of the network.
+        cm (np.ndarray): The connectivity matrix of the network.
+        node_indices (tuple(int)): The nodes of the subsystem. Defaults to
+            all the nodes in the network.
+        perturb_vector (np.ndarray): The perturbation vector of the network.
+        parallel (bool): Whether to compute the states in parallel.
+
+    Returns:
+        ``np.ndarray`` -- A structured array with one row per state and the
+        fields ``past_state``, ``current_state``, and ``phi``.
+
+    Example:
+        >>> from pyphi import examples
+        >>> network = examples.basic_network()
+        >>> table = big_phi_by_state(network.tpm, states=[(1, 0, 0)],
+        ...                          cm=network.connectivity_matrix,
+        ...                          parallel=False)
+        >>> round(table['phi'][0], 4)
+        2.3125
+    """
+    tpm = convert.to_n_dimensional(np.array(network_tpm))
+    size = tpm.shape[-1]
+    pairs = _state_pairs(states, size)
+    table = np.zeros(len(pairs), dtype=[('past_state', np.int8, (size,)),
+                                        ('current_state', np.int8, (size,)),
+                                        ('phi', np.float64)])
+    if not pairs:
+        return table
+    network = _template_network(network_tpm, pairs[0], cm, perturb_vector)
+    if node_indices is None:
+        node_indices = network.node_indices
+    log.info("Calculating Phi for {} states of {}...".format(len(pairs),
+                                                            network))
+    if parallel:
+        phis = _big_phis_in_chunks(
+            _parallel(), network, node_indices, pairs)
+    else:
+        phis = _big_phis_of_states(network, node_indices, pairs)
+    log.info("Finished calculating Phi for {} states.".format(len(pairs)))
+    table['past_state'] = [past_state for past_state, _ in pairs]
+    table['current_state'] = [current_state for _, current_state in pairs]
+    table['phi'] = phis
+    return table
+
+
+def stream_big_phi(network_tpm, state_iter, cm=None, node_indices=None,
+                   perturb_vector=None, window=None, cache_size=1024,
+                   parallel=True):
+    """Lazily compute the |big_phi| value of a subsystem along a sequence of
+    states of a network.
+
+    States are consumed ``window`` at a time, and the next window is only
+    consumed once the results for the current one have been yielded, so the
+    sequence can be arbitrarily long (*e.g.* the output of a running
+    simulation). The states in a window are computed in parallel, as in
+    :func:`big_phi_by_state`. Results are cached by state in a bounded cache
+    holding the ``cache_size`` most recently used states, so states that
+    recur are only computed once.
+
+    To compute |big_phi| along a trajectory, pass the pairs of consecutive
+    states::
+
+        past, current = itertools.tee(trajectory)
+        next(current)
+        phis = stream_big_phi(tpm, zip(past, current))
+
+    Args:
+        network_tpm (np.ndarray): The TPM of the network.
+        state_iter (Iterable): The states. Each is either a current state,
+            which is also taken as the past state, or a pair of a past state
+            and a current state.
+
+    Keyword Args:
+        cm (np.ndarray): The connectivity matrix of the network.
+        node_indices (tuple(int)): The nodes of the subsystem. Defaults to
+            all the nodes in the network.
+        perturb_vector (np.ndarray): The perturbation vector of the network.
+        window (int): The number of states computed together. Defaults to
+            four per core.
+        cache_size (int): The number of states whose results are cached.
+        parallel (bool): Whether to compute the states in a window in
+            parallel.
+
+    Yields:
+        ``float`` -- The |big_phi| value for each state, in order.
+    """
+    if window is None:
+        window = 4 * (_number_of_jobs(config.NUMBER_OF_CORES)
+                      if parallel else 1)
+    states = iter(state_iter)
+    cache = OrderedDict()
+    network = None
+    with contextlib.ExitStack() as stack:
+        if parallel:
+            # Keep the same worker processes for every window.
+            run = stack.enter_context(
+                _parallel())
+        while True:
+            pairs = [_state_pair(state)
+                     for state in itertools.islice(states, window)]
+            if not pairs:
+                return
+            if network is None:
+                network = _template_network(network_tpm, pairs[0], cm,
+                                            perturb_vector)
+                if node_indices is None:
+                    node_indices = network.node_indices
+            # Compute each new state in the window once.
+            phis = {pair: cache[pair] for pair in pairs if pair in cache}
+            new = list(OrderedDict.fromkeys(
+                pair for pair in pairs if pair not in phis))
+            if new and parallel:
+                phis.update(zip(new, _big_phis_in_chunks(
+                    run, network, node_indices, new)))
+            else:
+                phis.update(zip(new, _big_phis_of_states(
+                    network, node_indices, new)))
+            for pair in pairs:
+                cache.pop(pair, None)
+                cache[pair] = phis[pair]
+                if len(cache) > cache_size:
+                    cache.popitem(last=False)
+                yield phis[pair]
@@ -11,10 +11,39 @@ from collections import namedtuple
 import numpy as np
 from marbl import MarblSet
 
-from . import utils, models, db, constants, config, convert
+from . import (utils, models, db, sqlite_db, constants, config, convert,
+               cache_stats, serialize)
 from .constants import DIRECTIONS, PAST, FUTURE
 
 
+# Hit and miss counts for concept lookups.
+_counter = cache_stats.Counter()
+
+
+def _store():
+    """Return the key-value store that concepts are cached in."""
+    if config.CACHING_BACKEND == constants.SQLITE:
+        return sqlite_db
+    return db
+
+
+def _cache_stats():
+    """Return the statistics of the concept cache.
+
+    The number of entries and bytes are those of the whole database, which
+    also holds any cached BigMips."""
+    size = nbytes = None
+    if config.CACHING_BACKEND == constants.SQLITE:
+        size, nbytes = sqlite_db.size()
+    elif config.CACHING_BACKEND == constants.DATABASE:
+        size, nbytes = db.size()
+    return _counter.stats(size=size, nbytes=nbytes)
+
+
+cache_stats.register('pyphi.concept_caching', _cache_stats,
+                     reset=_counter.reset)
+
+
 class NormalizedMechanism:
 
     """A mechanism rendered into a normal form, suitable for use as a cache key
@@ -24,8 +53,9 @@ class NormalizedMechanism:
 
     - Get the set of all nodes that input to (output from) at least one
       mechanism node.
-    - Sort the Marbls in a stable way (this is done by marbl-python, when the
-      MarblSet is initialized).
+    - Sort the Marbls in a stable way. Marbls are sorted by their digests
+      (see :meth:`pyphi.node.Node.marbl_digest`), which are computed once per
+      node and are much cheaper to compare than the Marbls themselves.
     - Iterate over the sorted Marbls; for each one, iterate over its
       corresponding mechanism node's inputs (outputs).
     - Label each input (output) with a unique integer. These are the
@@ -34,13 +64,22 @@ class NormalizedMechanism:
       index.
     - Record the state of the mechanism and all input/ouptut nodes.
 
-    Then two normalized mechanisms are the same if they have the same
-    MarblSets, inputs, outputs, state, and input/output state.
+    Then two normalized mechanisms are the same if they have the same sorted
+    Marbl digests, inputs, outputs, state, and input/output state.
+
+    Args:
+        mechanism (tuple(Node)): The mechanism.
+        subsystem (Subsystem): The subsystem the mechanism belongs to.
+
+    Keyword Args:
+        normalize_tpms (bool): Whether to normalize the TPMs in the Marbls.
+        raw (NormalizedMechanism): The normal form of the same mechanism
+            without normalized TPMs, whose TPM-independent parts are reused.
 
     Attributes:
-        marblset (MarblSet): A dictionary where keys are directions, and values
-            are MarblSets containing Marbls generated from the TPMs of the
-            mechanism nodes' corresponding to the direction.
+        digests (dict): A dictionary where keys are directions, and values are
+            the sorted digests of the Marbls of the mechanism nodes for that
+            direction.
         normalized_indices (dict): A dictionary where keys are directions, and
             values are dictionaries mapping mechanism node indices to their
             normalized indices for that direction.
@@ -54,119 +93,102 @@ class NormalizedMechanism:
             the values are the permutations that maps mechanism nodes to the
             position of their marbl in the marblset for that direction.
     """
-    # NOTE: We use lists and indices throughout, instead of dictionaries (which
-    # would perhaps be more elegant), to avoid repeatedly computing the hash of
-    # the marbls.
-    def __init__(self, mechanism, subsystem, normalize_tpms=True):
-        # Ensure the mechanism is in sorted order for consistency.
-        mechanism = sorted(mechanism)
-        self.indices = convert.nodes2indices(mechanism)
-        # Record the state of the mechanism.
-        self.state = tuple(n.state for n in mechanism)
-        # Grab the marbls from the mechanism nodes.
-        marbls = {
-            DIRECTIONS[PAST]: [(n.past_marbl if normalize_tpms else
-                                n.raw_past_marbl) for n in mechanism],
-            DIRECTIONS[FUTURE]: [(n.current_marbl if normalize_tpms else
-                                  n.raw_current_marbl) for n in mechanism]
-        }
-        self.marblset = {
-            direction: MarblSet(marbls[direction]) for direction in DIRECTIONS
-        }
-        self.permutation = {
-            direction: self.marblset[direction].permutation
-            for direction in DIRECTIONS
-        }
+
+    def __init__(self, mechanism, subsystem, normalize_tpms=True, raw=None):
+        if raw is not None:
+            # These don't depend on whether TPMs are normalized.
+            mechanism, io_indices = raw._mechanism, raw._io_indices
+            self.indices, self.state = raw.indices, raw.state
+        else:
+            # Ensure the mechanism is in sorted order for consistency.
+            mechanism = sorted(mechanism)
+            self.indices = convert.nodes2indices(mechanism)
+            # Record the state of the mechanism.
+            self.state = tuple(n.state for n in mechanism)
+            # The indices of the inputs (outputs) of each mechanism node.
+            io_indices = {
+                DIRECTIONS[PAST]: [convert.nodes2indices(n.inputs)
+                                   for n in mechanism],
+                DIRECTIONS[FUTURE]: [convert.nodes2indices(n.outputs)
+                                     for n in mechanism],
+            }
+        self._mechanism, self._io_indices = mechanism, io_indices
+        self._normalize_tpms = normalize_tpms
+        self._marblset = None
+        self._hash = None
         M = range(len(mechanism))
-        # Associate marbls in the marblset to the mechanism nodes they were
-        # generated from.
-        marbl_preimage = {
-            direction: [
-                # The ith marbl corresponds to the jth node in the mechanism,
-                # where j is the image of i under the marblset's permutation.
-                mechanism[self.permutation[direction][i]]
-                for i, marbl in enumerate(self.marblset[direction])
-            ] for direction in DIRECTIONS
-        }
-        # Associate each marbl to the inputs of its preimage node.
-        io = {
-            # Inputs
-            DIRECTIONS[PAST]: [
-                marbl_preimage[DIRECTIONS[PAST]][m].inputs for m in M],
-            # Outputs
-            DIRECTIONS[FUTURE]: [
-                marbl_preimage[DIRECTIONS[FUTURE]][m].outputs for m in M]
-        }
-        # Now, we generate the normalized index of each node that inputs
-        # (outputs) to at least one mechanism node. Also record the reverse
-        # mapping, that sends normalized indices to the original indices.
-        #
-        # This is done by iterating through the marbls' inputs (outputs) and
-        # assigning each new node we encounter a unique integer label.
-        #
-        # So, for example, if the preimage nodes of the first and second marbl
-        # share an input node i, node i will be assigned a label only once,
-        # when the first marbl's inputs are encountered. When that node i is
-        # encountered again while iterating through the inputs of the second
-        # marbl's preimage, it will not be assigned a new label.
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        # This will hold a mapping from the indices of the nodes of the inputs
-        # to the mechanism that the NormalizedMechanism was initialized with to
-        # their normalized indices.
-        self.normalized_indices = {
-            DIRECTIONS[PAST]: {},
-            DIRECTIONS[FUTURE]: {}
-        }
-        # This will be used to label newly-encountered inputs/outpus.
-        counter = {DIRECTIONS[PAST]: 0, DIRECTIONS[FUTURE]: 0}
+        self.permutation, self.digests = {}, {}
+        self.normalized_indices, self.unnormalized_indices = {}, {}
         for d in DIRECTIONS:
-            for m in M:
-                # Assign each of the marbl's inputs (outputs) a label if it
-                # hasn't been labeled already.
-                for node in io[d][m]:
-                    if node.index not in self.normalized_indices[d]:
-                        normal_index = counter[d]
-                        # Assign the next unused integer as the label.
-                        self.normalized_indices[d][node.index] = normal_index
-                        # Increment the counter so the next label is different.
-                        counter[d] += 1
-        # Get the inverse mappings.
-        self.unnormalized_indices = {
-            DIRECTIONS[PAST]: {
-                v: k for k, v in
-                self.normalized_indices[DIRECTIONS[PAST]].items()},
-            DIRECTIONS[FUTURE]: {
-                v: k for k, v in
-                self.normalized_indices[DIRECTIONS[FUTURE]].items()} }
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
+            digests = [n.marbl_digest(d, normalize=normalize_tpms)
+                       for n in mechanism]
+            # The ith marbl corresponds to the jth node in the mechanism, where
+            # j is the image of i under the permutation. Ties are broken by
+            # position in the mechanism, as in a MarblSet.
+            self.permutation[d] = tuple(sorted(M, key=lambda i: (digests[i],
+                                                                 i)))
+            self.digests[d] = tuple(digests[i] for i in self.permutation[d])
+            # Label each node that inputs (outputs) to at least one mechanism
+            # node with the next unused integer, in the order in which they're
+            # encountered while iterating through the sorted marbls' inputs
+            # (outputs). So, for example, if the preimage nodes of the first
+            # and second marbl share an input node i, node i is labeled when
+            # the first marbl's inputs are encountered.
+            labels = {}
+            for i in self.permutation[d]:
+                for index in io_indices[d][i]:
+                    if index not in labels:
+                        labels[index] = len(labels)
+            self.normalized_indices[d] = labels
+            self.unnormalized_indices[d] = {v: k for k, v in labels.items()}
         # Get the states of the input and output nodes.
+        current_state = subsystem.network.current_state
         self.io_state = tuple(
-            tuple(subsystem.network.current_state[i] for i in
-                  self.normalized_indices[d].keys())
+            tuple(current_state[i] for i in self.normalized_indices[d].keys())
             for d in DIRECTIONS
         )
-        # Associate each marbl with its normally-labeled inputs.
+        # Associate each marbl with its normally-labeled inputs (outputs).
         # This captures the interrelationships between the mechanism nodes in a
         # stable way.
-        self.inputs = tuple(
-            tuple(self.normalized_indices[DIRECTIONS[PAST]][n.index]
-                  for n in io[DIRECTIONS[PAST]][m])
-            for m in M)
-        self.outputs = tuple(
-            tuple(self.normalized_indices[DIRECTIONS[FUTURE]][n.index]
-                  for n in io[DIRECTIONS[FUTURE]][m])
-            for m in M)
-
-    # TODO!!!: make hash independent of python
+        self.inputs, self.outputs = (
+            tuple(tuple(self.normalized_indices[d][index]
+                        for index in io_indices[d][i])
+                  for i in self.permutation[d])
+            for d in DIRECTIONS)
+
+    @property
+    def marblset(self):
+        """A dictionary where keys are directions, and values are MarblSets
+        containing Marbls generated from the TPMs of the mechanism nodes'
+        corresponding to the direction.
+
+        These are only built when needed, since the digests suffice for
+        comparing normalized mechanisms."""
+        if self._marblset is None:
+            self._marblset = {
+                d: MarblSet([n.marbl(d, normalize=self._normalize_tpms)
+                             for n in self._mechanism])
+                for d in DIRECTIONS
+            }
+        return self._marblset
+
+    def canonical_form(self):
+        """Return the data that determine the normalized mechanism, for use
+        with :func:`pyphi.utils.stable_hash`."""
+        return (self.digests[DIRECTIONS[PAST]],
+                self.digests[DIRECTIONS[FUTURE]],
+                self.inputs, self.outputs,
+                self.state, self.io_state)
+
     def __hash__(self):
-        return hash((self.marblset[DIRECTIONS[PAST]],
-                     self.marblset[DIRECTIONS[FUTURE]],
-                     self.inputs, self.outputs,
-                     self.state, self.io_state))
+        if self._hash is None:
+            self._hash = hash(self.canonical_form())
+        return self._hash
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        # Comparing the hashes first quickly rejects most unequal mechanisms.
+        return (hash(self) == hash(other) and
+                self.canonical_form() == other.canonical_form())
 
     def __str__(self):
         return str(self.indices)
@@ -287,6 +309,47 @@ class NormalizedConcept:
         return str(self)
 
 
+def _encode_normalized_mice(normalized_mice, arrays):
+    return (normalized_mice.phi, normalized_mice.direction,
+            convert.nodes2indices(normalized_mice.mechanism),
+            normalized_mice.purview, arrays.add(normalized_mice.repertoire))
+
+
+def _decode_normalized_mice(encoded, data):
+    phi, direction, mechanism, purview, repertoire = encoded
+    return NormalizedMice(phi=phi, direction=direction, mechanism=mechanism,
+                          purview=purview,
+                          repertoire=serialize.read_array(data, repertoire))
+
+
+def _encode_normalized_concept(normalized_concept):
+    # The normalized mechanism is the key the concept is stored with, so it
+    # isn't stored again.
+    arrays = serialize.ArrayWriter(serialize.dtype())
+    return {
+        'phi': normalized_concept.phi,
+        'cause': _encode_normalized_mice(normalized_concept.cause, arrays),
+        'effect': _encode_normalized_mice(normalized_concept.effect, arrays),
+        'data': arrays.data(),
+    }
+
+
+def _decode_normalized_concept(encoded, subsystem):
+    normalized_concept = NormalizedConcept.__new__(NormalizedConcept)
+    # This is filled in when the concept is unnormalized.
+    normalized_concept.mechanism = None
+    normalized_concept.phi = encoded['phi']
+    normalized_concept.cause = _decode_normalized_mice(encoded['cause'],
+                                                       encoded['data'])
+    normalized_concept.effect = _decode_normalized_mice(encoded['effect'],
+                                                        encoded['data'])
+    return normalized_concept
+
+
+serialize.register('NormalizedConcept', NormalizedConcept,
+                   _encode_normalized_concept, _decode_normalized_concept)
+
+
 def _unnormalize_purview_and_repertoire(normalized_purview,
                                         normalized_repertoire,
                                         unnormalized_indices,
@@ -351,6 +414,9 @@ def _unnormalize(normalized_concept, normalized_mechanism, mechanism,
                  subsystem):
     """Convert a normalized concept to its proper representation in the context
     of the given subsystem."""
+    # The normalized mechanism isn't stored in the compact encoding.
+    if normalized_concept.mechanism is None:
+        normalized_concept.mechanism = normalized_mechanism
     cause = _unnormalize_mice(normalized_concept.cause,
                               normalized_mechanism,
                               mechanism,
@@ -375,7 +441,7 @@ def _get(raw, normalized_mechanism, mechanism, subsystem):
     """Get a normalized concept from the database and unnormalize it before
     returning it."""
     key = db.generate_key(normalized_mechanism)
-    normalized_concept = db.find(key)
+    normalized_concept = serialize.loads(_store().find(key))
     if normalized_concept is None:
         return None
     concept = _unnormalize(normalized_concept, normalized_mechanism, mechanism,
@@ -387,7 +453,73 @@ def _set(normalized_mechanism, concept):
     """Normalize and store a concept with a normalized mechanism as the key."""
     key = db.generate_key(normalized_mechanism)
     value = NormalizedConcept(normalized_mechanism, concept)
-    return db.insert(key, value)
+    return _store().insert(key, serialize.dumps(value))
+
+
+def concepts(subsystem, mechanisms):
+    """Find the concepts specified by several mechanisms, returning cached
+    values where they are found and computing and caching the rest.
+
+    This is equivalent to calling :func:`concept` for each mechanism, but the
+    database is queried once for all the mechanisms (twice if
+    ``NORMALIZE_TPMS`` is enabled) and the new concepts are stored with a
+    single write, rather than making several round trips per mechanism.
+
+    Returns:
+        ``list(Concept)`` -- The concepts, in the same order as the
+        mechanisms.
+    """
+    mechanisms = list(mechanisms)
+    store = _store()
+    results = [None] * len(mechanisms)
+    # First we try to retrieve the concepts without normalizing TPMs, which is
+    # expensive.
+    raw_normalized_mechanisms = [
+        NormalizedMechanism(mechanism, subsystem, normalize_tpms=False)
+        for mechanism in mechanisms]
+    raw_keys = [db.generate_key(normalized_mechanism)
+                for normalized_mechanism in raw_normalized_mechanisms]
+    found = store.find_many(raw_keys)
+    for i, key in enumerate(raw_keys):
+        if key in found:
+            results[i] = _unnormalize(serialize.loads(found[key]),
+                                      raw_normalized_mechanisms[i],
+                                      mechanisms[i], subsystem)
+    misses = [i for i, result in enumerate(results) if result is None]
+    # Then we try the mechanisms that weren't found with normalized TPMs.
+    normalized_mechanisms, keys = {}, {}
+    if config.NORMALIZE_TPMS and misses:
+        for i in misses:
+            normalized_mechanisms[i] = NormalizedMechanism(
+                mechanisms[i], subsystem, raw=raw_normalized_mechanisms[i])
+            keys[i] = db.generate_key(normalized_mechanisms[i])
+        found = store.find_many(keys.values())
+        for i in misses:
+            if keys[i] in found:
+                results[i] = _unnormalize(serialize.loads(found[keys[i]]),
+                                          normalized_mechanisms[i],
+                                          mechanisms[i], subsystem)
+        misses = [i for i in misses if results[i] is None]
+    _counter.hit(len(mechanisms) - len(misses))
+    _counter.miss(len(misses))
+    # Compute the remaining concepts and store them all at once, with both the
+    # raw normalized mechanism and the fully-normalized mechanism as keys.
+    new = []
+    for i in misses:
+        results[i] = subsystem.concept(mechanisms[i])
+        new.append((raw_keys[i], serialize.dumps(NormalizedConcept(
+            raw_normalized_mechanisms[i], results[i]))))
+        if i in keys:
+            new.append((keys[i], serialize.dumps(NormalizedConcept(
+                normalized_mechanisms[i], results[i]))))
+    store.insert_many(new)
+    return results
+
+
+def flush():
+    """Write any concepts that have been cached but not yet stored."""
+    if config.CACHING_BACKEND == constants.SQLITE:
+        sqlite_db.flush()
 
 
 def concept(subsystem, mechanism):
@@ -401,17 +533,21 @@ def concept(subsystem, mechanism):
     # See if we have a precomputed value without normalization.
     cached_concept = _get(True, raw_normalized_mechanism, mechanism, subsystem)
     if cached_concept is not None:
+        _counter.hit()
         return cached_concept
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     if config.NORMALIZE_TPMS:
         # We didn't find a precomputed concept with the raw normalized TPM, so
         # now we normalize TPMs as well.
-        normalized_mechanism = NormalizedMechanism(mechanism, subsystem)
+        normalized_mechanism = NormalizedMechanism(
+            mechanism, subsystem, raw=raw_normalized_mechanism)
         # Try to retrieve the concept with the fully-normalized mechanism.
         cached_concept = _get(False, normalized_mechanism, mechanism,
                               subsystem)
         if cached_concept is not None:
+            _counter.hit()
             return cached_concept
+    _counter.miss()
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     # We didn't find any precomputed concept at all, so compute it, and store
     # the result with the raw normalized mechanism and the fully-normalized
@@ -5,7 +5,8 @@
 """
 The configuration is loaded upon import from a YAML file in the directory where
 PyPhi is run: ``pyphi_config.yml``. If no file is found, the default
-configuration is used.
+configuration is used. Options that are missing from the file take their
+default values.
 
 The various options are listed here with their defaults.
 
@@ -37,6 +38,14 @@ long time!), resulting in data loss.
     >>> pyphi.config.PARALLEL_CUT_EVALUATION
     True
 
+- Control whether subsystems are evaluated in parallel when searching for the
+  main complex of a network. Subsystems with at least as many cuts as there
+  are cores are evaluated one at a time (with their cuts in parallel, if
+  enabled above), and the smaller ones are evaluated concurrently.
+
+    >>> pyphi.config.PARALLEL_COMPLEX_EVALUATION
+    True
+
 - Control the number of CPU cores to evaluate unidirectional cuts. Negative
   numbers count backwards from the total number of available cores, with ``-1``
   meaning "use all available cores".
@@ -44,6 +53,34 @@ long time!), resulting in data loss.
     >>> pyphi.config.NUMBER_OF_CORES
     -1
 
+- Control whether the concepts of a constellation are evaluated in parallel.
+  Concepts are cheap compared to the cost of sending the subsystem to another
+  process, so this only pays off with the ``'threading'`` backend (see below).
+  It has no effect on the constellations computed while evaluating cuts or
+  subsystems in parallel, since those are already computed concurrently.
+
+    >>> pyphi.config.PARALLEL_CONCEPT_EVALUATION
+    False
+
+- Control how parallel work is executed. With the default,
+  ``'multiprocessing'``, each worker is a separate process, which receives a
+  pickled copy of the subsystem and constellations and fills its own copies of
+  the caches. With ``'threading'``, the workers are threads of the current
+  process, so nothing is pickled and all the workers share the in-memory
+  caches; memory use stays close to that of a sequential computation instead
+  of growing with the number of cores.
+
+  Threads only run in parallel while they are in code that releases the GIL,
+  such as the NumPy operations on repertoires and the EMD computations, so
+  the threading backend wins when those dominate: networks with large
+  repertoires (roughly 8 nodes and up), with ``PARALLEL_CONCEPT_EVALUATION``,
+  or when memory, rather than cores, limits the number of workers. For small
+  networks, where most of the time is spent in Python code, processes are
+  faster.
+
+    >>> pyphi.config.PARALLEL_BACKEND
+    'multiprocessing'
+
 
 Caching
 ~~~~~~~
@@ -57,10 +94,13 @@ relying on the cache. For this reason it is disabled by default.
 
 - Control whether precomputed results are stored and read from a database or
   from a local filesystem-based cache in the current directory. Set this to
-  'fs' for the filesystem, 'db' for the database. Caching results on the
-  filesystem is the easiest to use but least robust caching system. Caching
-  results in a database is more robust and allows for caching individual
-  concepts, but requires installing MongoDB.
+  'fs' for the filesystem, 'db' for the database, or 'sqlite' for a local
+  SQLite database file. Caching results on the filesystem is the easiest to
+  use but least robust caching system. Caching results in a database is more
+  robust and allows for caching individual concepts, but requires installing
+  MongoDB. The SQLite backend also allows for caching individual concepts, and
+  needs no database server, but is only suitable for processes running on a
+  single machine.
 
     >>> pyphi.config.CACHING_BACKEND
     'fs'
@@ -76,8 +116,15 @@ relying on the cache. For this reason it is disabled by default.
     False
 
 .. note::
-    Concept caching only has an effect when a database is used as the the
-    caching backend.
+    Concept caching only has an effect when a database (either MongoDB or
+    SQLite) is used as the the caching backend.
+
+- Control whether the concepts of mechanisms that are images of each other
+  under a symmetry of the subsystem are computed only once, and relabeled for
+  the other mechanisms (see :mod:`pyphi.symmetry`).
+
+    >>> pyphi.config.REUSE_SYMMETRIC_CONCEPTS
+    False
 
 - If the caching backend is set to use the filesystem, the cache will be stored
   in this directory. This directory can be copied and moved around if you want
@@ -99,6 +146,50 @@ relying on the cache. For this reason it is disabled by default.
     >>> pyphi.config.MONGODB_CONFIG['collection_name']
     'test'
 
+  The connection is opened the first time the database is used, with a pool of
+  at most ``max_pool_size`` connections per process. Operations that fail
+  because of a network error are retried ``retries`` times before falling back
+  to computing values without the cache; each attempt waits at most
+  ``timeout`` seconds for the server.
+
+    >>> pyphi.config.MONGODB_CONFIG['max_pool_size']
+    100
+    >>> pyphi.config.MONGODB_CONFIG['retries']
+    3
+    >>> pyphi.config.MONGODB_CONFIG['timeout']
+    2
+
+- Set the configuration for the SQLite database backend. This only has an
+  effect if the caching backend is set to ``'sqlite'``. Writes are buffered and
+  committed in batches of ``batch_size`` entries; ``timeout`` is the number of
+  seconds to wait for another process to release a lock on the database.
+
+    >>> pyphi.config.SQLITE_CONFIG['filename']
+    '__pyphi_cache__.sqlite3'
+    >>> pyphi.config.SQLITE_CONFIG['batch_size']
+    100
+    >>> pyphi.config.SQLITE_CONFIG['timeout']
+    30
+
+- Set how cached values are encoded (see :mod:`pyphi.serialize`).
+  ``compression`` is the compressor to use: ``'zlib'``, ``'lzma'`` (smaller but
+  slower), or ``None``. If ``float32`` is true, repertoires are stored in single
+  precision, halving their size at the cost of precision beyond about seven
+  significant digits.
+
+    >>> pyphi.config.CACHE_ENCODING['compression']
+    'zlib'
+    >>> pyphi.config.CACHE_ENCODING['float32']
+    False
+
+  If ``mmap`` is true, the repertoires of |BigMip| objects loaded from the
+  filesystem cache are memory-mapped, so they are only read from disk when
+  they are accessed. Memory-mapped arrays can't be compressed, so this disables
+  compression of the filesystem cache.
+
+    >>> pyphi.config.CACHE_ENCODING['mmap']
+    False
+
 - Control whether TPMs should be normalized as part of concept normalization.
   TPM normalization increases the chances that a precomputed concept can be
   used again, but is expensive.
@@ -202,14 +293,26 @@ default_config = {
     # memory. If cuts are evaluated sequentially, only two BigMips need to be
     # in memory at a time.
     'PARALLEL_CUT_EVALUATION': True,
+    # Controls whether subsystems are evaluated in parallel when searching for
+    # the main complex.
+    'PARALLEL_COMPLEX_EVALUATION': True,
     # The number of CPU cores to use in parallel cut evaluation. -1 means all
     # available cores, -2 means all but one available cores, etc.
     'NUMBER_OF_CORES': -1,
+    # Controls whether the concepts of a constellation are evaluated in
+    # parallel. Only worthwhile with the 'threading' backend.
+    'PARALLEL_CONCEPT_EVALUATION': False,
+    # How parallel work is executed: 'multiprocessing' (one process per
+    # worker) or 'threading' (one thread per worker, sharing caches).
+    'PARALLEL_BACKEND': 'multiprocessing',
     # The verbosity of parallel computation (integer from 0 to 100). See
     # documentation for `joblib.Parallel`.
     'PARALLEL_VERBOSITY': 20,
     # Controls whether the concept caching system is used.
     'CACHE_CONCEPTS': False,
+    # Controls whether concepts of mechanisms related by a symmetry of the
+    # subsystem are obtained by relabeling a single computed concept.
+    'REUSE_SYMMETRIC_CONCEPTS': False,
     # Controls whether BigMips are cached and retreived.
     'CACHE_BIGMIPS': False,
     # Controls whether TPMs should be normalized as part of concept
@@ -220,7 +323,8 @@ default_config = {
     'MAXIMUM_CACHE_MEMORY_PERCENTAGE': 50,
     # The caching system to use. "fs" means cache results in a subdirectory of
     # the current directory; "db" means connect to a database and store the
-    # results there.
+    # results there; "sqlite" means store the results in a local SQLite
+    # database file.
     'CACHING_BACKEND': 'fs',
     # Directory for the persistent joblib Memory cache.
     'PERSISTENT_CACHE_DIRECTORY': '__pyphi_cache__',
@@ -229,7 +333,22 @@ default_config = {
         'host': 'localhost',
         'port': 27017,
         'database_name': 'pyphi',
-        'collection_name': 'cache'
+        'collection_name': 'cache',
+        'max_pool_size': 100,
+        'retries': 3,
+        'timeout': 2
+    },
+    # SQLite configuration.
+    'SQLITE_CONFIG': {
+        'filename': '__pyphi_cache__.sqlite3',
+        'batch_size': 100,
+        'timeout': 30
+    },
+    # How cached values are encoded.
+    'CACHE_ENCODING': {
+        'compression': 'zlib',
+        'float32': False,
+        'mmap': False
     },
     # These are the settings for PyPhi logging.
     'LOGGING_CONFIG': {
@@ -281,7 +400,13 @@ PYPHI_CONFIG_FILENAME = 'pyphi_config.yml'
 file_loaded = False
 if os.path.exists(PYPHI_CONFIG_FILENAME):
     with open(PYPHI_CONFIG_FILENAME) as f:
-        config = yaml.load(f)
+        config = dict(default_config)
+        for key, value in yaml.load(f).items():
+            # Settings missing from nested configurations take their default
+            # values.
+            if isinstance(value, dict) and isinstance(config.get(key), dict):
+                value = dict(config[key], **value)
+            config[key] = value
         file_loaded = True
 else:
     config = default_config
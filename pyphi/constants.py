@@ -24,9 +24,21 @@ DIRECTIONS = ('past', 'future')
 # Constants for labeling memoization backends.
 FILESYSTEM = 'fs'
 DATABASE = 'db'
+SQLITE = 'sqlite'
 # The protocol used for pickling objects.
 PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+# The verbosity of joblib's Memory objects.
+JOBLIB_VERBOSITY = 1
 # Create the joblib Memory object for persistent caching without a
-# database.
-joblib_memory = joblib.Memory(cachedir=config.PERSISTENT_CACHE_DIRECTORY,
-                              verbose=1)
+# database. Memory-mapped arrays can't be compressed.
+if config.CACHE_ENCODING['mmap']:
+    joblib_memory = joblib.Memory(
+        config.PERSISTENT_CACHE_DIRECTORY,
+        mmap_mode='r',
+        verbose=JOBLIB_VERBOSITY)
+else:
+    joblib_memory = joblib.Memory(
+        config.PERSISTENT_CACHE_DIRECTORY,
+        compress=((config.CACHE_ENCODING['compression'], 3)
+                  if config.CACHE_ENCODING['compression'] else False),
+        verbose=JOBLIB_VERBOSITY)
@@ -4,30 +4,137 @@
 # db.py
 """
 Interface to MongoDB that exposes it as a key-value store.
+
+The connection is opened lazily, the first time the database is used, and
+again in any process forked after that (MongoDB clients are not fork-safe), so
+importing PyPhi doesn't require a running database and parallel workers each
+get their own pool of connections. Operations that fail because of a transient
+network error are retried ``MONGODB_CONFIG['retries']`` times, each waiting at
+most ``MONGODB_CONFIG['timeout']`` seconds for the server. If the database
+still can't be reached, a warning is logged and the operation behaves as if
+the cache were empty, so that values are computed instead; the database is
+tried again after ``RETRY_INTERVAL`` seconds.
 """
 
+import os
+import re
+import time
 import pickle
+import logging
+import threading
 import pymongo
 from bson.binary import Binary
-from collections import Iterable
-from . import constants, config
+from collections import Iterable, OrderedDict
+from . import constants, config, utils, cache_namespace
 
 
 KEY_FIELD = 'k'
 VALUE_FIELD = 'v'
+# The namespace of the key (see :mod:`pyphi.cache_namespace`).
+NAMESPACE_FIELD = 'n'
+
+# The number of seconds to wait before trying to reach the database again
+# after it has been found to be unreachable.
+RETRY_INTERVAL = 60
+# The number of seconds to wait before the first retry of a failed operation;
+# the wait is doubled for each subsequent retry.
+_BACKOFF = 0.1
+
+log = logging.getLogger(__name__)
 
+# The database API objects are created lazily; see ``get_collection``.
+_client, _database, _collection = None, None, None
+# The process the connection was opened in.
+_pid = None
+# The time until which the database is considered unreachable.
+_unavailable_until = 0
+_lock = threading.RLock()
 
-# Initialize dummy database API objects.
-client, database, collection = None, None, None
-# Connect to MongoDB if the caching backend is set to 'db'.
-if config.CACHING_BACKEND == 'db':
-    # TODO!!! use reconnect proxy
-    client = pymongo.MongoClient(config.MONGODB_CONFIG['host'],
-                                config.MONGODB_CONFIG['port'])
+
+def _connect():
+    """Open a connection to the database and return the collection."""
+    global _client, _database, _collection, _pid
+    timeout = int(config.MONGODB_CONFIG['timeout'] * 1000)
+    client = pymongo.MongoClient(
+        config.MONGODB_CONFIG['host'],
+        config.MONGODB_CONFIG['port'],
+        maxPoolSize=config.MONGODB_CONFIG['max_pool_size'],
+        serverSelectionTimeoutMS=timeout,
+        connectTimeoutMS=timeout)
     database = client[config.MONGODB_CONFIG['database_name']]
     collection = database[config.MONGODB_CONFIG['collection_name']]
     # Index documents by their keys. Enforce that the keys be unique.
-    collection.create_index('k', unique=True)
+    collection.create_index(KEY_FIELD, unique=True)
+    collection.create_index(NAMESPACE_FIELD)
+    # Only keep the connection once the index exists.
+    _client, _database, _collection = client, database, collection
+    _pid = os.getpid()
+    return _collection
+
+
+def get_collection():
+    """Return the collection that values are stored in, connecting to the
+    database if this process hasn't yet."""
+    with _lock:
+        if _collection is None or _pid != os.getpid():
+            return _connect()
+        return _collection
+
+
+def get_database():
+    """Return the database holding the collection, connecting to it if this
+    process hasn't yet."""
+    with _lock:
+        get_collection()
+        return _database
+
+
+def disconnect():
+    """Close this process's connection to the database, if it has one."""
+    global _client, _database, _collection, _pid
+    with _lock:
+        if _client is not None and _pid == os.getpid():
+            _client.close()
+        _client, _database, _collection, _pid = None, None, None, None
+
+
+def _forget(collection):
+    """Connect again the next time the database is used, if ``collection`` is
+    still the current collection.
+
+    The client isn't closed, since other threads may still be using it."""
+    global _client, _database, _collection, _pid
+    with _lock:
+        if _collection is collection:
+            _client, _database, _collection, _pid = None, None, None, None
+
+
+def _call(operation, default=None):
+    """Apply an operation to the collection, retrying on network errors.
+
+    If the database can't be reached, ``default`` is returned.
+    """
+    global _unavailable_until
+    if time.time() < _unavailable_until:
+        return default
+    retries = config.MONGODB_CONFIG['retries']
+    for attempt in range(retries + 1):
+        collection = None
+        try:
+            collection = get_collection()
+            return operation(collection)
+        except pymongo.errors.ConnectionFailure as e:
+            error = e
+            # Connect again on the next attempt.
+            if collection is not None:
+                _forget(collection)
+            if attempt < retries:
+                time.sleep(_BACKOFF * 2 ** attempt)
+    log.warning('Could not reach the database (%s); values will be computed '
+                'instead of cached for the next %s seconds.', error,
+                RETRY_INTERVAL)
+    _unavailable_until = time.time() + RETRY_INTERVAL
+    return default
 
 
 def find(key):
@@ -35,7 +142,8 @@ def find(key):
 
     If there is no value with the given key, returns ``None``.
     """
-    docs = list(collection.find({KEY_FIELD: key}))
+    docs = _call(lambda collection: list(collection.find({KEY_FIELD: key})),
+                 default=[])
     # Return None if we didn't find anything.
     if not docs:
         return None
@@ -44,34 +152,116 @@ def find(key):
     return pickle.loads(pickled_value)
 
 
+def _insert(collection, docs):
+    """Write documents, returning ``True`` once the write is done."""
+    # Use an unordered write so that keys that already exist don't prevent
+    # the others from being stored.
+    try:
+        collection.insert_many(docs, ordered=False)
+    except pymongo.errors.BulkWriteError:
+        pass
+    return True
+
+
 def insert(key, value):
     """Store a value with a key.
 
     If the key is already present in the database, this does nothing."""
-    # Pickle the value.
-    value = pickle.dumps(value, protocol=constants.PICKLE_PROTOCOL)
-    # Store the value as binary data in a document.
-    doc = {
-        KEY_FIELD: key,
-        VALUE_FIELD: Binary(value)
-    }
-    # Pickle and store the value with its key. If the key already exists, we
-    # don't insert (since the key is a unique index), and we don't care.
-    try:
-        return collection.insert(doc)
-    except pymongo.errors.DuplicateKeyError:
-        return None
+    insert_many([(key, value)])
+
+
+def find_many(keys):
+    """Return the values associated with several keys, with a single query.
+
+    Returns:
+        ``dict`` -- A mapping from the keys that were found to their values.
+    """
+    docs = _call(lambda collection: list(collection.find(
+        {KEY_FIELD: {'$in': list(keys)}})), default=[])
+    return {doc[KEY_FIELD]: pickle.loads(doc[VALUE_FIELD]) for doc in docs}
+
+
+def insert_many(items):
+    """Store several key-value pairs with a single write.
+
+    Keys that are already present in the database are left untouched.
+
+    Args:
+        items (Iterable): Pairs of keys and values.
+    """
+    docs = OrderedDict()
+    items = list(items)
+    fingerprints = cache_namespace.new_fingerprints(
+        __name__, [key for key, _ in items])
+    for key, value in items + fingerprints:
+        if key not in docs:
+            # Pickle the value and store it as binary data in a document.
+            value = pickle.dumps(value, protocol=constants.PICKLE_PROTOCOL)
+            docs[key] = {KEY_FIELD: key, VALUE_FIELD: Binary(value),
+                         NAMESPACE_FIELD: cache_namespace.namespace_of(key)}
+    if docs and _call(lambda collection: _insert(collection,
+                                                 list(docs.values())),
+                      default=False):
+        cache_namespace.fingerprints_written(__name__, fingerprints)
+
+
+def namespaces():
+    """Return the names of the cache namespaces in the database (see
+    :mod:`pyphi.cache_namespace`)."""
+    def find_namespaces(collection):
+        names = set(collection.distinct(NAMESPACE_FIELD))
+        # Documents written before their namespace was stored are examined by
+        # their keys.
+        names.update(cache_namespace.namespace_of(doc[KEY_FIELD]) for doc in
+                     collection.find({NAMESPACE_FIELD: {'$exists': False}},
+                                     {KEY_FIELD: True}))
+        return names
+
+    return _call(find_namespaces, default=set())
+
+
+def size():
+    """Return the number of values in the database and the number of bytes
+    they use.
+
+    Either is ``None`` if it can't be found (*e.g.* if the database can't be
+    reached).
+    """
+    def count(collection):
+        try:
+            nbytes = collection.database.command('collstats',
+                                                 collection.name)['size']
+        except pymongo.errors.OperationFailure:
+            nbytes = None
+        return collection.estimated_document_count(), nbytes
+
+    return _call(count, default=(None, None))
+
+
+def delete_namespace(namespace):
+    """Remove all the values in a cache namespace from the database."""
+    if namespace == cache_namespace.LEGACY:
+        query = {KEY_FIELD: {'$not': re.compile(':')}}
+    else:
+        query = {KEY_FIELD: {'$regex': '^' + re.escape(namespace) + ':'}}
+    _call(lambda collection: collection.delete_many(query))
+    cache_namespace.forget_fingerprints(__name__)
 
 
-# TODO!!!: check this singleton tuple business
 def generate_key(filtered_args):
     """Get a key from some input.
 
     This function should be used whenever a key is needed, to keep keys
-    consistent."""
+    consistent. Keys are digests of a canonical encoding of the input (see
+    :func:`pyphi.utils.stable_hash`), so they are the same in every process and
+    a value cached by one process can be found by any other. They are prefixed
+    with the current cache namespace (see :mod:`pyphi.cache_namespace`).
+    """
     # Convert the value to a (potentially singleton) tuple to be consistent
     # with joblib.filtered_args.
-    if isinstance(filtered_args, Iterable):
-        return hash(tuple(filtered_args))
+    if isinstance(filtered_args, Iterable) and not isinstance(filtered_args,
+                                                              str):
+        digest = utils.stable_hash(tuple(filtered_args))
     else:
-        return hash((filtered_args, ))
+        digest = utils.stable_hash((filtered_args, ))
+    return cache_namespace.key(digest)
@@ -4,8 +4,25 @@
 # json.py
 """
 PyPhi- and NumPy-aware JSON codec.
+
+PyPhi objects are encoded with their ``json_dict`` methods, and stamped with
+their class name and the PyPhi version (see :func:`get_stamp`). :func:`loads`
+uses the stamps to rebuild the objects::
+
+    >>> from pyphi import examples
+    >>> network = examples.basic_network()
+    >>> loads(dumps(network)) == network
+    True
+
+Networks and subsystems are rebuilt from their encoding. The MIPs, concepts,
+and |BigMip| objects in a result are rebuilt in the subsystem they were
+computed for (the subsystem of the enclosing |BigMip|, or the one passed to
+:func:`loads`); the repertoires of their MIPs are only converted to NumPy
+arrays when they are first accessed, and the expanded repertoires written by
+:meth:`Concept.json_dict` are not read, since they can be recomputed.
 """
 
+import functools
 from collections import Iterable
 import numpy as np
 import json as _json
@@ -13,12 +30,21 @@ import json as _json
 from . import __version__
 
 
+def _class_name(obj):
+    # Use the name of the class that decodes the object, which may be a base
+    # class (*e.g.* for MIPs decoded from JSON).
+    for cls in type(obj).__mro__:
+        if cls.__name__ in _decoders:
+            return cls.__name__
+    return type(obj).__name__
+
+
 def get_stamp(obj):
     """Returns a dictionary with the key 'pyphi', containing the object's class
     name and current PyPhi version."""
     return {
         'pyphi': {
-            'class': type(obj).__name__,
+            'class': _class_name(obj),
             'version': __version__
         }
     }
@@ -33,12 +59,14 @@ def make_encodable(obj):
     if hasattr(obj, 'json_dict'):
         d = obj.json_dict()
         # Stamp it!
-        # TODO stamp?
-        # d.update(get_stamp(obj))
+        if isinstance(d, dict):
+            d.update(get_stamp(obj))
         return d
     # If we have an array, convert it to a list.
     elif isinstance(obj, np.ndarray):
         return obj.tolist()
+    elif isinstance(obj, dict):
+        return {key: make_encodable(value) for key, value in obj.items()}
     # If we have an iterable, recurse on the items. But not for strings, which
     # are reCURSED! (they will recurse forver).
     elif isinstance(obj, Iterable) and not isinstance(obj, str):
@@ -60,10 +88,18 @@ class JSONEncoder(_json.JSONEncoder):
     def encode(self, obj):
         """Encode using the object's ``json_dict`` method if exists, falling
         back on the built-in encoder if not."""
-        try:
-            return super().encode(obj.json_dict())
-        except AttributeError:
-            return super().encode(obj)
+        if hasattr(obj, 'json_dict'):
+            obj = make_encodable(obj)
+        return super().encode(obj)
+
+    def default(self, obj):
+        """Encode NumPy arrays and scalars, and PyPhi objects nested in
+        builtin containers."""
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if hasattr(obj, 'json_dict') or isinstance(obj, np.ndarray):
+            return make_encodable(obj)
+        return super().default(obj)
 
 
 def dumps(obj):
@@ -72,16 +108,334 @@ def dumps(obj):
     return _json.dumps(obj, cls=JSONEncoder, separators=(',', ':'))
 
 
+# The number of elements of an array that are encoded at a time by
+# :func:`iterencode`.
+ARRAY_CHUNK_SIZE = 4096
+
+_encode_value = _json.JSONEncoder(separators=(',', ':')).encode
+
+
+def _iterencode_array(array):
+    if array.ndim == 0:
+        yield _encode_value(array.item())
+    elif array.ndim == 1:
+        yield '['
+        for start in range(0, len(array), ARRAY_CHUNK_SIZE):
+            if start:
+                yield ','
+            # Strip the brackets of the encoded list.
+            yield _encode_value(
+                array[start:start + ARRAY_CHUNK_SIZE].tolist())[1:-1]
+        yield ']'
+    else:
+        yield '['
+        for i, subarray in enumerate(array):
+            if i:
+                yield ','
+            yield from _iterencode_array(subarray)
+        yield ']'
+
+
+def _encode_key(key):
+    """Encode a key of a JSON object, converting it to a string as
+    :func:`json.dumps` does."""
+    if not isinstance(key, str):
+        if key is not None and not isinstance(key, (int, float)):
+            raise TypeError('keys must be str, int, float, bool or None, '
+                            'not {}'.format(type(key).__name__))
+        key = _encode_value(key)
+    return _encode_value(key)
+
+
+def _iterencode_items(items, partitioned_repertoires):
+    yield '{'
+    for i, (key, value) in enumerate(items):
+        if i:
+            yield ','
+        yield _encode_key(key) + ':'
+        yield from _iterencode(value, partitioned_repertoires)
+    yield '}'
+
+
+class _Items:
+
+    """Items that are encoded as a JSON object."""
+
+    def __init__(self, items):
+        self.items = items
+
+
+def _mip_items(mip, partitioned_repertoires):
+    from .models import _mip_attributes
+    for attr in _mip_attributes:
+        if partitioned_repertoires or attr != 'partitioned_repertoire':
+            yield attr, getattr(mip, attr)
+    yield 'pyphi', get_stamp(mip)['pyphi']
+
+
+def _mice_items(mice, expanded, partitioned_expanded,
+                partitioned_repertoires):
+    """Return the items of a MICE, followed by its repertoires expanded over
+    the whole network, as in :meth:`pyphi.models.Concept.json_dict`."""
+    yield 'mip', _Items(_mip_items(mice.mip, partitioned_repertoires))
+    yield 'pyphi', get_stamp(mice)['pyphi']
+    if expanded is not None:
+        yield 'repertoire', expanded().flatten()
+        if partitioned_repertoires:
+            yield 'partitioned_repertoire', partitioned_expanded().flatten()
+
+
+def _concept_items(concept, partitioned_repertoires):
+    yield 'phi', concept.phi
+    yield 'mechanism', concept.mechanism
+    # Repertoires are expanded without caching them on the subsystem, so only
+    # one is held in memory at a time.
+    for name, mice, expanded, partitioned_expanded in (
+            ('cause', concept.cause,
+             functools.partial(concept.expand_cause_repertoire, cache=False),
+             concept.expand_partitioned_cause_repertoire),
+            ('effect', concept.effect,
+             functools.partial(concept.expand_effect_repertoire, cache=False),
+             concept.expand_partitioned_effect_repertoire)):
+        yield name, (None if mice is None else _Items(_mice_items(
+            mice, expanded, partitioned_expanded, partitioned_repertoires)))
+    yield 'pyphi', get_stamp(concept)['pyphi']
+
+
+def _big_mip_items(big_mip):
+    from .models import _bigmip_attributes
+    for attr in _bigmip_attributes:
+        yield attr, getattr(big_mip, attr)
+    yield 'pyphi', get_stamp(big_mip)['pyphi']
+
+
+def _iterencode(obj, partitioned_repertoires):
+    # Import here to avoid a circular import.
+    from .models import BigMip, Concept, Mice, Mip
+    if isinstance(obj, _Items):
+        yield from _iterencode_items(obj.items, partitioned_repertoires)
+    elif isinstance(obj, BigMip):
+        yield from _iterencode_items(_big_mip_items(obj),
+                                     partitioned_repertoires)
+    elif isinstance(obj, Concept):
+        yield from _iterencode_items(
+            _concept_items(obj, partitioned_repertoires),
+            partitioned_repertoires)
+    elif isinstance(obj, Mice):
+        yield from _iterencode_items(
+            _mice_items(obj, None, None, partitioned_repertoires),
+            partitioned_repertoires)
+    elif isinstance(obj, Mip):
+        yield from _iterencode_items(
+            _mip_items(obj, partitioned_repertoires), partitioned_repertoires)
+    elif hasattr(obj, 'json_dict'):
+        yield from _iterencode(make_encodable(obj), partitioned_repertoires)
+    elif isinstance(obj, np.ndarray):
+        yield from _iterencode_array(obj)
+    elif isinstance(obj, np.generic):
+        yield _encode_value(obj.item())
+    elif isinstance(obj, dict):
+        yield from _iterencode_items(obj.items(), partitioned_repertoires)
+    elif isinstance(obj, Iterable) and not isinstance(obj, str):
+        yield '['
+        for i, item in enumerate(obj):
+            if i:
+                yield ','
+            yield from _iterencode(item, partitioned_repertoires)
+        yield ']'
+    else:
+        yield _encode_value(obj)
+
+
+def iterencode(obj, partitioned_repertoires=True):
+    """Encode ``obj`` as JSON incrementally, yielding it as a sequence of
+    strings.
+
+    The result is the same as :func:`dumps`, but the encodable representation
+    of the object is never built as a whole: |BigMip|, |Concept|, MICE, and
+    MIP objects are walked directly, repertoires are expanded one concept at a
+    time, and arrays are encoded ``ARRAY_CHUNK_SIZE`` elements at a time.
+
+    Keyword Args:
+        partitioned_repertoires (bool): Whether to include the partitioned
+            repertoires of MIPs and concepts. If ``False``, they are omitted.
+    """
+    return _iterencode(obj, partitioned_repertoires)
+
+
+def dump(obj, fp, partitioned_repertoires=True):
+    """Serialize ``obj`` as JSON to a file-like object, writing it
+    incrementally (see :func:`iterencode`).
+
+    Keyword Args:
+        partitioned_repertoires (bool): Whether to include the partitioned
+            repertoires of MIPs and concepts.
+    """
+    for chunk in iterencode(obj, partitioned_repertoires):
+        fp.write(chunk)
+
+
+# Decoding
+# ~~~~~~~~
+
+def _nodes(indices, subsystem):
+    if subsystem is None:
+        raise ValueError('A subsystem is needed to decode nodes.')
+    return subsystem.indices2nodes(indices)
+
+
+def _decode_network(d, subsystem):
+    from .network import Network
+    return Network(d['tpm'], d['current_state'], d['past_state'],
+                   connectivity_matrix=d['connectivity_matrix'],
+                   perturb_vector=d.get('perturb_vector'))
+
+
+def _decode_subsystem(d, subsystem):
+    from .subsystem import Subsystem
+    if 'network' in d:
+        network = _decode(d['network'], None)
+    elif subsystem is not None:
+        network = subsystem.network
+    else:
+        raise ValueError('A subsystem is needed to decode a subsystem '
+                         'without a network.')
+    return Subsystem(d['node_indices'], network,
+                     cut=_decode(d['cut'], subsystem))
+
+
+def _decode_cut(d, subsystem):
+    from .models import Cut
+    return Cut(tuple(d['severed']), tuple(d['intact']))
+
+
+def _decode_part(d, subsystem):
+    from .models import Part
+    return Part(mechanism=_nodes(d['mechanism'], subsystem),
+                purview=_nodes(d['purview'], subsystem))
+
+
+def _decode_mip(d, subsystem):
+    from .models import _DecodedMip
+    partition = d['partition']
+    if partition is not None:
+        partition = tuple(_decode(part, subsystem) for part in partition)
+    return _DecodedMip(
+        phi=d['phi'], direction=d['direction'],
+        mechanism=_nodes(d['mechanism'], subsystem),
+        purview=_nodes(d['purview'], subsystem), partition=partition,
+        unpartitioned_repertoire=d['unpartitioned_repertoire'],
+        partitioned_repertoire=d.get('partitioned_repertoire'))
+
+
+def _decode_mice(d, subsystem):
+    from .models import Mice
+    # Bypass the check of the repertoire's shape in ``Mice.__init__``, which
+    # would convert it to an array.
+    mice = Mice.__new__(Mice)
+    mice.__setstate__(_decode(d['mip'], subsystem))
+    return mice
+
+
+def _decode_concept(d, subsystem):
+    from .models import Concept
+    return Concept(phi=d['phi'],
+                   mechanism=_nodes(d['mechanism'], subsystem),
+                   cause=_decode(d['cause'], subsystem),
+                   effect=_decode(d['effect'], subsystem),
+                   subsystem=subsystem)
+
+
+def _decode_constellation(concepts, subsystem):
+    from .models import Constellation
+    if concepts is None:
+        return None
+    return Constellation(_decode(concept, subsystem) for concept in concepts)
+
+
+def _decode_big_mip(d, subsystem):
+    from .models import BigMip
+    from .subsystem import Subsystem
+    subsystem = _decode(d['subsystem'], subsystem)
+    # The cut subsystem is in the same network.
+    cut = _decode(d['cut_subsystem']['cut'], subsystem)
+    if cut == subsystem.cut:
+        cut_subsystem = subsystem
+    else:
+        cut_subsystem = Subsystem(subsystem.node_indices, subsystem.network,
+                                  cut=cut, mice_cache=subsystem._mice_cache)
+    return BigMip(
+        phi=d['phi'],
+        unpartitioned_constellation=_decode_constellation(
+            d['unpartitioned_constellation'], subsystem),
+        partitioned_constellation=_decode_constellation(
+            d['partitioned_constellation'], cut_subsystem),
+        subsystem=subsystem,
+        cut_subsystem=cut_subsystem)
+
+
+# Maps the class names in stamps to functions that take an encoded object and
+# the subsystem it belongs to, and return the object.
+_decoders = {
+    'Network': _decode_network,
+    'Subsystem': _decode_subsystem,
+    'Cut': _decode_cut,
+    'Part': _decode_part,
+    'Mip': _decode_mip,
+    'Mice': _decode_mice,
+    'Concept': _decode_concept,
+    'BigMip': _decode_big_mip,
+}
+
+
+def _decode(obj, subsystem):
+    if isinstance(obj, dict):
+        stamp = obj.get('pyphi')
+        if isinstance(stamp, dict) and stamp.get('class') in _decoders:
+            return _decoders[stamp['class']](obj, subsystem)
+        return {key: _decode(value, subsystem) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_decode(item, subsystem) for item in obj]
+    return obj
+
+
 class JSONDecoder(_json.JSONDecoder):
 
     """
     An extension of the built-in JSONDecoder that can handle native PyPhi
     objects as well as NumPy arrays.
+
+    Stamped objects are rebuilt (see :func:`loads`).
+
+    Keyword Args:
+        subsystem (Subsystem): The subsystem that MIPs and concepts outside a
+            |BigMip| belong to.
     """
-    pass
 
+    def __init__(self, *args, subsystem=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.subsystem = subsystem
+
+    def decode(self, s):
+        return _decode(super().decode(s), self.subsystem)
 
-def loads(s):
+
+def loads(s, subsystem=None):
     """Deserialize ``s`` (a ``str`` instance containing a JSON document) to a
-    PyPhi object."""
-    return _json.loads(s)
+    PyPhi object.
+
+    Keyword Args:
+        subsystem (Subsystem): The subsystem that MIPs and concepts outside a
+            |BigMip| belong to.
+
+    Raises:
+        ValueError: If a MIP or concept is outside a |BigMip| and no
+            subsystem is given.
+    """
+    return _json.loads(s, cls=JSONDecoder, subsystem=subsystem)
+
+
+def load(fp, subsystem=None):
+    """Deserialize a JSON document in a file-like object to a PyPhi object
+    (see :func:`loads`)."""
+    return loads(fp.read(), subsystem=subsystem)
@@ -10,12 +10,17 @@ of physical memory that the cache can use.
 If *maxmem* is set, then *maxsize* has no effect.
 
 Uses the *psutil* module to get the percentage of available memory.
+
+Every cache created with this decorator is registered in
+:mod:`pyphi.cache_stats` under the qualified name of the decorated function.
 """
 
 import os
 import psutil
 from functools import RLock, update_wrapper, namedtuple
 
+from . import cache_stats
+
 _CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
 
 class _HashedSeq(list):
@@ -85,6 +90,9 @@ def lru_cache(maxsize=128, typed=False, maxmem=False):
     with f.cache_info().  Clear the cache and statistics with f.cache_clear().
     Access the underlying function with f.__wrapped__.
 
+    The number of evictions and an estimate of the memory used by the cached
+    results are available through :mod:`pyphi.cache_stats`.
+
     See:  http://en.wikipedia.org/wiki/Cache_algorithms#Least_Recently_Used
 
     """
@@ -104,7 +112,7 @@ def lru_cache(maxsize=128, typed=False, maxmem=False):
 
     def decorating_function(user_function):
         cache = {}
-        hits = misses = 0
+        hits = misses = evictions = 0
         full = False
         cache_get = cache.get    # bound method to lookup a key or return None
         lock = RLock()           # because linkedlist updates aren't threadsafe
@@ -115,7 +123,7 @@ def lru_cache(maxsize=128, typed=False, maxmem=False):
 
             def wrapper(*args, **kwds):
                 # Size limited caching that tracks accesses by recency
-                nonlocal root, hits, misses, full
+                nonlocal root, hits, misses, evictions, full
                 key = make_key(args, kwds, typed)
                 with lock:
                     link = cache_get(key)
@@ -155,6 +163,7 @@ def lru_cache(maxsize=128, typed=False, maxmem=False):
                         root[KEY] = root[RESULT] = None
                         # Now update the cache dictionary.
                         del cache[oldkey]
+                        evictions += 1
                         # Save the potentially reentrant cache[key] assignment
                         # for last, after the root and links have been put in
                         # a consistent state.
@@ -199,7 +208,7 @@ def lru_cache(maxsize=128, typed=False, maxmem=False):
 
             def wrapper(*args, **kwds):
                 # Size limited caching that tracks accesses by recency
-                nonlocal root, hits, misses, full
+                nonlocal root, hits, misses, evictions, full
                 key = make_key(args, kwds, typed)
                 with lock:
                     link = cache_get(key)
@@ -239,6 +248,7 @@ def lru_cache(maxsize=128, typed=False, maxmem=False):
                         root[KEY] = root[RESULT] = None
                         # Now update the cache dictionary.
                         del cache[oldkey]
+                        evictions += 1
                         # Save the potentially reentrant cache[key] assignment
                         # for last, after the root and links have been put in
                         # a consistent state.
@@ -259,15 +269,35 @@ def lru_cache(maxsize=128, typed=False, maxmem=False):
 
         def cache_clear():
             """Clear the cache and cache statistics"""
-            nonlocal hits, misses, full
+            nonlocal hits, misses, evictions, full
             with lock:
                 cache.clear()
                 root[:] = [root, root, None, None]
-                hits = misses = 0
+                hits = misses = evictions = 0
                 full = False
 
+        def cache_stats_info():
+            """Report cache statistics for the cache registry"""
+            with lock:
+                if maxsize is None and not maxmem:
+                    results = list(cache.values())
+                else:
+                    results = [link[RESULT] for link in cache.values()]
+                return cache_stats.CacheStats(
+                    hits, misses, evictions, len(cache),
+                    cache_stats.estimate_nbytes(results))
+
+        def cache_stats_reset():
+            """Reset the cache statistics without clearing the cache"""
+            nonlocal hits, misses, evictions
+            with lock:
+                hits = misses = evictions = 0
+
         wrapper.cache_info = cache_info
         wrapper.cache_clear = cache_clear
+        cache_stats.register(
+            user_function.__module__ + '.' + user_function.__qualname__,
+            cache_stats_info, reset=cache_stats_reset, clear=cache_clear)
         return update_wrapper(wrapper, user_function)
 
     return decorating_function
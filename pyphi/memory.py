@@ -4,58 +4,270 @@
 # memory.py
 """
 Decorators and objects for memoization.
+
+Memoized outputs are stored in the compact encoding of :mod:`pyphi.serialize`,
+in the namespace of the current settings (see :mod:`pyphi.cache_namespace`).
 """
 
+import os
+import pickle
+import inspect
 import functools
+import threading
+import joblib
 import joblib.func_inspect
-from . import db, constants, config
+from . import (db, sqlite_db, constants, config, cache_stats, serialize,
+               cache_namespace, utils)
+
+
+# Hit and miss counts for functions memoized on the filesystem.
+_joblib_counter = cache_stats.Counter()
+
+
+def _joblib_cache_stats():
+    """Return the statistics of the joblib cache, counting its entries and
+    their size on disk."""
+    size = nbytes = 0
+    for dirpath, _, filenames in os.walk(config.PERSISTENT_CACHE_DIRECTORY):
+        if 'output.pkl' in filenames:
+            size += 1
+        nbytes += sum(os.path.getsize(os.path.join(dirpath, filename))
+                      for filename in filenames)
+    return _joblib_counter.stats(size=size, nbytes=nbytes)
+
+
+cache_stats.register('pyphi.memory.joblib', _joblib_cache_stats,
+                     reset=_joblib_counter.reset)
+# Whether the current joblib-memoized call in this thread missed the cache.
+_joblib_call = threading.local()
+
+
+def _count_joblib_calls(memoized_func):
+    """Wrap a joblib-memoized function so that its hits and misses are counted.
+
+    joblib only calls ``MemorizedFunc.call`` when there is no cached output, so
+    we count misses there and hits as the remaining calls. Whether a call
+    missed is recorded per thread, so that misses in other threads aren't
+    mistaken for this thread's."""
+    call = memoized_func.call
+
+    @functools.wraps(call)
+    def counted_call(*args, **kwargs):
+        _joblib_call.missed = True
+        _joblib_counter.miss()
+        return call(*args, **kwargs)
+
+    memoized_func.call = counted_call
+
+    @functools.wraps(memoized_func.func)
+    def wrapper(*args, **kwargs):
+        # Memoized functions may call each other, so restore the flag of the
+        # enclosing call afterwards.
+        enclosing = getattr(_joblib_call, 'missed', False)
+        _joblib_call.missed = False
+        try:
+            result = memoized_func(*args, **kwargs)
+            missed = _joblib_call.missed
+        finally:
+            _joblib_call.missed = enclosing
+        if not missed:
+            _joblib_counter.hit()
+        return result
+
+    # Expose the underlying joblib object.
+    wrapper.memoized_func = memoized_func
+    return wrapper
+
+
+def _filtered_args(func, ignore, args, kwargs):
+    """Return the values of the arguments of a call that aren't ignored,
+    sorted by argument name."""
+    filtered_args = joblib.func_inspect.filter_args(func, ignore, args, kwargs)
+    return tuple(value for name, value in sorted(filtered_args.items()))
+
+
+def _joblib_location(root):
+    """Return the directory of a joblib ``Memory``, in whose ``joblib``
+    subdirectory it stores outputs."""
+    # joblib 0.12 replaced ``cachedir``, which includes the subdirectory, with
+    # ``location``.
+    location = getattr(root, 'location', None)
+    if location is None:
+        location = os.path.dirname(root.cachedir)
+    return location
+
+
+def _namespace_directory():
+    """Return the directory of the current namespace in the filesystem
+    cache."""
+    return os.path.join(_joblib_location(constants.joblib_memory),
+                        cache_namespace.current())
+
+
+def _subsystem_argument(func, args, kwargs):
+    """Return the ``subsystem`` argument of a call, if there is one.
+
+    This is needed to decode outputs, such as |BigMip| objects, whose encoding
+    doesn't include the subsystem."""
+    arguments = inspect.signature(func).bind(*args, **kwargs).arguments
+    return arguments.get('subsystem')
+
+
+# The output most recently computed by a memoized function in this thread,
+# before it was encoded, wrapped in a tuple; or ``None``.
+_fresh = threading.local()
+
+
+def _encoding_output(func):
+    """Return a version of a function that returns the compact encoding of its
+    output.
+
+    The output itself is kept in ``_fresh``, so that it can be returned on a
+    cache miss without decoding its encoding. The signature of the function is
+    preserved, so that joblib can filter its arguments."""
+    @functools.wraps(func)
+    def encoded(*args, **kwargs):
+        output = func(*args, **kwargs)
+        _fresh.output = (output,)
+        return serialize.encode(output)
+
+    encoded.__signature__ = inspect.signature(func)
+    return encoded
+
+
+def _joblib_memoized(func, ignore):
+    """Memoize a function with joblib, in the directory of the current cache
+    namespace.
+
+    The namespace is looked up on every call, since the settings may change
+    after the function is decorated. Outputs are stored in their compact
+    encoding and decoded when they are loaded from the cache; on a cache miss,
+    the computed output is returned as it is. The summary of a |BigMip| output
+    is also stored in a small file of its own (see :func:`load_summary`).
+    """
+    encoded = _encoding_output(func)
+    # The memoized functions of each namespace, keyed by the root joblib
+    # Memory and the namespace.
+    memoized = {}
+
+    def current():
+        """Return the joblib-memoized function of the current namespace."""
+        root = constants.joblib_memory
+        namespace = cache_namespace.current()
+        if (id(root), namespace) not in memoized:
+            location = _namespace_directory()
+            cache_namespace.record_fingerprint(location)
+            memory = joblib.Memory(location, mmap_mode=root.mmap_mode,
+                                   compress=root.compress,
+                                   verbose=constants.JOBLIB_VERBOSITY)
+            memoized[(id(root), namespace)] = _count_joblib_calls(
+                memory.cache(encoded, ignore=ignore))
+        return memoized[(id(root), namespace)]
+
+    def summary_directory():
+        """Return the directory of the summaries of the current namespace."""
+        return os.path.join(_namespace_directory(), _SUMMARY_DIRECTORY,
+                            '{}.{}'.format(func.__module__, func.__qualname__))
+
+    def summary_filename(*args, **kwargs):
+        """Return the file holding the summary of the output of a call."""
+        digest = utils.stable_hash(_filtered_args(func, ignore, args, kwargs))
+        return os.path.join(summary_directory(), digest + '.pkl')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _fresh.output = None
+        encoded_output = current()(*args, **kwargs)
+        fresh, _fresh.output = _fresh.output, None
+        if fresh is not None:
+            summary = serialize.encoded_summary(encoded_output)
+            if summary is not None:
+                _save_pickle(summary_filename(*args, **kwargs), summary)
+            return fresh[0]
+        return serialize.decode(
+            encoded_output, subsystem=_subsystem_argument(func, args, kwargs))
+
+    # Expose the underlying joblib object of the current namespace.
+    wrapper.memoized_func = lambda: current().memoized_func
+    wrapper.summary_directory = summary_directory
+    wrapper.summary_filename = summary_filename
+    return wrapper
 
 
 def cache(ignore=[]):
-    """Decorator for memoizing a function using either the filesystem or a
-    database."""
+    """Decorator for memoizing a function using either the filesystem, a
+    MongoDB database, or a SQLite database."""
 
     def joblib_decorator(func):
         if func.__name__ == '_big_mip' and not config.CACHE_BIGMIPS:
             return func
-        return constants.joblib_memory.cache(func, ignore=ignore)
+        return _joblib_memoized(func, ignore)
 
     def db_decorator(func):
         if func.__name__ == '_big_mip' and not config.CACHE_BIGMIPS:
             return func
         return DbMemoizedFunc(func, ignore)
 
-    if config.CACHING_BACKEND == 'fs':
+    def sqlite_decorator(func):
+        if func.__name__ == '_big_mip' and not config.CACHE_BIGMIPS:
+            return func
+        return DbMemoizedFunc(func, ignore, store=sqlite_db)
+
+    if config.CACHING_BACKEND == constants.FILESYSTEM:
         # Decorate the function with the filesystem memoizer.
         return joblib_decorator
-    if config.CACHING_BACKEND == 'db':
+    if config.CACHING_BACKEND == constants.DATABASE:
         # Decorate the function with the database memoizer.
         return db_decorator
+    if config.CACHING_BACKEND == constants.SQLITE:
+        # Decorate the function with the SQLite memoizer.
+        return sqlite_decorator
+
+
+# Hit and miss counts for functions memoized in the database.
+_db_counter = cache_stats.Counter()
+cache_stats.register('pyphi.memory.db', _db_counter.stats,
+                     reset=_db_counter.reset)
 
 
 class DbMemoizedFunc:
 
-    """A memoized function, with a databse backing the cache."""
+    """A memoized function, with a databse backing the cache.
 
-    def __init__(self, func, ignore):
+    The database is given by ``store``, which must be a module with the same
+    interface as :mod:`pyphi.db` (the default) or :mod:`pyphi.sqlite_db`.
+    """
+
+    def __init__(self, func, ignore, store=db):
         # Store a reference to the raw function, without any memoization.
         self.func = func
         # The list of arguments to ignore when getting cache keys.
         self.ignore = ignore
+        # The key-value store backing the cache.
+        self.store = store
 
         # This is the memoized function.
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             key = self.get_output_key(args, kwargs)
             # Attempt to retrieve a precomputed value from the database.
-            cached_value = db.find(key)
+            cached_value = self.store.find(key)
             # If successful, return it.
             if cached_value is not None:
-                return cached_value
+                _db_counter.hit()
+                return serialize.loads(
+                    cached_value,
+                    subsystem=_subsystem_argument(func, args, kwargs))
+            _db_counter.miss()
             # Otherwise, compute, store, and return the value.
             result = func(*args, **kwargs)
             # Use the argument hash as the key.
-            db.insert(key, result)
+            self.store.insert(key, serialize.dumps(result))
+            # Commit the value now if the store buffers it, since worker
+            # processes exit without running ``atexit`` handlers.
+            flush = getattr(self.store, 'flush', None)
+            if flush is not None:
+                flush()
             return result
 
         # Store the memoized function.
@@ -68,15 +280,144 @@ class DbMemoizedFunc:
     def get_output_key(self, args, kwargs):
         """Return the key that the output should be cached with,
         given arguments, keyword arguments, and a list of arguments to ignore."""
-        # Get a dictionary mapping argument names to argument values where
-        # ignored arguments are omitted.
-        filtered_args = joblib.func_inspect.filter_args(
-            self.func, self.ignore, args, kwargs)
-        # Get a sorted tuple of the filtered argument.
-        filtered_args = tuple(sorted(filtered_args.values()))
-        # Use native hash when hashing arguments.
-        return db.generate_key(filtered_args)
+        return db.generate_key(
+            _filtered_args(self.func, self.ignore, args, kwargs))
 
     def load_output(self, args, kwargs):
         """Return cached output."""
-        return db.find(self.get_output_key(args, kwargs))
+        return serialize.loads(
+            self.store.find(self.get_output_key(args, kwargs)),
+            subsystem=_subsystem_argument(self.func, args, kwargs))
+
+
+def load_summary(memoized_func, *args, **kwargs):
+    """Return the summary of a cached |BigMip| (see
+    :func:`pyphi.serialize.summary`) without loading the rest of it.
+
+    Args:
+        memoized_func (function): A function decorated with :func:`cache`
+            whose output is a |BigMip|.
+        *args: The arguments the output was computed with.
+
+    Returns:
+        ``dict`` -- The summary, or ``None`` if the output isn't cached.
+
+    .. note::
+        In the filesystem cache, summaries are stored in files of their own
+        (in the ``summaries`` directory of the namespace, keyed by the digest
+        of the arguments), so only that file is read. The database backends
+        store the summary with the rest of the output, which is read and
+        decompressed (but not decoded).
+    """
+    if isinstance(memoized_func, DbMemoizedFunc):
+        data = memoized_func.store.find(
+            memoized_func.get_output_key(args, kwargs))
+        return serialize.encoded_summary(serialize.load_encoded(data))
+    if not hasattr(memoized_func, 'summary_filename'):
+        # The function isn't memoized.
+        return None
+    return _load_pickle(memoized_func.summary_filename(*args, **kwargs))
+
+
+# The directory of the summaries of |BigMip| outputs in each namespace of the
+# filesystem cache.
+_SUMMARY_DIRECTORY = 'summaries'
+
+
+def _save_pickle(filename, value):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # Write to a temporary file first, so that other processes never load a
+    # partially written value.
+    temporary = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(temporary, 'wb') as f:
+        pickle.dump(value, f, protocol=constants.PICKLE_PROTOCOL)
+    os.replace(temporary, filename)
+
+
+def _load_pickle(filename):
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def cached_summaries(memoized_func):
+    """Return the summaries of all the cached outputs of a function whose
+    output is a |BigMip|.
+
+    This is only supported by the filesystem caching backend, whose outputs
+    can be listed; the database backends yield nothing.
+
+    Only the outputs in the namespace of the current settings are included
+    (see :mod:`pyphi.cache_namespace`).
+
+    Yields:
+        ``dict`` -- The summary of each cached output (see
+        :func:`pyphi.serialize.summary`).
+    """
+    if not hasattr(memoized_func, 'summary_directory'):
+        return
+    directory = memoized_func.summary_directory()
+    if not os.path.isdir(directory):
+        return
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.pkl'):
+            summary = _load_pickle(os.path.join(directory, name))
+            if summary is not None:
+                yield summary
+
+
+def _store():
+    """Return the database of the current caching backend, or ``None`` for
+    the filesystem."""
+    if config.CACHING_BACKEND == constants.DATABASE:
+        return db
+    if config.CACHING_BACKEND == constants.SQLITE:
+        return sqlite_db
+    return None
+
+
+def _value_location(name, key):
+    """Return the filename or database key of a value stored with
+    :func:`store_value`."""
+    digest = utils.stable_hash((name, key))
+    if _store() is None:
+        return os.path.join(_namespace_directory(), name, digest + '.pkl')
+    return cache_namespace.key(digest)
+
+
+def store_value(name, key, value):
+    """Store a value computed outside of a memoized function in the current
+    caching backend, in the namespace of the current settings.
+
+    Unlike the outputs of functions decorated with :func:`cache`, these values
+    can be looked up without computing them if they are missing (see
+    :func:`load_value`).
+
+    Args:
+        name (str): The kind of value, which keeps the keys of different kinds
+            apart.
+        key: The key, which must be supported by
+            :func:`pyphi.utils.stable_hash`.
+        value: The value.
+    """
+    store, location = _store(), _value_location(name, key)
+    if store is None:
+        _save_pickle(location, value)
+        return
+    store.insert(location, serialize.dumps(value))
+    # Commit the value now if the store buffers it, since worker processes
+    # exit without running ``atexit`` handlers.
+    flush = getattr(store, 'flush', None)
+    if flush is not None:
+        flush()
+
+
+def load_value(name, key):
+    """Return a value stored with :func:`store_value`, or ``None`` if there
+    is none."""
+    store, location = _store(), _value_location(name, key)
+    if store is None:
+        return _load_pickle(location)
+    data = store.find(location)
+    return None if data is None else serialize.loads(data)
@@ -6,6 +6,7 @@
 Containers for MICE, MIP, cut, partition, and concept data.
 """
 
+import hashlib
 from collections import namedtuple, Iterable
 import numpy as np
 
@@ -27,6 +28,9 @@ class Cut(namedtuple('Cut', ['severed', 'intact'])):
             Connections to this group of nodes from those in ``severed`` are
             severed.
     """
+
+    __slots__ = ()
+
     def json_dict(self):
         return {
             'severed': json.make_encodable(self.severed),
@@ -54,6 +58,9 @@ class Part(namedtuple('Part', ['mechanism', 'purview'])):
 
         This class represents one term in the above product.
     """
+
+    __slots__ = ()
+
     def json_dict(self):
         return {
             'mechanism': json.make_encodable(self.mechanism),
@@ -112,6 +119,13 @@ def _phi_then_mechanism_size_lt(self, other):
 
 
 def _phi_then_mechanism_size_gt(self, other):
+    try:
+        if not utils.phi_eq(self.phi, other.phi):
+            # Objects with different phi values are never equal, so there's
+            # no need to compare them.
+            return self.phi > other.phi
+    except AttributeError:
+        pass
     return (not _phi_then_mechanism_size_lt(self, other) and
             not self == other)
 
@@ -169,6 +183,26 @@ def _general_eq(a, b, attributes):
     except AttributeError:
         return False
 
+# Memoization helpers
+# =============================================================================
+
+def _memoize(obj, name, compute):
+    """Return the value stored in the ``__dict__`` of an object under
+    ``name``, computing it with ``compute`` the first time.
+
+    Hashes and fingerprints are memoized this way, since the namedtuples
+    can't have nonempty ``__slots__``."""
+    try:
+        return obj.__dict__[name]
+    except KeyError:
+        value = obj.__dict__[name] = compute()
+        return value
+
+
+def _getstate(obj):
+    """Don't pickle memoized values, since hashes differ between processes."""
+    return None
+
 # =============================================================================
 
 _mip_attributes = ['phi', 'direction', 'mechanism', 'purview', 'partition',
@@ -216,6 +250,8 @@ class Mip(namedtuple('Mip', _mip_attributes)):
         # TODO!!! clarify the reason for that
         # We do however check whether the size of the mechanism or purview is
         # the same, since that matters (for the exclusion principle).
+        if self is other:
+            return True
         return (_general_eq(self, other, _mip_attributes_for_eq) and
                 len(self.mechanism) == len(other.mechanism) and
                 len(self.purview) == len(other.purview))
@@ -226,8 +262,11 @@ class Mip(namedtuple('Mip', _mip_attributes)):
         return self.phi > constants.EPSILON
 
     def __hash__(self):
-        return hash((self.phi, self.direction, self.mechanism, self.purview,
-                     utils.np_hash(self.unpartitioned_repertoire)))
+        return _memoize(self, '_hash', lambda: hash((
+            self.phi, self.direction, self.mechanism, self.purview,
+            utils.np_hash(self.unpartitioned_repertoire))))
+
+    __getstate__ = _getstate
 
     def json_dict(self):
         return {
@@ -242,6 +281,27 @@ class Mip(namedtuple('Mip', _mip_attributes)):
     __ge__ = _phi_then_mechanism_size_ge
 
 
+class _DecodedMip(Mip):
+
+    """A :class:`Mip` decoded from JSON (see :func:`pyphi.json.loads`), whose
+    repertoires are stored as nested lists and converted to arrays when they
+    are first accessed."""
+
+    @property
+    def unpartitioned_repertoire(self):
+        return _memoize(self, '_unpartitioned_repertoire',
+                        lambda: _as_array(self[5]))
+
+    @property
+    def partitioned_repertoire(self):
+        return _memoize(self, '_partitioned_repertoire',
+                        lambda: _as_array(self[6]))
+
+
+def _as_array(repertoire):
+    return None if repertoire is None else np.array(repertoire)
+
+
 # =============================================================================
 
 
@@ -256,8 +316,11 @@ class Mice:
     (exclusion principle).
     """
 
+    __slots__ = ('_mip', '_hash')
+
     def __init__(self, mip):
         self._mip = mip
+        self._hash = None
         # TODO remove?
         if (self.repertoire is not None and
             any(self.repertoire.shape[i] != 2 for i in
@@ -318,10 +381,19 @@ class Mice:
         return "Mice(" + repr(self._mip) + ")"
 
     def __eq__(self, other):
-        return self.mip == other.mip
+        return self is other or self.mip == other.mip
 
     def __hash__(self):
-        return hash(('Mice', self._mip))
+        if self._hash is None:
+            self._hash = hash(('Mice', self._mip))
+        return self._hash
+
+    def __getstate__(self):
+        return self._mip
+
+    def __setstate__(self, mip):
+        self._mip = mip
+        self._hash = None
 
     def json_dict(self):
         return {
@@ -339,6 +411,20 @@ class Mice:
 
 _concept_attributes = ['phi', 'mechanism', 'cause', 'effect', 'subsystem',
                        'normalized']
+# ``normalized`` only records how a concept was retrieved from the concept cache
+# (see :mod:`pyphi.concept_caching`), and isn't stored with memoized results, so
+# it isn't compared.
+_concept_eq_attributes = _concept_attributes[:-1]
+
+
+def _repertoire_digest(mice):
+    if mice is None or mice.repertoire is None:
+        return None
+    # Repertoires that ``np.array_equal`` considers equal must have the same
+    # digest, whatever their dtype and the signs of their zeros.
+    repertoire = np.asarray(mice.repertoire, dtype=np.float64) + 0.0
+    return hashlib.sha1(str(repertoire.shape).encode() +
+                        np.ascontiguousarray(repertoire).tobytes()).digest()
 
 
 # TODO: make mechanism a property
@@ -382,11 +468,15 @@ class Concept(namedtuple('Concept', _concept_attributes)):
         return (self.cause.repertoire, self.effect.repertoire)
 
     def __eq__(self, other):
-        return _general_eq(self, other, _concept_attributes)
+        return self is other or _general_eq(self, other,
+                                            _concept_eq_attributes)
 
     def __hash__(self):
-        return hash((self.phi, self.mechanism, self.cause, self.effect,
-                     self.subsystem))
+        return _memoize(self, '_hash', lambda: hash((
+            self.phi, self.mechanism, self.cause, self.effect,
+            self.subsystem)))
+
+    __getstate__ = _getstate
 
     def __str__(self):
         return ('Concept(' +
@@ -414,43 +504,78 @@ class Concept(namedtuple('Concept', _concept_attributes)):
         EMD calculation."""
         return self.mechanism == other.mechanism and self.eq_repertoires(other)
 
+    @property
+    def fingerprint(self):
+        """
+        ``tuple`` -- A digest of the data compared by :meth:`emd_eq`: the
+        network, the subsystem's nodes, the mechanism, and the cause and effect
+        repertoires. Concepts that are equal according to :meth:`emd_eq` have
+        the same fingerprint, so only concepts with the same fingerprint need
+        to be compared. It is only computed once.
+        """
+        return _memoize(self, '_fingerprint', lambda: (
+            hash(self.subsystem.network),
+            self.subsystem.node_indices,
+            convert.nodes2indices(self.mechanism),
+            _repertoire_digest(self.cause),
+            _repertoire_digest(self.effect)))
+
     # TODO Rename to expanded_cause_repertoire, etc
-    def expand_cause_repertoire(self):
+    def expand_cause_repertoire(self, cache=True):
         """Expands a cause repertoire to be a distribution over an entire
-        network."""
-        return self.subsystem.expand_cause_repertoire(self.cause.purview,
-                                                      self.cause.repertoire)
+        network.
 
-    def expand_effect_repertoire(self):
+        Keyword Args:
+            cache (bool): Whether to cache the expanded repertoire on the
+                subsystem (see :meth:`Subsystem.expand_repertoire`).
+        """
+        return self.subsystem.expand_cause_repertoire(
+            self.cause.purview, self.cause.repertoire, cache=cache)
+
+    def expand_effect_repertoire(self, cache=True):
         """Expands an effect repertoire to be a distribution over an entire
-        network."""
-        return self.subsystem.expand_effect_repertoire(self.effect.purview,
-                                                       self.effect.repertoire)
+        network.
+
+        Keyword Args:
+            cache (bool): Whether to cache the expanded repertoire on the
+                subsystem (see :meth:`Subsystem.expand_repertoire`).
+        """
+        return self.subsystem.expand_effect_repertoire(
+            self.effect.purview, self.effect.repertoire, cache=cache)
 
     def expand_partitioned_cause_repertoire(self):
         """Expands a partitioned cause repertoire to be a distribution over an
-        entire network."""
+        entire network.
+
+        Partitioned repertoires aren't compared between constellations, so
+        they aren't cached.
+        """
         return self.subsystem.expand_cause_repertoire(
             self.cause.purview,
-            self.cause.mip.partitioned_repertoire)
+            self.cause.mip.partitioned_repertoire, cache=False)
 
     def expand_partitioned_effect_repertoire(self):
         """Expands a partitioned effect repertoire to be a distribution over an
-        entire network."""
+        entire network.
+
+        Partitioned repertoires aren't compared between constellations, so
+        they aren't cached.
+        """
         return self.subsystem.expand_effect_repertoire(
             self.effect.purview,
-            self.effect.mip.partitioned_repertoire)
+            self.effect.mip.partitioned_repertoire, cache=False)
 
     def json_dict(self):
         d = {
             attr: json.make_encodable(getattr(self, attr))
             for attr in ['phi', 'mechanism', 'cause', 'effect']
         }
-        # Expand the repertoires.
+        # Expand the repertoires, without keeping them in the subsystem's
+        # cache.
         d['cause']['repertoire'] = json.make_encodable(
-            self.expand_cause_repertoire().flatten())
+            self.expand_cause_repertoire(cache=False).flatten())
         d['effect']['repertoire'] = json.make_encodable(
-            self.expand_effect_repertoire().flatten())
+            self.expand_effect_repertoire(cache=False).flatten())
         d['cause']['partitioned_repertoire'] = json.make_encodable(
             self.expand_partitioned_cause_repertoire().flatten())
         d['effect']['partitioned_repertoire'] = json.make_encodable(
@@ -464,6 +589,84 @@ class Concept(namedtuple('Concept', _concept_attributes)):
     __ge__ = _phi_then_mechanism_size_ge
 
 
+# =============================================================================
+
+class Constellation(tuple):
+
+    """A constellation of concepts.
+
+    A constellation is a tuple of :class:`Concept` objects, so it can be used
+    anywhere the tuples returned by earlier versions of PyPhi were. The
+    concepts are the storage: the constellation also provides the data used to
+    compare constellations (in :func:`pyphi.compute.concept_distances` and
+    :func:`pyphi.compute.constellation_distance`) as columns derived from them,
+    NumPy arrays with one row per concept. Each column is only computed the
+    first time it is accessed, and is kept by :meth:`take`.
+
+    Constellations are pickled as their concepts, without the columns, which
+    can be recomputed. Rebuilding the concepts from columns when unpickling is
+    slower than unpickling them, and barely smaller, so columns aren't used as
+    the pickled form. The compact encoding of :mod:`pyphi.serialize` stores all
+    the repertoires of cached values in a single array instead.
+
+    Every concept must have a core cause and a core effect in the same
+    subsystem.
+
+    Attributes:
+        phis (np.ndarray): The |small_phi| value of each concept.
+        expanded_cause_repertoires (np.ndarray): The cause repertoire of each
+            concept expanded over the whole subsystem (see
+            :meth:`Concept.expand_cause_repertoire`), stacked along the first
+            axis.
+        expanded_effect_repertoires (np.ndarray): Likewise for the effect
+            repertoires.
+    """
+
+    def __new__(cls, concepts=()):
+        constellation = super(Constellation, cls).__new__(cls, concepts)
+        constellation._columns = dict()
+        return constellation
+
+    def __reduce__(self):
+        return (Constellation, (tuple(self),))
+
+    def _column(self, name, compute, dtype=None):
+        if name not in self._columns:
+            self._columns[name] = np.array([compute(c) for c in self],
+                                           dtype=dtype)
+        return self._columns[name]
+
+    @property
+    def phis(self):
+        return self._column('phis', lambda c: c.phi, dtype=np.float64)
+
+    @property
+    def expanded_cause_repertoires(self):
+        return self._column('expanded_cause_repertoires',
+                            Concept.expand_cause_repertoire)
+
+    @property
+    def expanded_effect_repertoires(self):
+        return self._column('expanded_effect_repertoires',
+                            Concept.expand_effect_repertoire)
+
+    def take(self, positions):
+        """Return the constellation of the concepts at the given positions,
+        keeping the columns computed so far.
+
+        Args:
+            positions (Iterable(int)): The positions of the concepts.
+
+        Returns:
+            ``Constellation`` -- The concepts at ``positions``, in that order.
+        """
+        positions = np.array(list(positions), dtype=int)
+        result = Constellation(self[i] for i in positions)
+        for name, column in self._columns.items():
+            result._columns[name] = column[positions]
+        return result
+
+
 # =============================================================================
 
 _bigmip_attributes = ['phi', 'unpartitioned_constellation',
@@ -486,9 +689,9 @@ class BigMip(namedtuple('BigMip', _bigmip_attributes)):
             constellation and this MIP's partitioned constellation.
         cut (Cut): The unidirectional cut that makes the least difference to
             the subsystem.
-        unpartitioned_constellation (tuple(Concept)): The constellation of the
+        unpartitioned_constellation (Constellation): The constellation of the
             whole subsystem.
-        partitioned_constellation (tuple(Concept)): The constellation when the
+        partitioned_constellation (Constellation): The constellation when the
             subsystem is cut.
         subsystem (Subsystem): The subsystem this MIP was calculated for.
         cut_subsystem (Subsystem): The subsystem with the minimal cut applied.
@@ -500,7 +703,7 @@ class BigMip(namedtuple('BigMip', _bigmip_attributes)):
         return self.cut_subsystem.cut
 
     def __eq__(self, other):
-        return _general_eq(self, other, _bigmip_attributes)
+        return self is other or _general_eq(self, other, _bigmip_attributes)
 
     def __bool__(self):
         """A BigMip is truthy if it is not reducible; i.e. if it has a
@@ -508,9 +711,12 @@ class BigMip(namedtuple('BigMip', _bigmip_attributes)):
         return self.phi > constants.EPSILON
 
     def __hash__(self):
-        return hash((self.phi, self.unpartitioned_constellation,
-                     self.partitioned_constellation, self.subsystem,
-                     self.cut_subsystem))
+        return _memoize(self, '_hash', lambda: hash((
+            self.phi, self.unpartitioned_constellation,
+            self.partitioned_constellation, self.subsystem,
+            self.cut_subsystem)))
+
+    __getstate__ = _getstate
 
     # First compare phi, then subsystem size
     # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -7,8 +7,63 @@ Represents the network of interest. This is the primary object of PyPhi and the
 context of all |phi| and |big_phi| computation.
 """
 
+import copy
+import threading
+from collections import OrderedDict
+
 import numpy as np
-from . import validate, utils, json, convert
+from . import validate, utils, json, convert, cache_stats
+
+
+# Networks that have been unpickled in this process, keyed by the digest of
+# their TPM, connectivity matrix, and perturbation vector. Networks unpickled
+# later with the same digest share their caches (see
+# :meth:`Network.__reduce__`). Only the most recently used networks are kept.
+_registry = OrderedDict()
+_REGISTRY_SIZE = 32
+# Guards the registry, which may be used by several threads.
+_registry_lock = threading.RLock()
+
+
+# The maximum number of node TPMs and of Marbls cached by each network (see
+# :meth:`Network._cached`); the least recently used are evicted.
+_NODE_CACHE_SIZE = 4096
+# Guards the node caches of networks, which may be used by several threads.
+_node_cache_lock = threading.Lock()
+# Hit, miss, and eviction counts for the node caches of networks.
+_node_tpm_cache_counter = cache_stats.Counter()
+_marbl_cache_counter = cache_stats.Counter()
+cache_stats.register('pyphi.network.node_tpm_cache',
+                     _node_tpm_cache_counter.stats,
+                     reset=_node_tpm_cache_counter.reset)
+cache_stats.register('pyphi.network.marbl_cache', _marbl_cache_counter.stats,
+                     reset=_marbl_cache_counter.reset)
+
+
+def _register(network):
+    digest = network._get_arrays_digest()
+    with _registry_lock:
+        registered = _registry.pop(digest, network)
+        _registry[digest] = registered
+        while len(_registry) > _REGISTRY_SIZE:
+            _registry.popitem(last=False)
+    return registered
+
+
+def _unpickle(digest, current_state, past_state, tpm, connectivity_matrix,
+              perturb_vector):
+    network = _registry.get(digest)
+    if network is None:
+        network = Network(tpm, current_state, past_state,
+                          connectivity_matrix=connectivity_matrix,
+                          perturb_vector=perturb_vector)
+        network._arrays_digest = digest
+    network = _register(network)
+    if (network.current_state, network.past_state) == (current_state,
+                                                        past_state):
+        # A new object, so that changes to it don't affect the registered one.
+        return copy.copy(network)
+    return network.with_state(current_state, past_state)
 
 
 # TODO!!! raise error if user tries to change TPM or CM, double-check and document
@@ -124,6 +179,16 @@ class Network:
         # TODO extend to nonbinary nodes
         self.num_states = 2 ** self.size
 
+        # The Marbls and TPMs of the nodes of this network's subsystems, which
+        # are expensive to compute (see :meth:`Node.marbl`). These are shared
+        # with the copies of this network in other states (see
+        # :meth:`with_state`). Only the most recently used are kept.
+        self._marbl_cache = OrderedDict()
+        self._node_tpm_cache = OrderedDict()
+        # The stable hash of the TPM, connectivity matrix, and perturbation
+        # vector, computed when first needed (see :meth:`canonical_form`).
+        self._arrays_digest = None
+
         # Validate the entire network.
         validate.network(self)
 
@@ -145,6 +210,8 @@ class Network:
         Two networks are equal if they have the same TPM, current state, and
         past state.
         """
+        if self is other:
+            return True
         return ((np.array_equal(self.tpm, other.tpm) and
                 np.array_equal(self.current_state, other.current_state) and
                 np.array_equal(self.past_state, other.past_state) and
@@ -161,6 +228,92 @@ class Network:
         return hash((self._tpm_hash, self.current_state, self.past_state,
                      self._cm_hash, self._pv_hash))
 
+    def __copy__(self):
+        network = Network.__new__(Network)
+        network.__dict__.update(self.__dict__)
+        return network
+
+    def __reduce__(self):
+        """Pickle the network without its caches.
+
+        When the network is unpickled, it shares the caches of a network
+        with the same TPM, connectivity matrix, and perturbation vector that
+        was unpickled earlier in this process (in the same or another state),
+        if there is one, instead of recomputing them."""
+        return (_unpickle, (self._get_arrays_digest(), self.current_state,
+                            self.past_state, self.tpm,
+                            self.connectivity_matrix, self.perturb_vector))
+
+    def _get_arrays_digest(self):
+        if self._arrays_digest is None:
+            self._arrays_digest = utils.stable_hash(
+                (self.tpm, self.connectivity_matrix, self.perturb_vector))
+        return self._arrays_digest
+
+    def canonical_form(self):
+        """Return the data that determine the network, for use with
+        :func:`pyphi.utils.stable_hash`.
+
+        The TPM, connectivity matrix, and perturbation vector are represented
+        by their digest, which is only computed once."""
+        return (self._get_arrays_digest(), self.current_state,
+                self.past_state)
+
+    def with_state(self, current_state, past_state):
+        """Return this network in another state.
+
+        The new network shares this network's TPM, connectivity matrix, and
+        perturbation vector and their hashes, so they aren't validated or
+        hashed again; only the state is validated. It also shares the caches of
+        the parts of calculations that don't depend on the state, such as the
+        TPMs and Marbls of nodes whose boundary conditions are the same.
+
+        Args:
+            current_state (tuple): The current state of the network.
+            past_state (tuple): The past state of the network.
+
+        Returns:
+            ``Network`` -- The network in the given state.
+        """
+        # Compute the digest before copying so that it is shared.
+        self._get_arrays_digest()
+        network = copy.copy(self)
+        network.current_state = tuple(current_state)
+        network.past_state = tuple(past_state)
+        validate.state(network)
+        return network
+
+    @staticmethod
+    def _cached(cache, counter, key, compute):
+        """Return the value under a key in one of the node caches, calling
+        ``compute`` and caching its result on a miss."""
+        with _node_cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+        if value is not None:
+            counter.hit()
+            return value
+        counter.miss()
+        value = compute()
+        with _node_cache_lock:
+            cache[key] = value
+            if len(cache) > _NODE_CACHE_SIZE:
+                cache.popitem(last=False)
+                counter.evict()
+        return value
+
+    def _node_tpms(self, key, compute):
+        """Return the cached TPMs of a node (see :class:`pyphi.node.Node`)."""
+        return self._cached(self._node_tpm_cache, _node_tpm_cache_counter,
+                            key, compute)
+
+    def _node_marbl(self, key, compute):
+        """Return the cached Marbl of a node and its digest (see
+        :meth:`pyphi.node.Node.marbl`)."""
+        return self._cached(self._marbl_cache, _marbl_cache_counter, key,
+                            compute)
+
     def json_dict(self):
         return {
             'tpm': json.make_encodable(self.tpm),
@@ -168,5 +321,6 @@ class Network:
             'past_state': json.make_encodable(self.past_state),
             'connectivity_matrix':
                 json.make_encodable(self.connectivity_matrix),
+            'perturb_vector': json.make_encodable(self.perturb_vector),
             'size': json.make_encodable(self.size),
         }
@@ -8,6 +8,7 @@ in the network's list of nodes.
 """
 
 import functools
+import hashlib
 import numpy as np
 from marbl import Marbl
 from . import utils
@@ -68,8 +69,30 @@ class Node:
             self.index, subsystem.connectivity_matrix)
         self._output_indices = utils.get_outputs_from_cm(
             self.index, subsystem.connectivity_matrix)
-        # Generate the node's TPMs.
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        # Generate the node's TPMs, or get them from the network's cache if a
+        # node with the same index, subsystem nodes, cut and boundary
+        # conditions has already been created (*e.g.* in another state of the
+        # network).
+        key = (subsystem.node_indices, subsystem.cut,
+               subsystem._boundary_state, self.index)
+        (self._dimension_labels, self.past_tpm,
+         self.current_tpm) = self.network._node_tpms(key, self._generate_tpms)
+
+        # Only compute the hash once.
+        self._hash = hash((self.index, self.subsystem))
+
+        # Deferred properties
+        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        # ``inputs``, ``outputs``, and ``marbl`` must be properties because at
+        # the time of node creation, the subsystem doesn't have a list of Node
+        # objects yet, only a size (and thus a range of node indices). So, we
+        # defer construction until the properties are needed.
+        self._inputs = None
+        self._outputs = None
+        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _generate_tpms(self):
+        """Return this node's dimension labels and past and current TPMs."""
         # For the past and current state, get the part of the subsystem's TPM
         # that gives just the state of this node. This part is still indexed by
         # network state, but its last dimension will be gone, since now there's
@@ -88,7 +111,7 @@ class Node:
         # node index to the corresponding dimension of this node's TPM with
         # singleton dimensions removed. We need this for creating this node's
         # Marbl.
-        self._dimension_labels = []
+        dimension_labels = []
         # This is the counter that will provide the actual labels.
         current_non_singleton_dim_index = 0
         # Iterate over all the nodes in the network, since we need to keep
@@ -100,14 +123,14 @@ class Node:
             # of the corresponding dimension and increment the corresponding
             # index for the next one.
             if i in self._input_indices and i in self.subsystem.node_indices:
-                self._dimension_labels.append(current_non_singleton_dim_index)
+                dimension_labels.append(current_non_singleton_dim_index)
                 current_non_singleton_dim_index += 1
             # Boundary nodes and non-input nodes have already been conditioned
             # and marginalized-out, so their dimension in the TPM will be a
             # singleton and will be squeezed out when creating a Marbl. So, we
             # don't give them a dimension label.
             else:
-                self._dimension_labels.append(None)
+                dimension_labels.append(None)
 
             # TODO extend to nonbinary nodes
             # Marginalize out non-input nodes that are in the subsystem, since
@@ -120,30 +143,15 @@ class Node:
                 current_tpm_off = current_tpm_off.sum(i, keepdims=True) / 2
 
         # Combine the on- and off-TPMs.
-        self.past_tpm = np.array([past_tpm_off, past_tpm_on])
-        self.current_tpm = np.array([current_tpm_off, current_tpm_on])
+        past_tpm = np.array([past_tpm_off, past_tpm_on])
+        current_tpm = np.array([current_tpm_off, current_tpm_on])
         # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
         # Make the TPM immutable (for hashing).
-        self.past_tpm.flags.writeable = False
-        self.current_tpm.flags.writeable = False
+        past_tpm.flags.writeable = False
+        current_tpm.flags.writeable = False
 
-        # Only compute the hash once.
-        self._hash = hash((self.index, self.subsystem))
-
-        # Deferred properties
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        # ``inputs``, ``outputs``, and ``marbl`` must be properties because at
-        # the time of node creation, the subsystem doesn't have a list of Node
-        # objects yet, only a size (and thus a range of node indices). So, we
-        # defer construction until the properties are needed.
-        self._inputs = None
-        self._outputs = None
-        self._past_marbl = None
-        self._current_marbl = None
-        self._raw_past_marbl = None
-        self._raw_current_marbl = None
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+        return dimension_labels, past_tpm, current_tpm
 
     def get_marbl(self, direction, normalize=True):
         """Generate a Marbl for this node, using either the past or current
@@ -183,51 +191,65 @@ class Node:
                              node.index in self._output_indices]
             return self._outputs
 
+    def _cached_marbl(self, direction, normalize):
+        """Return this node's Marbl and its digest, computing them only once
+        per network.
+
+        Marbls depend only on the subsystem's nodes, cut, and boundary
+        conditions, so they are cached on the network and shared by every
+        subsystem with the same nodes, cut, and boundary conditions (*e.g.* the
+        subsystems created for each cut during |big_phi| calculations, or the
+        subsystems of the network in other states)."""
+        key = (self.subsystem.node_indices, self.subsystem.cut,
+               self.subsystem._boundary_state, self.index, direction,
+               normalize)
+
+        def compute():
+            marbl = self.get_marbl(direction, normalize=normalize)
+            return (marbl, hashlib.sha1(marbl.pack()).digest())
+
+        return self.network._node_marbl(key, compute)
+
+    def marbl(self, direction, normalize=True):
+        """Return this node's Marbl for a direction (see :meth:`get_marbl`),
+        caching it."""
+        return self._cached_marbl(direction, normalize)[0]
+
+    def marbl_digest(self, direction, normalize=True):
+        """Return a digest of this node's Marbl for a direction.
+
+        Two Marbls are equal if and only if their digests are (barring hash
+        collisions), so digests can be sorted and compared instead of the
+        Marbls themselves, which is much faster."""
+        return self._cached_marbl(direction, normalize)[1]
+
     @property
     def past_marbl(self):
         """The normalized representation of this node's Markov blanket,
         conditioned on the fixed state of boundary-condition nodes in the
         previous timestep."""
-        if self._past_marbl is not None:
-            return self._past_marbl
-        else:
-            self._past_marbl = self.get_marbl(DIRECTIONS[PAST])
-            return self._past_marbl
+        return self.marbl(DIRECTIONS[PAST])
 
     @property
     def current_marbl(self):
         """The normalized representation of this node's Markov blanket,
         conditioned on the fixed state of boundary-condition nodes in the
         current timestep."""
-        if self._current_marbl is not None:
-            return self._current_marbl
-        else:
-            self._current_marbl = self.get_marbl(DIRECTIONS[FUTURE])
-            return self._current_marbl
+        return self.marbl(DIRECTIONS[FUTURE])
 
     @property
     def raw_past_marbl(self):
         """The un-normalized representation of this node's Markov blanket,
         conditioned on the fixed state of boundary-condition nodes in the
         previous timestep."""
-        if self._past_marbl is not None:
-            return self._past_marbl
-        else:
-            self._raw_past_marbl = self.get_marbl(DIRECTIONS[PAST],
-                                                  normalize=False)
-            return self._raw_past_marbl
+        return self.marbl(DIRECTIONS[PAST], normalize=False)
 
     @property
     def raw_current_marbl(self):
         """The un-normalized representation of this node's Markov blanket,
         conditioned on the fixed state of boundary-condition nodes in the
         current timestep."""
-        if self._raw_current_marbl is not None:
-            return self._raw_current_marbl
-        else:
-            self._raw_current_marbl = self.get_marbl(DIRECTIONS[FUTURE],
-                                                     normalize=False)
-            return self._raw_current_marbl
+        return self.marbl(DIRECTIONS[FUTURE], normalize=False)
 
     def __repr__(self):
         return (self.label if self.label is not None
@@ -257,6 +279,17 @@ class Node:
     def __hash__(self):
         return self._hash
 
+    def __reduce__(self):
+        # Pickle the node as a reference to its subsystem, which rebuilds its
+        # nodes when unpickled.
+        return (_unpickle, (self.subsystem, self.index, self.label))
+
     # TODO do we need more than the index?
     def json_dict(self):
         return self.index
+
+
+def _unpickle(subsystem, index, label):
+    if label is None and index in subsystem.node_indices:
+        return subsystem.indices2nodes((index,))[0]
+    return Node(subsystem.network, index, subsystem, label=label)
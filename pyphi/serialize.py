@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# serialize.py
+"""
+A compact encoding of cached values.
+
+Pickling a |BigMip| stores its subsystem and network along with it, once per
+cached value, and every repertoire as a separate float64 array. The encoding
+used here instead stores:
+
+- node indices rather than |Node| objects, so the subsystem and network are
+  not stored at all; they are supplied again when the value is decoded;
+- all the repertoires of a value in a single flat array, optionally quantized
+  to float32 (see ``CACHE_ENCODING['float32']``); and
+- a summary of the scalar data (|big_phi|, the cut, and the |small_phi| values
+  and mechanisms of the concepts), which can be read without decoding the
+  rest (see :func:`encoded_summary`).
+
+Since the repertoires are in one array, they can be memory-mapped when loaded
+from the filesystem cache (see ``CACHE_ENCODING['mmap']``), so that they are
+only read from disk when they are accessed.
+
+:func:`encode` and :func:`decode` convert between objects and this encoding,
+which is made of tuples, dictionaries, and NumPy arrays. :func:`dumps` and
+:func:`loads` further convert it to and from bytes, compressed with the
+standard library compressor named by ``CACHE_ENCODING['compression']``, behind
+a header recording the format version and compressor. Values of types that
+have no compact encoding are pickled as they are.
+"""
+
+import lzma
+import pickle
+import struct
+import zlib
+
+import numpy as np
+
+from . import config, constants, convert
+from .models import BigMip, Concept, Constellation, Cut, Mice, Mip, Part
+
+
+# The version of the encoding. Values encoded with a different version are not
+# decoded.
+FORMAT_VERSION = 1
+# The bytes that every value produced by ``dumps`` starts with.
+MAGIC = b'PYPHI'
+_HEADER = struct.Struct('>5sBB')
+
+# Compressors, identified in the header by their position in this tuple.
+_COMPRESSORS = (
+    (None, lambda data: data, lambda data: data),
+    ('zlib', zlib.compress, zlib.decompress),
+    ('lzma', lzma.compress, lzma.decompress),
+)
+
+
+class FormatError(ValueError):
+    """Raised when a value can't be decoded."""
+    pass
+
+
+# Arrays
+# ~~~~~~
+
+class ArrayWriter:
+
+    """Collects arrays into a single flat array of the given dtype.
+
+    Each array is added with :meth:`add`, which returns a reference to it;
+    :func:`read_array` returns the array given the flat array and a
+    reference.
+    """
+
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.arrays = []
+        self.size = 0
+
+    def add(self, array):
+        """Add an array and return a reference to it."""
+        if array is None:
+            return None
+        array = np.asarray(array)
+        ref = (self.size, array.shape)
+        self.arrays.append(array.ravel())
+        self.size += array.size
+        return ref
+
+    def data(self):
+        """Return the flat array."""
+        if not self.arrays:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(self.arrays).astype(self.dtype, copy=False)
+
+
+def read_array(data, ref):
+    """Return the array referenced by ``ref``."""
+    if ref is None:
+        return None
+    offset, shape = ref
+    array = data[offset:offset + int(np.prod(shape, dtype=int))].reshape(shape)
+    # Quantized arrays are only stored in single precision.
+    if array.dtype != np.float64:
+        array = array.astype(np.float64)
+    return array
+
+
+def dtype():
+    """Return the dtype arrays are stored with."""
+    return np.float32 if config.CACHE_ENCODING['float32'] else np.float64
+
+
+# Models
+# ~~~~~~
+
+def _indices(nodes):
+    return tuple(convert.nodes2indices(nodes))
+
+
+def _encode_mip(mip, arrays):
+    partition = (None if mip.partition is None else
+                 tuple((_indices(part.mechanism), _indices(part.purview))
+                       for part in mip.partition))
+    return (mip.phi, mip.direction, _indices(mip.mechanism),
+            _indices(mip.purview), partition,
+            arrays.add(mip.unpartitioned_repertoire),
+            arrays.add(mip.partitioned_repertoire))
+
+
+def _decode_mip(encoded, data, subsystem):
+    (phi, direction, mechanism, purview, partition, unpartitioned_repertoire,
+     partitioned_repertoire) = encoded
+    nodes = subsystem.indices2nodes
+    if partition is not None:
+        partition = tuple(Part(mechanism=nodes(m), purview=nodes(p))
+                          for m, p in partition)
+    return Mip(
+        phi=phi, direction=direction, mechanism=nodes(mechanism),
+        purview=nodes(purview), partition=partition,
+        unpartitioned_repertoire=read_array(data, unpartitioned_repertoire),
+        partitioned_repertoire=read_array(data, partitioned_repertoire))
+
+
+def _encode_concept(concept, arrays):
+    return (concept.phi, _indices(concept.mechanism),
+            None if concept.cause is None else
+            _encode_mip(concept.cause.mip, arrays),
+            None if concept.effect is None else
+            _encode_mip(concept.effect.mip, arrays))
+
+
+def _decode_concept(encoded, data, subsystem):
+    phi, mechanism, cause, effect = encoded
+    return Concept(
+        phi=phi,
+        mechanism=subsystem.indices2nodes(mechanism),
+        cause=(None if cause is None else
+               Mice(_decode_mip(cause, data, subsystem))),
+        effect=(None if effect is None else
+                Mice(_decode_mip(effect, data, subsystem))),
+        subsystem=subsystem)
+
+
+def _encode_constellation(constellation, arrays):
+    if constellation is None:
+        return None
+    return (isinstance(constellation, tuple),
+            [_encode_concept(concept, arrays) for concept in constellation])
+
+
+def _decode_constellation(encoded, data, subsystem):
+    if encoded is None:
+        return None
+    is_tuple, concepts = encoded
+    concepts = [_decode_concept(concept, data, subsystem)
+                for concept in concepts]
+    return Constellation(concepts) if is_tuple else concepts
+
+
+def summary(big_mip):
+    """Return the scalar data of a |BigMip|.
+
+    Returns:
+        ``dict`` -- The |big_phi| value, the node indices of the subsystem, the
+        cut, and the mechanisms (as node indices) and |small_phi| values of
+        the concepts in the unpartitioned constellation.
+    """
+    return {
+        'phi': big_mip.phi,
+        'node_indices': big_mip.subsystem.node_indices,
+        'cut': tuple(big_mip.cut),
+        'concepts': (None if big_mip.unpartitioned_constellation is None else
+                     [(_indices(concept.mechanism), concept.phi)
+                      for concept in big_mip.unpartitioned_constellation]),
+    }
+
+
+def _encode_big_mip_into(big_mip, arrays):
+    """Return the encoding of a |BigMip| whose arrays are added to
+    ``arrays``."""
+    unpartitioned = _encode_constellation(
+        big_mip.unpartitioned_constellation, arrays)
+    partitioned = _encode_constellation(big_mip.partitioned_constellation,
+                                        arrays)
+    return {
+        'summary': summary(big_mip),
+        # The cut subsystem of a reducible subsystem is the subsystem itself.
+        'is_cut': big_mip.cut_subsystem is not big_mip.subsystem,
+        'unpartitioned_constellation': unpartitioned,
+        'partitioned_constellation': partitioned,
+    }
+
+
+def _encode_big_mip(big_mip):
+    arrays = ArrayWriter(dtype())
+    encoded = _encode_big_mip_into(big_mip, arrays)
+    encoded['data'] = arrays.data()
+    return encoded
+
+
+def _decode_big_mip(encoded, subsystem):
+    return _decode_big_mip_from(encoded, encoded['data'], subsystem)
+
+
+def _decode_big_mip_from(encoded, data, subsystem):
+    """Return the |BigMip| encoded by :func:`_encode_big_mip_into`, given the
+    flat array its arrays were added to."""
+    # Import here to avoid a circular import.
+    from .subsystem import Subsystem
+    if subsystem is None:
+        raise ValueError('A subsystem is needed to decode a BigMip.')
+    if encoded['is_cut']:
+        cut_subsystem = Subsystem(subsystem.node_indices, subsystem.network,
+                                  cut=Cut(*encoded['summary']['cut']),
+                                  mice_cache=subsystem._mice_cache)
+    else:
+        cut_subsystem = subsystem
+    return BigMip(
+        phi=encoded['summary']['phi'],
+        unpartitioned_constellation=_decode_constellation(
+            encoded['unpartitioned_constellation'], data, subsystem),
+        partitioned_constellation=_decode_constellation(
+            encoded['partitioned_constellation'], data, cut_subsystem),
+        subsystem=subsystem,
+        cut_subsystem=cut_subsystem)
+
+
+# Encoding
+# ~~~~~~~~
+
+# Maps type names to ``(type, encode, decode)``. Encoders take an object and
+# return its encoding; decoders take an encoding and a subsystem.
+_codecs = {
+    'BigMip': (BigMip, _encode_big_mip, _decode_big_mip),
+}
+
+
+def register(name, cls, encode_function, decode_function):
+    """Register the compact encoding of a type.
+
+    Args:
+        name (str): The name the type is recorded with.
+        cls (type): The type.
+        encode_function (function): Takes an instance and returns its
+            encoding, which must be made of builtin types and NumPy arrays.
+        decode_function (function): Takes an encoding and a subsystem (which
+            may be ``None``) and returns the instance.
+    """
+    _codecs[name] = (cls, encode_function, decode_function)
+
+
+def encode(obj):
+    """Return the compact encoding of an object.
+
+    Objects of types with no compact encoding are returned as they are.
+    """
+    for name, (cls, encode_function, _) in _codecs.items():
+        if type(obj) is cls:
+            return {'format': 'pyphi', 'version': FORMAT_VERSION,
+                    'type': name, 'value': encode_function(obj)}
+    return obj
+
+
+def is_encoded(obj):
+    """Return whether an object was produced by :func:`encode`."""
+    return isinstance(obj, dict) and obj.get('format') == 'pyphi'
+
+
+def decode(encoded, subsystem=None):
+    """Return the object with the given encoding.
+
+    Args:
+        encoded: The output of :func:`encode`.
+
+    Keyword Args:
+        subsystem (Subsystem): The subsystem the value was computed for, which
+            is not stored in the encoding. This is needed for |BigMip|
+            objects.
+
+    Raises:
+        FormatError: If the encoding has a different format version.
+    """
+    if not is_encoded(encoded):
+        return encoded
+    if encoded['version'] != FORMAT_VERSION:
+        raise FormatError('Cannot decode format version {} (expected '
+                          '{}).'.format(encoded['version'], FORMAT_VERSION))
+    _, _, decode_function = _codecs[encoded['type']]
+    return decode_function(encoded['value'], subsystem)
+
+
+def encoded_summary(encoded):
+    """Return the summary stored in the encoding of a |BigMip| (see
+    :func:`summary`), without decoding the rest of it.
+
+    Returns ``None`` if ``encoded`` is not the encoding of a |BigMip|.
+    """
+    if is_encoded(encoded) and encoded['type'] == 'BigMip':
+        return encoded['value']['summary']
+    if isinstance(encoded, BigMip):
+        return summary(encoded)
+    return None
+
+
+def dumps(obj):
+    """Return the compact encoding of an object as compressed bytes."""
+    compression = config.CACHE_ENCODING['compression']
+    names = [name for name, _, _ in _COMPRESSORS]
+    if compression not in names:
+        raise ValueError('Unknown compression {}; must be one of '
+                         '{}.'.format(compression, names))
+    codec = names.index(compression)
+    data = pickle.dumps(encode(obj), protocol=constants.PICKLE_PROTOCOL)
+    return (_HEADER.pack(MAGIC, FORMAT_VERSION, codec) +
+            _COMPRESSORS[codec][1](data))
+
+
+def loads(data, subsystem=None):
+    """Return the object encoded by :func:`dumps`.
+
+    Values that were stored before this encoding was used (*i.e.* that are
+    not bytes beginning with the header) are returned as they are.
+
+    Keyword Args:
+        subsystem (Subsystem): See :func:`decode`.
+
+    Raises:
+        FormatError: If the data has a different format version.
+    """
+    return decode(load_encoded(data), subsystem=subsystem)
+
+
+def load_encoded(data):
+    """Return the encoding stored by :func:`dumps`, without decoding it.
+
+    Values that were stored before this encoding was used are returned as they
+    are.
+
+    Raises:
+        FormatError: If the data has a different format version.
+    """
+    if not (isinstance(data, bytes) and data.startswith(MAGIC)):
+        return data
+    _, version, codec = _HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise FormatError('Cannot load format version {} (expected '
+                          '{}).'.format(version, FORMAT_VERSION))
+    return pickle.loads(_COMPRESSORS[codec][2](data[_HEADER.size:]))
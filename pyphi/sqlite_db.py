@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# sqlite_db.py
+"""
+Interface to a local SQLite database that exposes it as a key-value store.
+
+This is the storage used when the caching backend is ``'sqlite'``. It has the
+same interface as :mod:`pyphi.db`, but needs no database server: values are
+kept in a single file, given by ``SQLITE_CONFIG['filename']``.
+
+The database is opened in write-ahead-logging mode, so that several processes
+(*e.g.* parallel workers) can read from it while another one writes. Keys are
+the table's primary key, so lookups are indexed. Inserted values are buffered
+in memory and committed in a single transaction once ``SQLITE_CONFIG
+['batch_size']`` of them have accumulated, or when :func:`flush` is called.
+Buffered values are visible to :func:`find` in the same process.
+"""
+
+import os
+import atexit
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from . import constants, config, cache_namespace
+
+
+# The connection is opened lazily; see ``_connect``.
+_connection = None
+# The process the connection was opened in.
+_pid = None
+# Values that have been inserted but not yet committed, keyed by their keys.
+_pending = OrderedDict()
+# Guards the connection and the pending values.
+_lock = threading.RLock()
+# The maximum number of parameters in a query, in old versions of SQLite.
+_MAX_PARAMETERS = 999
+
+
+def _connect():
+    """Return a connection to the database, opening it if necessary.
+
+    SQLite connections can't be shared across processes, so a new one is
+    opened if the process has been forked since the last one was opened."""
+    global _connection, _pid
+    with _lock:
+        if _connection is None or _pid != os.getpid():
+            _connection = sqlite3.connect(
+                config.SQLITE_CONFIG['filename'],
+                timeout=config.SQLITE_CONFIG['timeout'],
+                check_same_thread=False)
+            _connection.execute('PRAGMA journal_mode=WAL')
+            _connection.execute('PRAGMA synchronous=NORMAL')
+            _connection.execute('CREATE TABLE IF NOT EXISTS cache '
+                                '(k TEXT PRIMARY KEY, v BLOB NOT NULL)')
+            _connection.commit()
+            _pid = os.getpid()
+            # Any pending values were inherited from the parent process, which
+            # is responsible for committing them.
+            _pending.clear()
+        return _connection
+
+
+def find(key):
+    """Return the value associated with a key.
+
+    If there is no value with the given key, returns ``None``.
+    """
+    key = str(key)
+    with _lock:
+        connection = _connect()
+        if key in _pending:
+            pickled_value = _pending[key]
+        else:
+            row = connection.execute('SELECT v FROM cache WHERE k = ?',
+                                     (key,)).fetchone()
+            # Return None if we didn't find anything.
+            if row is None:
+                return None
+            pickled_value = row[0]
+    # Unpickle and return the value.
+    return pickle.loads(pickled_value)
+
+
+def insert(key, value):
+    """Store a value with a key.
+
+    If the key is already present in the database, this does nothing."""
+    insert_many([(key, value)])
+
+
+def find_many(keys):
+    """Return the values associated with several keys, with a single query.
+
+    Returns:
+        ``dict`` -- A mapping from the keys that were found to their values.
+    """
+    keys = {str(key): key for key in keys}
+    found = {}
+    with _lock:
+        connection = _connect()
+        for key in keys:
+            if key in _pending:
+                found[key] = _pending[key]
+        missing = [key for key in keys if key not in found]
+        # Stay below SQLite's limit on the number of query parameters.
+        for i in range(0, len(missing), _MAX_PARAMETERS):
+            chunk = missing[i:i + _MAX_PARAMETERS]
+            found.update(connection.execute(
+                'SELECT k, v FROM cache WHERE k IN ({})'.format(
+                    ', '.join('?' * len(chunk))), chunk))
+    return {keys[key]: pickle.loads(value) for key, value in found.items()}
+
+
+def insert_many(items):
+    """Store several key-value pairs.
+
+    Keys that are already present in the database are left untouched.
+
+    Args:
+        items (Iterable): Pairs of keys and values.
+    """
+    items = list(items)
+    fingerprints = cache_namespace.new_fingerprints(
+        __name__, [key for key, _ in items])
+    with _lock:
+        _connect()
+        for key, value in items + fingerprints:
+            key = str(key)
+            if key not in _pending:
+                _pending[key] = sqlite3.Binary(
+                    pickle.dumps(value, protocol=constants.PICKLE_PROTOCOL))
+        cache_namespace.fingerprints_written(__name__, fingerprints)
+        if len(_pending) >= config.SQLITE_CONFIG['batch_size']:
+            flush()
+
+
+def flush():
+    """Commit all pending values to the database in a single transaction."""
+    with _lock:
+        if not _pending or _pid != os.getpid():
+            return
+        connection = _connect()
+        with connection:
+            # Keys are unique, so existing values are left untouched.
+            connection.executemany(
+                'INSERT OR IGNORE INTO cache (k, v) VALUES (?, ?)',
+                list(_pending.items()))
+        _pending.clear()
+
+
+def clear():
+    """Remove all values from the database, including pending ones."""
+    with _lock:
+        connection = _connect()
+        _pending.clear()
+        with connection:
+            connection.execute('DELETE FROM cache')
+    cache_namespace.forget_fingerprints(__name__)
+
+
+def namespaces():
+    """Return the names of the cache namespaces in the database (see
+    :mod:`pyphi.cache_namespace`)."""
+    with _lock:
+        flush()
+        rows = _connect().execute(
+            "SELECT DISTINCT CASE WHEN instr(k, ':') > 0 "
+            "THEN substr(k, 1, instr(k, ':') - 1) ELSE '' END FROM cache")
+        return {row[0] for row in rows}
+
+
+def delete_namespace(namespace):
+    """Remove all the values in a cache namespace from the database."""
+    with _lock:
+        flush()
+        connection = _connect()
+        with connection:
+            if namespace == cache_namespace.LEGACY:
+                connection.execute("DELETE FROM cache WHERE instr(k, ':') = 0")
+            else:
+                prefix = namespace + ':'
+                connection.execute(
+                    'DELETE FROM cache WHERE substr(k, 1, ?) = ?',
+                    (len(prefix), prefix))
+    cache_namespace.forget_fingerprints(__name__)
+
+
+def close():
+    """Commit pending values and close the connection."""
+    global _connection, _pid
+    with _lock:
+        if _connection is not None and _pid == os.getpid():
+            flush()
+            _connection.close()
+        _connection, _pid = None, None
+
+
+def size():
+    """Return the number of values in the database and an estimate of the
+    number of bytes they use."""
+    with _lock:
+        connection = _connect()
+        count, nbytes = connection.execute(
+            'SELECT COUNT(*), TOTAL(LENGTH(v)) FROM cache').fetchone()
+        return (count + len(_pending),
+                int(nbytes) + sum(len(v) for v in _pending.values()))
+
+
+# Don't lose buffered values when the interpreter exits.
+atexit.register(close)
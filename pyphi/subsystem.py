@@ -7,15 +7,89 @@ Represents a candidate set for |phi| calculation.
 """
 
 import os
+import threading
+from collections import OrderedDict
+
 import psutil
 import numpy as np
 from .constants import DIRECTIONS, PAST, FUTURE
 from .lru_cache import lru_cache
-from . import constants, config, validate, utils, convert, json
+from . import (constants, config, validate, utils, convert, json, cache_stats,
+               memory)
 from .models import Cut, Mip, Part, Mice, Concept
 from .node import Node
 
 
+# The MICE cache shared by subsystems that aren't given one explicitly.
+_mice_cache = dict()
+# Tables of unconstrained repertoires stored by :func:`pyphi.warmup.precompute`,
+# keyed by :meth:`Subsystem._unconstrained_repertoires_key`. Each table maps
+# pairs of a direction and purview indices to a repertoire. Tables are loaded
+# from the caching backend the first time they are needed in each process; the
+# tables of subsystems that weren't precomputed are empty. Only the most
+# recently used tables are kept.
+_unconstrained_repertoires = OrderedDict()
+# The name that the tables are stored under (see :func:`memory.store_value`).
+STORED_UNCONSTRAINED_REPERTOIRES = 'unconstrained_repertoires'
+_UNCONSTRAINED_REPERTOIRES_CACHE_SIZE = 64
+# Guards the tables, which may be used by several threads.
+_unconstrained_repertoires_lock = threading.Lock()
+# Hit and miss counts for lookups in the tables.
+_unconstrained_repertoire_counter = cache_stats.Counter()
+cache_stats.register(
+    'pyphi.subsystem.unconstrained_repertoires',
+    lambda: _unconstrained_repertoire_counter.stats(
+        size=len(_unconstrained_repertoires),
+        nbytes=cache_stats.estimate_nbytes(_unconstrained_repertoires)),
+    reset=_unconstrained_repertoire_counter.reset,
+    clear=lambda: _unconstrained_repertoires.clear())
+# Hit and miss counts for MICE caches.
+_mice_cache_counter = cache_stats.Counter()
+cache_stats.register(
+    'pyphi.subsystem.mice_cache',
+    lambda: _mice_cache_counter.stats(
+        size=len(_mice_cache),
+        nbytes=cache_stats.estimate_nbytes(_mice_cache)),
+    reset=_mice_cache_counter.reset)
+# Hit and miss counts for the caches of expanded repertoires, which are held
+# by each subsystem.
+_expanded_repertoire_counter = cache_stats.Counter()
+# The maximum number of expanded repertoires cached by each subsystem; the
+# least recently used are evicted.
+_EXPANDED_REPERTOIRE_CACHE_SIZE = 1024
+# Guards the caches of expanded repertoires, which may be used by several
+# threads.
+_expanded_repertoire_lock = threading.Lock()
+cache_stats.register(
+    'pyphi.subsystem.expanded_repertoire_cache',
+    _expanded_repertoire_counter.stats,
+    reset=_expanded_repertoire_counter.reset)
+
+
+def _add_unconstrained_repertoires(key, table):
+    """Keep a table of unconstrained repertoires in this process."""
+    with _unconstrained_repertoires_lock:
+        _unconstrained_repertoires[key] = table
+        _unconstrained_repertoires.move_to_end(key)
+        while (len(_unconstrained_repertoires) >
+               _UNCONSTRAINED_REPERTOIRES_CACHE_SIZE):
+            _unconstrained_repertoires.popitem(last=False)
+            _unconstrained_repertoire_counter.evict()
+
+
+def _unconstrained_repertoire_table(key):
+    """Return the table of unconstrained repertoires with a key, loading it
+    from the caching backend if this process doesn't have it."""
+    with _unconstrained_repertoires_lock:
+        table = _unconstrained_repertoires.get(key)
+        if table is not None:
+            _unconstrained_repertoires.move_to_end(key)
+            return table
+    table = memory.load_value(STORED_UNCONSTRAINED_REPERTOIRES, key) or {}
+    _add_unconstrained_repertoires(key, table)
+    return table
+
+
 # TODO! go through docs and make sure to say when things can be None
 class Subsystem:
 
@@ -41,7 +115,7 @@ class Subsystem:
             external nodes.
     """
 
-    def __init__(self, node_indices, network, cut=None, mice_cache=dict()):
+    def __init__(self, node_indices, network, cut=None, mice_cache=None):
         # The network this subsystem belongs to.
         self.network = network
         # Remove duplicates and sort node indices.
@@ -72,16 +146,33 @@ class Subsystem:
         self.current_tpm = utils.condition_tpm(
             self.network.tpm, self.external_indices,
             self.network.current_state)
+        # The states of the external nodes, which determine the TPMs above.
+        self._boundary_state = tuple(
+            (network.past_state[i], network.current_state[i])
+            for i in sorted(self.external_indices))
         # Generate the nodes.
         self.nodes = tuple(Node(self.network, i, self) for i in
                            self.node_indices)
         # A cache for keeping core causes and effects that can be reused later
         # in the event that a cut doesn't effect them.
-        self._mice_cache = mice_cache
+        self._mice_cache = (mice_cache if mice_cache is not None
+                            else _mice_cache)
+        # Computed when precomputed unconstrained repertoires are looked up.
+        self._repertoires_key = None
+        # Repertoires expanded over the whole subsystem (see
+        # :meth:`expand_repertoire`).
+        self._expanded_repertoires = OrderedDict()
 
     def __repr__(self):
         return "Subsystem(" + repr(self.nodes) + ")"
 
+    def __reduce__(self):
+        # Pickle a reference to the network and the node indices and cut
+        # rather than the nodes and TPMs, which are rebuilt (from the network's
+        # caches, if it shares those of a network unpickled earlier) when
+        # unpickling. Unpickled subsystems use the shared MICE cache.
+        return (Subsystem, (self.node_indices, self.network, self.cut))
+
     def __str__(self):
         return repr(self)
 
@@ -118,10 +209,16 @@ class Subsystem:
     def __hash__(self):
         return self._hash
 
+    def canonical_form(self):
+        """Return the data that determine the subsystem, for use with
+        :func:`pyphi.utils.stable_hash`."""
+        return (self.node_indices, tuple(self.cut), self.network)
+
     def json_dict(self):
         return {
             'node_indices': json.make_encodable(self.node_indices),
             'cut': json.make_encodable(self.cut),
+            'network': json.make_encodable(self.network),
         }
 
     def indices2nodes(self, indices):
@@ -334,9 +431,32 @@ class Subsystem:
         elif direction == DIRECTIONS[FUTURE]:
             return self.effect_repertoire
 
+    def _unconstrained_repertoires_key(self):
+        """Return the key of this subsystem's precomputed unconstrained
+        repertoires.
+
+        Unconstrained repertoires don't depend on the cut or on the state of
+        the subsystem's nodes, only on the network's TPM, connectivity matrix,
+        and perturbation vector, the subsystem's nodes, and the state of the
+        external nodes; so every cut of a subsystem, and every state of the
+        network that leaves the external nodes in the same state, shares them.
+        """
+        if self._repertoires_key is None:
+            self._repertoires_key = (self.network._get_arrays_digest(),
+                                     self.node_indices, self._boundary_state)
+        return self._repertoires_key
+
     def _unconstrained_repertoire(self, direction, purview):
         """Return the unconstrained cause or effect repertoire over a
         purview."""
+        # Use the precomputed repertoire, if there is one.
+        table = _unconstrained_repertoire_table(
+            self._unconstrained_repertoires_key())
+        repertoire = table.get((direction, convert.nodes2indices(purview)))
+        if repertoire is not None:
+            _unconstrained_repertoire_counter.hit()
+            return repertoire
+        _unconstrained_repertoire_counter.miss()
         return self._get_repertoire(direction)((), purview)
 
     def unconstrained_cause_repertoire(self, purview):
@@ -353,28 +473,60 @@ class Subsystem:
         """
         return self._unconstrained_repertoire(DIRECTIONS[FUTURE], purview)
 
-    def expand_repertoire(self, direction, purview, repertoire):
+    def expand_repertoire(self, direction, purview, repertoire, cache=True):
         """Return the unconstrained cause or effect repertoire based on a
-        direction."""
+        direction.
+
+        Unless ``cache`` is ``False``, expanded repertoires are cached on the
+        subsystem, keyed by the direction, the purview, and the contents of
+        the repertoire, so each one is only computed once however many
+        concepts share it (*e.g.* the concepts of the unpartitioned
+        constellation, which are compared with the constellation of every
+        cut). Only the most recently used repertoires are kept. The returned
+        array is read-only.
+        """
         validate.direction(direction)
+        repertoire = np.asarray(repertoire)
+        if cache:
+            key = (direction, frozenset(convert.nodes2indices(purview)),
+                   repertoire.shape, repertoire.tobytes())
+            with _expanded_repertoire_lock:
+                expanded = self._expanded_repertoires.get(key)
+                if expanded is not None:
+                    self._expanded_repertoires.move_to_end(key)
+            if expanded is not None:
+                _expanded_repertoire_counter.hit()
+                return expanded
+            _expanded_repertoire_counter.miss()
         # Get the unconstrained repertoire over the other nodes in the network.
         non_purview_nodes = tuple(frozenset(self.nodes) - frozenset(purview))
         uc = self._unconstrained_repertoire(direction, non_purview_nodes)
         # Multiply the given repertoire by the unconstrained one to get a
         # distribution over all the nodes in the network.
-        return repertoire * uc
+        expanded = repertoire * uc
+        expanded.flags.writeable = False
+        if cache:
+            with _expanded_repertoire_lock:
+                self._expanded_repertoires[key] = expanded
+                if (len(self._expanded_repertoires) >
+                        _EXPANDED_REPERTOIRE_CACHE_SIZE):
+                    self._expanded_repertoires.popitem(last=False)
+                    _expanded_repertoire_counter.evict()
+        return expanded
 
     # TODO test expand cause repertoire
-    def expand_cause_repertoire(self, purview, repertoire):
+    def expand_cause_repertoire(self, purview, repertoire, cache=True):
         """Expand a partial cause repertoire over a purview to a distribution
         over the entire subsystem's state space."""
-        return self.expand_repertoire(DIRECTIONS[PAST], purview, repertoire)
+        return self.expand_repertoire(DIRECTIONS[PAST], purview, repertoire,
+                                      cache=cache)
 
     # TODO test expand effect repertoire
-    def expand_effect_repertoire(self, purview, repertoire):
+    def expand_effect_repertoire(self, purview, repertoire, cache=True):
         """Expand a partial effect repertoire over a purview to a distribution
         over the entire subsystem's state space."""
-        return self.expand_repertoire(DIRECTIONS[FUTURE], purview, repertoire)
+        return self.expand_repertoire(DIRECTIONS[FUTURE], purview, repertoire,
+                                      cache=cache)
 
     def cause_info(self, mechanism, purview):
         """Return the cause information for a mechanism over a purview."""
@@ -641,7 +793,9 @@ class Subsystem:
         # Return a cached MICE if there's a hit.
         cached_mice = self._get_cached_mice(direction, mechanism)
         if cached_mice:
+            _mice_cache_counter.hit()
             return cached_mice
+        _mice_cache_counter.miss()
 
         validate.direction(direction)
 
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# symmetry.py
+"""
+Reuse of concepts across the symmetries of a subsystem.
+
+An automorphism of a subsystem is a permutation of its nodes that leaves the
+TPMs, connectivity (with the subsystem's cut applied), perturbation
+probabilities, and states unchanged. If ``sigma`` is an automorphism, the
+concept of the mechanism ``sigma(M)`` is the concept of ``M`` with every node
+relabeled by ``sigma``, so it can be obtained by permuting the axes of the
+repertoires of the concept of ``M`` rather than computed again.
+
+:func:`constellation_concepts` computes one concept per orbit of mechanisms
+under the automorphisms and relabels it for the other mechanisms in the orbit.
+It is used by :func:`pyphi.compute.constellation` when
+``REUSE_SYMMETRIC_CONCEPTS`` is enabled.
+
+.. note::
+    When several purviews (or partitions) of a mechanism have the same |phi|,
+    which one is chosen depends on the order in which they are evaluated, so a
+    relabeled concept may have a different (but equally irreducible) purview
+    than the one that would be computed directly. The same is true of concepts
+    retrieved from the concept cache.
+"""
+
+import numpy as np
+
+from . import config
+from .lru_cache import lru_cache
+from .models import Concept, Mice, Mip, Part
+
+
+def _permute_tpm(tpm, sigma, inverse):
+    """Return the TPM of the network with its nodes relabeled by ``sigma``.
+
+    ``tpm`` is in state-by-node form, so both the state dimensions and the
+    last dimension are permuted."""
+    # Dimension ``sigma[k]`` of the result is dimension ``k`` of the TPM.
+    return tpm.transpose(list(inverse) + [tpm.ndim - 1])[..., list(inverse)]
+
+
+def _is_automorphism(subsystem, sigma, inverse):
+    nodes = list(subsystem.node_indices)
+    image = [sigma[i] for i in nodes]
+    cm = subsystem.connectivity_matrix
+    if not np.array_equal(cm[np.ix_(nodes, nodes)], cm[np.ix_(image, image)]):
+        return False
+    tolerance = 10 ** -config.PRECISION
+    for tpm in (subsystem.past_tpm, subsystem.current_tpm):
+        permuted = _permute_tpm(tpm, sigma, inverse)
+        if not np.allclose(permuted[..., nodes], tpm[..., nodes],
+                           atol=tolerance):
+            return False
+    return True
+
+
+def _signature(subsystem, index):
+    """Return data about a node that every automorphism preserves."""
+    network = subsystem.network
+    nodes = list(subsystem.node_indices)
+    cm = subsystem.connectivity_matrix
+    return (network.current_state[index], network.past_state[index],
+            network.perturb_vector[index], cm[index, index],
+            int(cm[nodes, index].sum()), int(cm[index, nodes].sum()))
+
+
+@lru_cache(maxmem=config.MAXIMUM_CACHE_MEMORY_PERCENTAGE)
+def automorphisms(subsystem):
+    """Return the automorphisms of a subsystem.
+
+    Each automorphism is a tuple ``sigma`` mapping every node index in the
+    network to its image; nodes outside the subsystem are left fixed. The
+    identity is always included.
+
+    Returns:
+        ``tuple(tuple(int))`` -- The automorphisms.
+    """
+    nodes = subsystem.node_indices
+    cm = subsystem.connectivity_matrix
+    signatures = {i: _signature(subsystem, i) for i in nodes}
+    found = []
+    sigma = list(range(subsystem.network.size))
+
+    def extend(position, used):
+        # Assign an image to each subsystem node in turn, only trying images
+        # with the same signature that preserve the connections among the
+        # nodes assigned so far.
+        if position == len(nodes):
+            inverse = list(np.argsort(sigma))
+            if _is_automorphism(subsystem, sigma, inverse):
+                found.append(tuple(sigma))
+            return
+        i = nodes[position]
+        for j in nodes:
+            if j in used or signatures[j] != signatures[i]:
+                continue
+            if any(cm[i, k] != cm[j, sigma[k]] or cm[k, i] != cm[sigma[k], j]
+                   for k in nodes[:position]):
+                continue
+            sigma[i] = j
+            extend(position + 1, used | {j})
+        sigma[i] = i
+
+    extend(0, frozenset())
+    return tuple(found)
+
+
+def _relabel_nodes(nodes, sigma, subsystem):
+    if nodes is None:
+        return None
+    return subsystem.indices2nodes({sigma[n.index] for n in nodes})
+
+
+def _relabel_repertoire(repertoire, inverse):
+    if repertoire is None or repertoire.ndim != len(inverse):
+        return repertoire
+    # Axis ``sigma[k]`` of the result is axis ``k`` of the repertoire.
+    return repertoire.transpose(inverse)
+
+
+def _relabel_mice(mice, sigma, inverse, subsystem):
+    if mice is None:
+        return None
+    mip = mice.mip
+    partition = mip.partition
+    if partition is not None:
+        partition = tuple(
+            Part(mechanism=_relabel_nodes(part.mechanism, sigma, subsystem),
+                 purview=_relabel_nodes(part.purview, sigma, subsystem))
+            for part in partition)
+    return Mice(Mip(
+        phi=mip.phi,
+        direction=mip.direction,
+        mechanism=_relabel_nodes(mip.mechanism, sigma, subsystem),
+        purview=_relabel_nodes(mip.purview, sigma, subsystem),
+        partition=partition,
+        unpartitioned_repertoire=_relabel_repertoire(
+            mip.unpartitioned_repertoire, inverse),
+        partitioned_repertoire=_relabel_repertoire(
+            mip.partitioned_repertoire, inverse)))
+
+
+def relabel_concept(concept, sigma, subsystem):
+    """Return the concept of the image of a concept's mechanism under an
+    automorphism ``sigma`` of the subsystem."""
+    inverse = tuple(np.argsort(sigma))
+    return Concept(
+        phi=concept.phi,
+        mechanism=_relabel_nodes(concept.mechanism, sigma, subsystem),
+        cause=_relabel_mice(concept.cause, sigma, inverse, subsystem),
+        effect=_relabel_mice(concept.effect, sigma, inverse, subsystem),
+        subsystem=subsystem)
+
+
+def orbits(subsystem, mechanisms):
+    """Group mechanisms by their orbits under the automorphisms of a
+    subsystem.
+
+    Args:
+        subsystem (Subsystem): The subsystem.
+        mechanisms (Iterable(tuple(Node))): The mechanisms.
+
+    Returns:
+        ``dict`` -- A mapping from the index of a representative mechanism in
+        ``mechanisms`` to a list of pairs of the indices of the mechanisms in
+        its orbit and an automorphism sending the representative to them.
+    """
+    group = automorphisms(subsystem)
+    representatives = {}
+    result = {}
+    for position, mechanism in enumerate(mechanisms):
+        indices = frozenset(n.index for n in mechanism)
+        if indices in representatives:
+            representative, sigma = representatives[indices]
+            result[representative].append((position, sigma))
+            continue
+        result[position] = []
+        # Record every image of this mechanism, so that it is the
+        # representative of its orbit.
+        for sigma in group:
+            image = frozenset(sigma[i] for i in indices)
+            if image not in representatives:
+                representatives[image] = (position, sigma)
+    return result
+
+
+def constellation_concepts(subsystem, mechanisms, compute_concepts):
+    """Return the concepts of several mechanisms, computing one per orbit of
+    the automorphisms of the subsystem and relabeling it for the others.
+
+    Args:
+        subsystem (Subsystem): The subsystem.
+        mechanisms (Iterable(tuple(Node))): The mechanisms.
+        compute_concepts (function): Takes a list of mechanisms and returns
+            their concepts.
+
+    Returns:
+        ``list(Concept)`` -- The concepts, in the same order as the
+        mechanisms.
+    """
+    mechanisms = list(mechanisms)
+    groups = orbits(subsystem, mechanisms)
+    representatives = sorted(groups)
+    concepts = [None] * len(mechanisms)
+    computed = compute_concepts([mechanisms[i] for i in representatives])
+    for i, concept in zip(representatives, computed):
+        concepts[i] = concept
+        for position, sigma in groups[i]:
+            if concept.cause is None and concept.effect is None:
+                # A trivially reducible concept.
+                concepts[position] = concept._replace(
+                    mechanism=mechanisms[position])
+            else:
+                concepts[position] = relabel_concept(concept, sigma,
+                                                     subsystem)
+    return concepts
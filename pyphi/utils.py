@@ -7,6 +7,7 @@ Functions used by more than one PyPhi module or class, or that might be of
 external use.
 """
 
+import os
 import re
 import hashlib
 import numpy as np
@@ -91,6 +92,84 @@ def np_hash(a):
     return int(hashlib.sha1(a.view(a.dtype)).hexdigest(), 16)
 
 
+def _update_stable_hash(h, obj):
+    """Feed a canonical byte encoding of an object to a hash object.
+
+    Every value is prefixed with a tag identifying its type, and containers
+    are prefixed with their length, so that different objects never have the
+    same encoding."""
+    if obj is None:
+        h.update(b'N')
+    elif isinstance(obj, (bool, np.bool_)):
+        h.update(b'B1' if obj else b'B0')
+    elif isinstance(obj, (int, np.integer)):
+        h.update(b'I' + str(int(obj)).encode() + b';')
+    elif isinstance(obj, (float, np.floating)):
+        # ``repr`` gives the shortest string that round-trips.
+        h.update(b'F' + repr(float(obj)).encode() + b';')
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        h.update(b'S' + str(len(data)).encode() + b':' + data)
+    elif isinstance(obj, bytes):
+        h.update(b'Y' + str(len(obj)).encode() + b':' + obj)
+    elif isinstance(obj, np.ndarray):
+        # Ensure that hashes are equal whatever the ordering in memory (C or
+        # Fortran).
+        a = np.ascontiguousarray(obj)
+        h.update(b'A' + a.dtype.str.encode() + b'|' +
+                 str(a.shape).encode() + b':')
+        h.update(a.view(a.dtype))
+    elif isinstance(obj, (tuple, list)):
+        h.update(b'T' + str(len(obj)).encode() + b':')
+        for item in obj:
+            _update_stable_hash(h, item)
+    elif isinstance(obj, dict):
+        h.update(b'D' + str(len(obj)).encode() + b':')
+        for digest, value in sorted((stable_hash(k), v)
+                                    for k, v in obj.items()):
+            h.update(digest.encode())
+            _update_stable_hash(h, value)
+    elif isinstance(obj, (set, frozenset)):
+        h.update(b'E' + str(len(obj)).encode() + b':')
+        for digest in sorted(stable_hash(item) for item in obj):
+            h.update(digest.encode())
+    elif hasattr(obj, 'canonical_form'):
+        h.update(b'O' + type(obj).__name__.encode() + b':')
+        _update_stable_hash(h, obj.canonical_form())
+    elif hasattr(obj, 'pack'):
+        # Marbls and MarblSets have a canonical serialization.
+        h.update(b'P' + type(obj).__name__.encode() + b':')
+        _update_stable_hash(h, obj.pack())
+    else:
+        raise TypeError('Cannot compute a stable hash of {}.'.format(
+            type(obj).__name__))
+
+
+def stable_hash(obj):
+    """Return a hash of an object that is the same in every process.
+
+    Unlike the built-in ``hash``, which is randomized per process for strings,
+    this is the SHA-1 digest of a canonical byte encoding of the object, so it
+    can be used as a key in persistent caches. Supported objects are ``None``,
+    numbers, strings, bytes, NumPy arrays, tuples, lists, dictionaries, and
+    sets of these, and objects with a ``canonical_form`` method returning one
+    of these (*e.g.* |Network| and |Subsystem|).
+
+    Returns:
+        ``str`` -- A hexadecimal digest.
+
+    Example:
+        >>> from pyphi.utils import stable_hash
+        >>> stable_hash((1, 'a')) == stable_hash([1, 'a'])
+        True
+        >>> stable_hash((1, 'a')) == stable_hash(('1', 'a'))
+        False
+    """
+    h = hashlib.sha1()
+    _update_stable_hash(h, obj)
+    return h.hexdigest()
+
+
 def phi_eq(x, y):
     """Compare two phi values up to |PRECISION|."""
     return abs(x - y) < constants.EPSILON
@@ -270,6 +349,60 @@ def hamming_emd(d1, d2):
     return emd(d1.ravel(), d2.ravel(), _hamming_matrix(d1.ndim))
 
 
+def hamming_emd_matrix(d1s, d2s):
+    """Return the Earth Mover's Distances between every pair of distributions
+    in two stacks of distributions.
+
+    Identical distributions are common, so the EMD is only computed once for
+    each pair of distinct distributions.
+
+    Args:
+        d1s (np.ndarray): The first distributions, stacked along the first
+            axis, each indexed by state, with one dimension per node.
+        d2s (np.ndarray): The second distributions, likewise. They must have
+            the same shape as the first ones.
+
+    Returns:
+        ``np.ndarray`` -- The matrix whose entry |i,j| is
+        ``hamming_emd(d1s[i], d2s[j])``.
+
+    Example:
+        >>> d1s = np.array([[0.5, 0.5], [1.0, 0.0]])
+        >>> d2s = np.array([[0.0, 1.0], [0.5, 0.5], [0.0, 1.0]])
+        >>> hamming_emd_matrix(d1s, d2s)
+        array([[ 0.5,  0. ,  0.5],
+               [ 1. ,  0.5,  1. ]])
+    """
+    if not len(d1s) or not len(d2s):
+        return np.zeros((len(d1s), len(d2s)))
+    # The number of nodes with more than one state.
+    N = sum(size > 1 for size in d1s.shape[1:])
+    hamming_matrix = _hamming_matrix(N)
+    d1s = np.ascontiguousarray(d1s.reshape(len(d1s), -1), dtype=np.float64)
+    d2s = np.ascontiguousarray(d2s.reshape(len(d2s), -1), dtype=np.float64)
+    unique1, index1 = _unique_rows(d1s)
+    unique2, index2 = _unique_rows(d2s)
+    distances = np.array([
+        [0.0 if np.array_equal(d1, d2) else emd(d1, d2, hamming_matrix)
+         for d2 in unique2]
+        for d1 in unique1])
+    return distances[np.ix_(index1, index2)]
+
+
+def _unique_rows(rows):
+    """Return the distinct rows of a contiguous 2-D array and, for each row,
+    the index of its distinct row.
+
+    This is ``np.unique(rows, axis=0, return_inverse=True)``, which requires
+    numpy 1.13, done by comparing the rows as raw bytes.
+    """
+    rows = np.ascontiguousarray(rows)
+    view = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1])))
+    _, index, inverse = np.unique(view.ravel(), return_index=True,
+                                  return_inverse=True)
+    return rows[index], inverse
+
+
 # TODO? [optimization] optimize this to use indices rather than nodes
 # TODO? are native lists really slower
 def bipartition(a):
@@ -324,13 +457,22 @@ def bipartition_indices(N):
 # =============================================================================
 
 
-# TODO cache this persistently; it's exponential
+def hamming_matrix_filename(N):
+    """Return the file the Hamming matrix for |N| nodes is stored in by
+    :func:`pyphi.warmup.precompute`."""
+    return os.path.join(config.PERSISTENT_CACHE_DIRECTORY, 'hamming',
+                        '{}.npy'.format(N))
+
+
 # TODO extend to nonbinary nodes
 @lru_cache(maxmem=config.MAXIMUM_CACHE_MEMORY_PERCENTAGE)
 def _hamming_matrix(N):
     """Return a matrix of Hamming distances for the possible states of |N|
     binary nodes.
 
+    The matrix is loaded from disk if it has been stored with
+    :func:`pyphi.warmup.precompute`.
+
     Args:
         N (int): The number of nodes under consideration
 
@@ -346,6 +488,14 @@ def _hamming_matrix(N):
                [ 1.,  2.,  0.,  1.],
                [ 2.,  1.,  1.,  0.]])
     """
+    filename = hamming_matrix_filename(N)
+    if os.path.exists(filename):
+        return np.load(filename)
+    return compute_hamming_matrix(N)
+
+
+def compute_hamming_matrix(N):
+    """Compute the matrix returned by :func:`_hamming_matrix`."""
     possible_states = np.array([list(bin(state)[2:].zfill(N)) for state in
                                 range(2 ** N)])
     return cdist(possible_states, possible_states, 'hamming') * N
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# warmup.py
+"""
+Precomputation of the parts of a calculation that don't depend on mechanisms.
+
+Every |big_phi| calculation on a network needs the same building blocks: the
+Hamming matrices used by the EMD for every purview size, the index tables of
+the bipartitions of every subsystem size, the unconstrained cause and effect
+repertoires over every purview, and the TPMs of the nodes of the subsystem and
+each of its cuts (which marginalize every node's CPT). Each process computes
+these the first time it needs them, so parallel jobs pay the same cost in every
+worker.
+
+:func:`precompute` computes them ahead of time, in parallel, and persists
+them:
+
+- Hamming matrices are stored in ``PERSISTENT_CACHE_DIRECTORY/hamming`` and
+  loaded from there by every process;
+- unconstrained repertoires are stored in the current caching backend, in the
+  namespace of the current settings (see :mod:`pyphi.cache_namespace`), and
+  loaded from there the first time a subsystem needs them in each process,
+  including later processes and parallel workers. They are shared by every cut
+  of a subsystem and every state of the network that leaves the nodes outside
+  the subsystem in the same state.
+
+Node TPMs are cached on the network, and shared with its other states (see
+:meth:`pyphi.network.Network.with_state`), so they are only computed in the
+process that calls :func:`precompute`.
+
+Calling :func:`precompute` again, in any process, loads the stored values
+instead of recomputing them. It can also be run from the command line, given a
+network stored as JSON or the name of a network in :mod:`pyphi.examples`::
+
+    python -m pyphi.warmup network.json
+"""
+
+import argparse
+import json
+import os
+import logging
+
+import numpy as np
+from joblib import Parallel, delayed
+
+from . import config, memory, utils, examples, subsystem as _subsystem
+from .constants import DIRECTIONS, PAST, FUTURE
+from .models import Cut
+from .network import Network
+from .subsystem import Subsystem
+
+
+log = logging.getLogger(__name__)
+
+
+def _save_hamming_matrix(N):
+    filename = utils.hamming_matrix_filename(N)
+    if os.path.exists(filename):
+        return
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # Write to a temporary file first, so that other processes never load a
+    # partially written matrix.
+    temporary = '{}.{}.tmp.npy'.format(filename[:-len('.npy')], os.getpid())
+    np.save(temporary, utils.compute_hamming_matrix(N))
+    os.replace(temporary, filename)
+
+
+def unconstrained_repertoires(subsystem):
+    """Return the unconstrained cause and effect repertoires of a subsystem
+    over every purview.
+
+    Returns:
+        ``dict`` -- A mapping from pairs of a direction and purview indices to
+        repertoires.
+    """
+    repertoires = dict()
+    for purview in utils.powerset(subsystem.node_indices):
+        nodes = subsystem.indices2nodes(purview)
+        for direction in (DIRECTIONS[PAST], DIRECTIONS[FUTURE]):
+            repertoires[(direction, purview)] = subsystem._get_repertoire(
+                direction)((), nodes)
+    return repertoires
+
+
+def _precompute_subsystem(subsystem):
+    """Load or compute and store the unconstrained repertoires of a
+    subsystem."""
+    key = subsystem._unconstrained_repertoires_key()
+    repertoires = memory.load_value(
+        _subsystem.STORED_UNCONSTRAINED_REPERTOIRES, key)
+    if repertoires is None:
+        repertoires = unconstrained_repertoires(subsystem)
+        memory.store_value(_subsystem.STORED_UNCONSTRAINED_REPERTOIRES, key,
+                           repertoires)
+    return repertoires
+
+
+def _precompute_node_tpms(subsystem):
+    """Compute the TPMs of the nodes of every cut of a subsystem, caching them
+    on its network.
+
+    Returns:
+        ``int`` -- The number of cuts.
+    """
+    cuts = 0
+    for partition in utils.bipartition(subsystem.node_indices)[1:]:
+        for cut in (Cut(partition[0], partition[1]),
+                    Cut(partition[1], partition[0])):
+            # Creating the subsystem creates its nodes, which cache their TPMs.
+            Subsystem(subsystem.node_indices, subsystem.network, cut=cut)
+            cuts += 1
+    return cuts
+
+
+def precompute(network, subsystems=None, parallel=True):
+    """Precompute and store the mechanism-independent parts of calculations
+    on a network.
+
+    Args:
+        network (Network): The network.
+
+    Keyword Args:
+        subsystems (Iterable(Subsystem)): The subsystems whose unconstrained
+            repertoires and node TPMs are precomputed. Defaults to the
+            subsystem of all the nodes in the network.
+        parallel (bool): Whether to precompute in parallel, using
+            ``NUMBER_OF_CORES`` cores.
+
+    Returns:
+        ``dict`` -- The number of Hamming matrices, bipartition tables,
+        subsystems, and cuts that were precomputed.
+    """
+    if subsystems is None:
+        subsystems = [Subsystem(network.node_indices, network)]
+    subsystems = list(subsystems)
+    sizes = range(1, network.size + 1)
+    log.info('Precomputing building blocks for {}...'.format(network))
+
+    if parallel:
+        run = Parallel(n_jobs=config.NUMBER_OF_CORES,
+                       verbose=config.PARALLEL_VERBOSITY)
+    else:
+        def run(calls):
+            return [function(*args, **kwargs)
+                    for function, args, kwargs in calls]
+    run(delayed(_save_hamming_matrix)(N) for N in sizes)
+    tables = run(delayed(_precompute_subsystem)(subsystem)
+                 for subsystem in subsystems)
+
+    # Warm this process's caches.
+    for N in sizes:
+        utils._hamming_matrix(N)
+    for N in range(network.size + 1):
+        utils.bipartition_indices(N)
+    cuts = 0
+    for subsystem, table in zip(subsystems, tables):
+        _subsystem._add_unconstrained_repertoires(
+            subsystem._unconstrained_repertoires_key(), table)
+        cuts += _precompute_node_tpms(subsystem)
+
+    log.info('Finished precomputing building blocks for {}.'.format(network))
+    return {
+        'hamming_matrices': len(sizes),
+        'bipartition_tables': network.size + 1,
+        'subsystems': len(subsystems),
+        'cuts': cuts,
+    }
+
+
+def load_network(name):
+    """Return the network stored as JSON in a file, or the network returned
+    by the function of that name in :mod:`pyphi.examples`."""
+    if not os.path.exists(name) and hasattr(examples, name):
+        return getattr(examples, name)()
+    with open(name) as f:
+        data = json.load(f)
+    return Network(data['tpm'], data['current_state'], data['past_state'],
+                   connectivity_matrix=data.get('connectivity_matrix'))
+
+
+def main(argv=None):
+    """Precompute the building blocks for a network from the command line."""
+    parser = argparse.ArgumentParser(
+        prog='python -m pyphi.warmup',
+        description='Precompute and store the mechanism-independent parts '
+                    'of calculations on a network.')
+    parser.add_argument('network',
+                        help='a JSON file containing a network, or the name '
+                             'of a network in pyphi.examples')
+    parser.add_argument('--all-subsystems', action='store_true',
+                        help='precompute for every subsystem, not just the '
+                             'whole network')
+    parser.add_argument('--serial', action='store_true',
+                        help="don't precompute in parallel")
+    args = parser.parse_args(argv)
+    network = load_network(args.network)
+    subsystems = None
+    if args.all_subsystems:
+        subsystems = [Subsystem(indices, network) for indices in
+                      utils.powerset(network.node_indices) if indices]
+    counts = precompute(network, subsystems=subsystems,
+                        parallel=not args.serial)
+    for name, count in sorted(counts.items()):
+        print('{}: {}'.format(name.replace('_', ' '), count))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,12 +22,13 @@ install_requires = [
     'joblib >=0.8.0a3, <1.0.0',
     'psutil >= 2.1.1, <3.0.0',
     'marbl-python >=2.0.0, <3.0.0',
-    'pymongo >=2.7.1, <3.0.0',
+    'pymongo >=3.7, <5.0',
     'pyyaml>=3.11, < 4.0'
 ]
 
 test_require = [
     'pytest',
+    'mongomock',
     'coverage',
     'sphinx_rtd_theme'
 ]
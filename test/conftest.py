@@ -4,7 +4,7 @@
 import pytest
 import os
 import shutil
-from pyphi import constants, config, db
+from pyphi import constants, config, compute, db, sqlite_db
 
 import example_networks
 
@@ -14,9 +14,8 @@ log = logging.getLogger()
 # Cache management and fixtures
 # =============================
 
-# Use a test database if database caching is enabled.
-if config.CACHING_BACKEND == constants.DATABASE:
-    db.collection = db.database.test
+# Use a test collection if database caching is enabled.
+config.MONGODB_CONFIG['collection_name'] = 'test'
 
 # Backup location for the existing joblib cache directory.
 BACKUP_CACHE_DIR = config.PERSISTENT_CACHE_DIRECTORY + '.BACKUP'
@@ -32,7 +31,12 @@ def _flush_joblib_cache():
 
 def _flush_database_cache():
     # Flush the `test` collection in the database.
-    return db.database.test.remove({})
+    return db.get_collection().delete_many({})
+
+
+def _flush_sqlite_cache():
+    # Remove all entries from the SQLite database.
+    return sqlite_db.clear()
 
 
 @pytest.fixture
@@ -44,6 +48,8 @@ def flushcache():
             _flush_database_cache()
         elif config.CACHING_BACKEND == constants.FILESYSTEM:
             _flush_joblib_cache()
+        elif config.CACHING_BACKEND == constants.SQLITE:
+            _flush_sqlite_cache()
     return cache_flusher
 
 
@@ -92,6 +98,13 @@ def s():
     return example_networks.s()
 
 
+@pytest.fixture()
+def big_mip(s, monkeypatch):
+    """The |BigMip| of ``s``, computed without parallel cut evaluation."""
+    monkeypatch.setattr(config, 'PARALLEL_CUT_EVALUATION', False)
+    return compute.big_mip(s)
+
+
 @pytest.fixture()
 def s_empty():
     return example_networks.s_empty()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from pyphi import archive, compute, serialize
+from pyphi.models import Constellation
+from pyphi.subsystem import Subsystem
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip(s, big_mip, tmpdir, mmap):
+    filename = str(tmpdir.join('results.pyphi'))
+    other = s.network.with_state((0, 0, 0), (0, 0, 0))
+    objects = [big_mip, compute.constellation(s), s.network, other,
+               Constellation()]
+    assert archive.save(filename, objects) == len(objects)
+    results = archive.load(filename, mmap=mmap)
+    assert len(results) == len(objects)
+    assert results.types() == ['BigMip', 'Constellation', 'Network',
+                               'Network', 'Constellation']
+    summary, expected = results.summaries()[0], serialize.summary(big_mip)
+    assert summary['phi'] == expected['phi']
+    assert summary['cut'] == expected['cut']
+    assert list(summary['concepts']) == expected['concepts']
+    assert results.summaries()[1:] == [None] * 4
+    loaded = list(results)
+    assert loaded == objects
+    assert loaded[0].cut == big_mip.cut
+    assert loaded[0].subsystem is loaded[1][0].subsystem
+    # Networks in different states share their arrays and caches.
+    assert loaded[3]._marbl_cache is loaded[2]._marbl_cache
+
+
+def test_constellation_of_cut_subsystem(big_mip, tmpdir):
+    filename = str(tmpdir.join('results.pyphi'))
+    archive.save(filename, [big_mip.partitioned_constellation])
+    constellation = archive.load(filename)[0]
+    assert constellation == big_mip.partitioned_constellation
+    assert constellation[0].subsystem.cut == big_mip.cut
+
+
+def test_close(big_mip, tmpdir):
+    filename = str(tmpdir.join('results.pyphi'))
+    archive.save(filename, [big_mip])
+    with archive.load(filename) as results:
+        result = results[0]
+    assert result == big_mip
+    with pytest.raises(ValueError):
+        results[0]
+
+
+def test_float32(big_mip, tmpdir):
+    filename = str(tmpdir.join('results.pyphi'))
+    archive.save(filename, [big_mip], float32=True)
+    result = archive.load(filename)[0]
+    assert result.phi == big_mip.phi
+    for c, expected in zip(result.unpartitioned_constellation,
+                           big_mip.unpartitioned_constellation):
+        assert np.allclose(c.cause.repertoire, expected.cause.repertoire)
+
+
+def test_invalid_files(s, tmpdir):
+    filename = str(tmpdir.join('results.pyphi'))
+    with pytest.raises(TypeError):
+        archive.save(filename, [Subsystem(s.node_indices, s.network)])
+    writer = archive.ArchiveWriter(filename)
+    writer.add(s.network)
+    writer._file.flush()
+    with pytest.raises(serialize.FormatError):
+        archive.load(filename)
+    writer.close()
+    # Archives aren't completed when an exception escapes the writer.
+    incomplete = str(tmpdir.join('incomplete.pyphi'))
+    with pytest.raises(RuntimeError):
+        with archive.ArchiveWriter(incomplete) as writer:
+            writer.add(s.network)
+            raise RuntimeError
+    with pytest.raises(serialize.FormatError):
+        archive.load(incomplete)
+    assert archive.load(filename)[0] == s.network
+    data = bytearray(open(filename, 'rb').read())
+    data[len(archive.MAGIC)] += 1
+    with open(filename, 'wb') as f:
+        f.write(bytes(data))
+    with pytest.raises(serialize.FormatError):
+        archive.load(filename)
@@ -5,7 +5,8 @@ import pickle
 import pytest
 import numpy as np
 
-from pyphi import constants, config, compute, models, utils, convert, Network
+from pyphi import (constants, config, compute, models, utils, convert, Network,
+                   Subsystem)
 from pyphi.constants import DIRECTIONS, PAST, FUTURE
 
 
@@ -318,6 +319,22 @@ def test_big_mip_noised_example_parallel(s_noised, flushcache,
     config.PARALLEL_CUT_EVALUATION, config.NUMBER_OF_CORES = initial
 
 
+@pytest.mark.parametrize('backend', ['multiprocessing', 'threading'])
+def test_big_mip_standard_example_parallel_concepts(s, backend, monkeypatch,
+                                                    flushcache,
+                                                    restore_fs_cache):
+    flushcache()
+    monkeypatch.setattr(config, 'PARALLEL_BACKEND', backend)
+    monkeypatch.setattr(config, 'PARALLEL_CUT_EVALUATION', True)
+    monkeypatch.setattr(config, 'PARALLEL_CONCEPT_EVALUATION', True)
+    monkeypatch.setattr(config, 'NUMBER_OF_CORES', 2)
+
+    mip = compute.big_mip(s)
+    check_mip(mip, standard_answer)
+    # Jobs don't leave the calling thread marked as a worker.
+    assert not compute._worker.active
+
+
 # TODO!! add more assertions for the smaller subsystems
 def test_complexes_standard(standard, flushcache, restore_fs_cache):
     flushcache()
@@ -432,3 +449,128 @@ def test_big_mip_macro(macro_s, flushcache, restore_fs_cache):
     flushcache()
     mip = compute.big_mip(macro_s)
     check_mip(mip, macro_answer)
+
+
+def test_big_phi_by_state(standard, flushcache, restore_fs_cache):
+    flushcache()
+    states = [(1, 0, 0), ((0, 1, 1), (0, 0, 1)), (1, 1, 1)]
+    for parallel in (False, True):
+        table = compute.big_phi_by_state(
+            standard.tpm, states=states, cm=standard.connectivity_matrix,
+            node_indices=(0, 1), parallel=parallel)
+        assert len(table) == 3
+        assert table['past_state'].tolist() == [[1, 0, 0], [0, 1, 1],
+                                                [1, 1, 1]]
+        assert table['current_state'].tolist() == [[1, 0, 0], [0, 0, 1],
+                                                   [1, 1, 1]]
+        for row in table:
+            network = Network(standard.tpm, tuple(row['current_state']),
+                              tuple(row['past_state']),
+                              connectivity_matrix=standard.connectivity_matrix)
+            subsystem = Subsystem((0, 1), network)
+            assert utils.phi_eq(row['phi'], compute.big_phi(subsystem))
+
+
+def test_big_phi_by_state_all_states(standard, flushcache, restore_fs_cache):
+    flushcache()
+    table = compute.big_phi_by_state(standard.tpm, parallel=False)
+    assert len(table) == 8
+    phi = table['phi'][table['current_state'].tolist().index([1, 0, 0])]
+    assert round(phi, PRECISION) == standard_answer['phi']
+
+
+def test_stream_big_phi(standard, monkeypatch, flushcache, restore_fs_cache):
+    flushcache()
+    computed = []
+    big_phis_of_states = compute._big_phis_of_states
+
+    def record(network, node_indices, pairs):
+        computed.extend(pairs)
+        return big_phis_of_states(network, node_indices, pairs)
+
+    monkeypatch.setattr(compute, '_big_phis_of_states', record)
+    consumed = []
+
+    def trajectory():
+        for state in [(1, 0, 0), (0, 1, 1), (1, 0, 0), (1, 0, 0), (0, 1, 1),
+                      ((1, 1, 0), (1, 0, 0))]:
+            consumed.append(state)
+            yield state
+
+    stream = compute.stream_big_phi(standard.tpm, trajectory(),
+                                    cm=standard.connectivity_matrix,
+                                    window=2, cache_size=1, parallel=False)
+    assert round(next(stream), PRECISION) == standard_answer['phi']
+    # Only the first window has been consumed.
+    assert len(consumed) == 2
+    phis = [round(phi, PRECISION) for phi in stream]
+    assert len(consumed) == 6
+    # Repeated states in a window are computed once, and only the most
+    # recently used state is kept between windows.
+    a, b = ((1, 0, 0), (1, 0, 0)), ((0, 1, 1), (0, 1, 1))
+    assert computed == [a, b, a, b, ((1, 1, 0), (1, 0, 0))]
+    expected = compute.big_phi_by_state(standard.tpm, states=consumed,
+                                        cm=standard.connectivity_matrix,
+                                        parallel=False)['phi']
+    assert phis == [round(phi, PRECISION) for phi in expected[1:]]
+
+
+def test_stream_big_phi_parallel(standard, flushcache, restore_fs_cache):
+    flushcache()
+    states = [(1, 0, 0), (1, 1, 1), (1, 0, 0), (0, 1, 1)]
+    phis = list(compute.stream_big_phi(standard.tpm, iter(states), window=3))
+    expected = compute.big_phi_by_state(standard.tpm, states=states,
+                                        parallel=False)['phi']
+    assert np.allclose(phis, expected)
+
+
+def test_complex_candidates(standard):
+    # Node 1 has no input from node 0, so {0, 1} isn't strongly connected.
+    assert compute._complex_candidates(standard) == [
+        (0,), (1,), (2,), (0, 2), (1, 2), (0, 1, 2)]
+    # Node 2 only has an input from node 0, so {1, 2} isn't strongly
+    # connected.
+    cm = np.array([[1, 1, 1],
+                   [1, 1, 0],
+                   [0, 0, 1]])
+    network = Network(standard.tpm, standard.current_state,
+                      standard.past_state, connectivity_matrix=cm)
+    assert compute._complex_candidates(network) == [(0,), (1,), (2,), (0, 1)]
+
+
+@pytest.mark.parametrize('parallel,backend', [
+    (False, 'multiprocessing'),
+    (True, 'multiprocessing'),
+    (True, 'threading')])
+def test_main_complex(standard, parallel, backend, monkeypatch, flushcache,
+                      restore_fs_cache):
+    flushcache()
+    monkeypatch.setattr(config, 'PARALLEL_COMPLEX_EVALUATION', parallel)
+    monkeypatch.setattr(config, 'PARALLEL_BACKEND', backend)
+    parallel_cut_evaluation = config.PARALLEL_CUT_EVALUATION
+    compute.main_complex.cache_clear()
+    main = compute.main_complex(standard)
+    assert main == max(compute.complexes(standard))
+    assert main.subsystem.node_indices == (0, 1, 2)
+    assert round(main.phi, PRECISION) == standard_answer['phi']
+    # Workers don't change the configuration.
+    assert config.PARALLEL_CUT_EVALUATION == parallel_cut_evaluation
+
+
+def test_main_complex_reducible(reducible, flushcache, restore_fs_cache):
+    flushcache()
+    compute.main_complex.cache_clear()
+    main = compute.main_complex(reducible.network)
+    assert main.phi == 0
+    assert main.subsystem.node_indices == (0, 1)
+
+
+def test_concept_distances(s, flushcache, restore_fs_cache):
+    flushcache()
+    C = compute.constellation(s) + (s.null_concept,)
+    distances = compute.concept_distances(C, C[1:])
+    assert distances.shape == (len(C), len(C) - 1)
+    for i, c1 in enumerate(C):
+        for j, c2 in enumerate(C[1:]):
+            assert np.isclose(distances[i, j],
+                              compute.concept_distance(c1, c2))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import joblib
+import pytest
+
+from pyphi import cache_namespace, config, constants, db, memory, sqlite_db
+
+
+def test_namespace_depends_on_result_settings(monkeypatch):
+    namespace = cache_namespace.current()
+    assert cache_namespace.current() == namespace
+    monkeypatch.setattr(config, 'PRECISION', config.PRECISION + 1)
+    assert cache_namespace.current() != namespace
+    monkeypatch.undo()
+    assert cache_namespace.current() == namespace
+
+
+def test_keys_are_namespaced(monkeypatch):
+    key = db.generate_key((1, 2))
+    assert cache_namespace.namespace_of(key) == cache_namespace.current()
+    assert cache_namespace.namespace_of(12345) == cache_namespace.LEGACY
+    monkeypatch.setattr(config, 'NORMALIZE_TPMS', not config.NORMALIZE_TPMS)
+    assert db.generate_key((1, 2)) != key
+
+
+@pytest.fixture
+def sqlite_backend(tmpdir, monkeypatch):
+    monkeypatch.setattr(config, 'CACHING_BACKEND', constants.SQLITE)
+    monkeypatch.setattr(config, 'SQLITE_CONFIG', {
+        'filename': str(tmpdir.join('cache.sqlite3')),
+        'batch_size': 100,
+        'timeout': 5
+    })
+    sqlite_db.close()
+    sqlite_db.clear()
+    yield
+    sqlite_db.close()
+
+
+def test_list_and_prune_database_namespaces(sqlite_backend, monkeypatch):
+    sqlite_db.insert(12345, 'legacy')
+    sqlite_db.insert(cache_namespace.key('a'), 'old')
+    old = cache_namespace.current()
+    old_fingerprint = cache_namespace.fingerprint()
+    monkeypatch.setattr(config, 'PRECISION', config.PRECISION + 1)
+    new = cache_namespace.current()
+    sqlite_db.insert(cache_namespace.key('a'), 'new')
+
+    namespaces = cache_namespace.namespaces()
+    assert list(namespaces) == sorted([cache_namespace.LEGACY, old, new])
+    assert namespaces[old] == old_fingerprint
+    assert namespaces[new]['PRECISION'] == config.PRECISION
+    assert namespaces[cache_namespace.LEGACY] is None
+
+    assert sorted(cache_namespace.prune()) == sorted([cache_namespace.LEGACY,
+                                                      old])
+    assert list(cache_namespace.namespaces()) == [new]
+    assert sqlite_db.find(cache_namespace.key('a')) == 'new'
+    assert sqlite_db.find(cache_namespace.key('a', old)) is None
+
+
+def test_filesystem_namespaces(tmpdir, monkeypatch):
+    monkeypatch.setattr(config, 'CACHING_BACKEND', constants.FILESYSTEM)
+    monkeypatch.setattr(config, 'PERSISTENT_CACHE_DIRECTORY', str(tmpdir))
+    monkeypatch.setattr(constants, 'joblib_memory',
+                        joblib.Memory(str(tmpdir), verbose=0))
+    calls = []
+
+    @memory.cache()
+    def square(x):
+        calls.append(x)
+        return x ** 2
+
+    assert square(3) == 9
+    old = cache_namespace.current()
+    monkeypatch.setattr(config, 'PRECISION', config.PRECISION + 1)
+    # Values cached with other settings aren't used.
+    assert square(3) == 9
+    assert square(3) == 9
+    assert calls == [3, 3]
+
+    namespaces = cache_namespace.namespaces()
+    assert set(namespaces) == {old, cache_namespace.current()}
+    assert namespaces[cache_namespace.current()] == \
+        cache_namespace.fingerprint()
+    assert cache_namespace.prune() == [old]
+    assert not os.path.exists(str(tmpdir.join(old)))
+    assert square(3) == 9
+    assert calls == [3, 3]
+
+
+def test_command_line(sqlite_backend, capsys):
+    sqlite_db.insert(cache_namespace.key('a'), 1)
+    sqlite_db.insert(12345, 2)
+    cache_namespace.main(['list'])
+    out = capsys.readouterr()[0]
+    assert '* ' + cache_namespace.current() in out
+    assert '(legacy)' in out
+    cache_namespace.main(['prune'])
+    assert capsys.readouterr()[0].strip() == 'removed (legacy)'
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+
+import numpy as np
+
+from pyphi import cache_stats, memory
+from pyphi.lru_cache import lru_cache
+
+
+@lru_cache(maxsize=2)
+def _double(x):
+    return np.array([2 * x])
+
+
+NAME = __name__ + '._double'
+
+
+def test_lru_caches_are_registered():
+    assert NAME in cache_stats.names()
+    assert 'pyphi.utils.bipartition_indices' in cache_stats.names()
+    assert 'pyphi.subsystem.Subsystem.cause_repertoire' in cache_stats.names()
+    assert 'pyphi.subsystem.mice_cache' in cache_stats.names()
+
+
+def test_lru_cache_counts():
+    _double.cache_clear()
+    for x in (1, 1, 2, 3):
+        _double(x)
+    stats = cache_stats.snapshot(NAME)[NAME]
+    assert (stats.hits, stats.misses, stats.evictions) == (1, 3, 1)
+    assert stats.size == 2
+    assert stats.nbytes >= 2 * np.array([0]).nbytes
+    assert stats.hit_rate == 0.25
+
+
+def test_diff_and_reset():
+    _double.cache_clear()
+    _double(1)
+    before = cache_stats.snapshot()
+    _double(1)
+    _double(2)
+    delta = cache_stats.diff(before, cache_stats.snapshot())
+    assert (delta[NAME].hits, delta[NAME].misses, delta[NAME].size) == (1, 1, 1)
+    cache_stats.reset()
+    stats = cache_stats.snapshot(NAME)[NAME]
+    assert (stats.hits, stats.misses, stats.evictions) == (0, 0, 0)
+    # Resetting the counters doesn't clear the cache...
+    assert stats.size == 2
+    # ...unless asked to.
+    cache_stats.reset(clear=True)
+    assert cache_stats.snapshot(NAME)[NAME].size == 0
+
+
+def test_counter_and_registration():
+    counter = cache_stats.Counter()
+    cache_stats.register('test', lambda: counter.stats(size=0))
+    counter.hit()
+    counter.miss(2)
+    counter.evict()
+    assert cache_stats.snapshot('test')['test'] == (1, 2, 1, 0, None)
+    cache_stats.unregister('test')
+    assert 'test' not in cache_stats.names()
+
+
+def test_mice_cache_is_counted(s):
+    before = cache_stats.snapshot('pyphi.subsystem.mice_cache')
+    s.core_cause(s.nodes)
+    delta = cache_stats.diff(
+        before, cache_stats.snapshot('pyphi.subsystem.mice_cache'))
+    stats = delta['pyphi.subsystem.mice_cache']
+    assert stats.hits + stats.misses > 0
+
+
+class _MemoizedFunc:
+
+    """Stands in for a joblib ``MemorizedFunc`` that always hits or always
+    misses."""
+
+    def __init__(self, func, cached):
+        self.func = func
+        self.cached = cached
+
+    def call(self, *args):
+        return self.func(*args)
+
+    def __call__(self, *args):
+        return self.func(*args) if self.cached else self.call(*args)
+
+
+def test_joblib_hits_are_counted_per_thread():
+    miss = memory._count_joblib_calls(_MemoizedFunc(lambda: None, False))
+
+    def miss_in_another_thread():
+        thread = threading.Thread(target=miss)
+        thread.start()
+        thread.join()
+
+    hit = memory._count_joblib_calls(
+        _MemoizedFunc(miss_in_another_thread, True))
+    before = memory._joblib_counter.stats()
+    hit()
+    after = memory._joblib_counter.stats()
+    assert (after.hits - before.hits, after.misses - before.misses) == (1, 1)
+
+
+def test_format_snapshot():
+    table = cache_stats.format_snapshot(
+        {'a': cache_stats.CacheStats(1, 2, 0, None, 10)})
+    lines = table.split('\n')
+    assert lines[0].split() == ['cache', 'hits', 'misses', 'evictions',
+                                'size', 'nbytes']
+    assert lines[1].split() == ['a', '1', '2', '0', '-', '10']
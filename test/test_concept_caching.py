@@ -11,9 +11,24 @@ import pyphi.concept_caching as cc
 # Unit tests
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-def test_normalized_mechanism():
-    # TODO test_normalized_mechanism
-    pass
+def test_normalized_mechanism(s_complete):
+    mechanism = s_complete.nodes[:2]
+    raw = cc.NormalizedMechanism(mechanism, s_complete, normalize_tpms=False)
+    normalized = cc.NormalizedMechanism(mechanism, s_complete)
+    # Reusing the raw normal form gives the same result.
+    assert cc.NormalizedMechanism(mechanism, s_complete, raw=raw) == normalized
+    # The order of the mechanism nodes doesn't matter.
+    assert cc.NormalizedMechanism(mechanism[::-1], s_complete) == normalized
+    assert hash(cc.NormalizedMechanism(mechanism[::-1], s_complete)) == \
+        hash(normalized)
+    assert len(normalized.marblset[constants.DIRECTIONS[constants.PAST]]) == 2
+
+
+def test_marbls_are_cached_on_the_network(standard):
+    s1 = Subsystem(range(3), standard)
+    s2 = Subsystem(range(3), standard)
+    assert s1.nodes[0].past_marbl is s2.nodes[0].past_marbl
+    assert s1.nodes[0].raw_past_marbl is not s1.nodes[0].past_marbl
 
 
 def test_different_states(big):
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import numpy as np
+import pymongo
+
+from pyphi import (config, constants, db, utils, cache_namespace, cache_stats,
+                   Network, Subsystem)
+import pyphi.concept_caching as cc
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    """Use an in-memory mock of MongoDB as the caching backend."""
+    collection = mongomock.MongoClient().pyphi.test
+    collection.create_index(db.KEY_FIELD, unique=True)
+    monkeypatch.setattr(db, 'get_collection', lambda: collection)
+    # The mock collection starts out without any recorded fingerprints.
+    cache_namespace.forget_fingerprints(db.__name__)
+    monkeypatch.setattr(config, 'CACHING_BACKEND', constants.DATABASE)
+    return collection
+
+
+def test_find_many_and_insert_many(collection):
+    db.insert_many([('a', 1), ('b', [2]), ('a', 3)])
+    assert db.find_many(['a', 'b', 'c']) == {'a': 1, 'b': [2]}
+    # Existing keys are left untouched.
+    db.insert_many([('a', 4), ('c', 5)])
+    assert db.find('a') == 1
+    assert db.find_many([]) == {}
+    db.insert_many([])
+
+
+def test_bulk_concept_caching(collection, standard, monkeypatch):
+    queries = []
+    find = collection.find
+    monkeypatch.setattr(collection, 'find',
+                        lambda *args: queries.append(args) or find(*args))
+    # Concept normalization requires purviews to be contained in the inputs
+    # and outputs of the mechanism, so use a fully connected network.
+    network = Network(standard.tpm, standard.current_state,
+                      standard.past_state,
+                      connectivity_matrix=np.ones((3, 3)))
+    s = Subsystem(range(network.size), network)
+    mechanisms = [m for m in utils.powerset(s.nodes) if m]
+    expected = [s.concept(m) for m in mechanisms]
+
+    computed = cc.concepts(s, mechanisms)
+    assert computed == expected
+    assert not any(getattr(c, 'cached', False) for c in computed)
+    # One query for the raw normalized mechanisms, and one for the fully
+    # normalized mechanisms.
+    assert len(queries) == (2 if config.NORMALIZE_TPMS else 1)
+    assert collection.count_documents({}) > 0
+
+    del queries[:]
+    cached = cc.concepts(s, mechanisms)
+    # Cached concepts don't keep their partitions, so only compare the data
+    # that is stored.
+    for c, e in zip(cached, expected):
+        assert (c.phi, c.mechanism) == (e.phi, e.mechanism)
+        for mice, expected_mice in ((c.cause, e.cause), (c.effect, e.effect)):
+            assert mice.purview == expected_mice.purview
+            assert np.array_equal(mice.repertoire, expected_mice.repertoire)
+    assert all(c.cached for c in cached)
+    assert len(queries) == 1
+
+
+def test_connection_is_lazy_and_per_process(monkeypatch):
+    monkeypatch.setattr(db.pymongo, 'MongoClient', mongomock.MongoClient)
+    db.disconnect()
+    assert db._client is None
+    collection = db.get_collection()
+    assert db.get_collection() is collection
+    # Simulate a fork.
+    monkeypatch.setattr(db, '_pid', -1)
+    assert db.get_collection() is not collection
+    db.disconnect()
+
+
+def test_retry_on_transient_errors(collection, monkeypatch):
+    monkeypatch.setattr(db, '_BACKOFF', 0)
+    db.insert('a', 1)
+    find = collection.find
+    failures = [pymongo.errors.AutoReconnect('connection lost')]
+
+    def flaky_find(*args):
+        if failures:
+            raise failures.pop()
+        return find(*args)
+
+    monkeypatch.setattr(collection, 'find', flaky_find)
+    assert db.find('a') == 1
+    assert not failures
+
+
+def test_fall_back_when_unreachable(monkeypatch):
+    def get_collection():
+        calls.append(1)
+        raise pymongo.errors.ConnectionFailure('connection refused')
+
+    calls = []
+    monkeypatch.setattr(db, 'get_collection', get_collection)
+    monkeypatch.setattr(db, '_BACKOFF', 0)
+    monkeypatch.setitem(config.MONGODB_CONFIG, 'retries', 2)
+    monkeypatch.setattr(db, '_unavailable_until', 0)
+    assert db.find('a') is None
+    assert len(calls) == 3
+    # The database isn't tried again for a while.
+    db.insert('a', 1)
+    assert db.find_many(['a']) == {}
+    assert len(calls) == 3
+
+
+def test_namespaces(collection):
+    db.insert_many([(12345, 'legacy'), (db.generate_key(1), 'value')])
+    namespace = cache_namespace.current()
+    assert db.namespaces() == {cache_namespace.LEGACY, namespace}
+    assert (db.find(cache_namespace.fingerprint_key(namespace)) ==
+            cache_namespace.fingerprint())
+    db.delete_namespace(cache_namespace.LEGACY)
+    assert db.namespaces() == {namespace}
+    db.delete_namespace(namespace)
+    assert db.namespaces() == set()
+
+
+def test_namespaces_are_found_without_scanning_keys(collection, monkeypatch):
+    db.insert_many([(db.generate_key(1), 'value')])
+    # A document written before namespaces were stored.
+    collection.insert_one({db.KEY_FIELD: 12345, db.VALUE_FIELD: None})
+    queries = []
+    find = collection.find
+    monkeypatch.setattr(collection, 'find',
+                        lambda *args: queries.append(args) or find(*args))
+    assert db.namespaces() == {cache_namespace.LEGACY,
+                               cache_namespace.current()}
+    # Only the documents without a stored namespace have their keys read.
+    assert [query[0] for query in queries if query[0] is not None] == [
+        {db.NAMESPACE_FIELD: {'$exists': False}}]
+
+
+def test_fingerprints_are_recorded_after_they_are_written(collection,
+                                                          monkeypatch):
+    def get_collection():
+        raise pymongo.errors.ConnectionFailure('connection refused')
+
+    monkeypatch.setattr(db, '_BACKOFF', 0)
+    monkeypatch.setattr(db, '_unavailable_until', 0)
+    monkeypatch.setitem(config.MONGODB_CONFIG, 'retries', 0)
+    monkeypatch.setattr(db, 'get_collection', get_collection)
+    db.insert(db.generate_key(1), 'value')
+    monkeypatch.setattr(db, 'get_collection', lambda: collection)
+    monkeypatch.setattr(db, '_unavailable_until', 0)
+    db.insert(db.generate_key(2), 'value')
+    namespace = cache_namespace.current()
+    assert (db.find(cache_namespace.fingerprint_key(namespace)) ==
+            cache_namespace.fingerprint())
+
+
+def test_size(collection, monkeypatch):
+    db.insert_many([('a', 1), ('b', 2)])
+    monkeypatch.setattr(collection.database, 'command',
+                        lambda command, name: {'size': 100}, raising=False)
+    assert db.size() == (2, 100)
+    snapshot = cache_stats.snapshot('pyphi.concept_caching')
+    assert snapshot['pyphi.concept_caching'][3:] == (2, 100)
+
+
+def test_size_while_unreachable(monkeypatch):
+    def get_collection():
+        calls.append(1)
+        raise pymongo.errors.ConnectionFailure('connection refused')
+
+    calls = []
+    monkeypatch.setattr(db, 'get_collection', get_collection)
+    monkeypatch.setattr(db, '_unavailable_until', float('inf'))
+    monkeypatch.setattr(config, 'CACHING_BACKEND', constants.DATABASE)
+    assert cache_stats.snapshot(
+        'pyphi.concept_caching')['pyphi.concept_caching'][3:] == (None, None)
+    assert not calls
+
+
+def test_connection_timeouts_are_configured(monkeypatch):
+    clients = []
+
+    def client(*args, **kwargs):
+        clients.append(kwargs)
+        return mongomock.MongoClient()
+
+    monkeypatch.setattr(db.pymongo, 'MongoClient', client)
+    monkeypatch.setitem(config.MONGODB_CONFIG, 'timeout', 0.5)
+    db.disconnect()
+    db.get_collection()
+    assert clients[0]['serverSelectionTimeoutMS'] == 500
+    assert clients[0]['connectTimeoutMS'] == 500
+    db.disconnect()
+
+
+def test_failures_do_not_close_the_shared_client(monkeypatch):
+    monkeypatch.setattr(db.pymongo, 'MongoClient', mongomock.MongoClient)
+    monkeypatch.setattr(db, '_BACKOFF', 0)
+    monkeypatch.setattr(db, '_unavailable_until', 0)
+    db.disconnect()
+    collection = db.get_collection()
+    client = db._client
+    closed = []
+    monkeypatch.setattr(client, 'close', lambda: closed.append(1),
+                        raising=False)
+    failures = [pymongo.errors.AutoReconnect('connection lost')]
+
+    def operation(collection):
+        if failures:
+            raise failures.pop()
+        return collection
+
+    # The next attempt uses a new client, and the old one is left open for
+    # the threads that may still be using it.
+    assert db._call(operation) is not collection
+    assert db._client is not client
+    assert not closed
+    db.disconnect()
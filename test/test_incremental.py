@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from pyphi import Subsystem, compute, config, incremental, utils
+
+
+EDITS = [
+    dict(connections={(0, 2): 0}),
+    dict(connections={(2, 0): 0}),
+    dict(node_tpms={1: 0.5}),
+    dict(node_tpms={0: 0.1}, connections={(2, 1): 0}),
+]
+
+
+def test_changed_nodes(standard):
+    network = incremental.derive(standard, node_tpms={1: 0.5},
+                                 connections={(0, 2): 0})
+    assert incremental.changed_nodes(standard, network) == (1, 2)
+    assert np.all(network.tpm[..., 1] == 0.5)
+    assert network.connectivity_matrix[0, 2] == 0
+    assert incremental.changed_nodes(standard, standard) == ()
+    with pytest.raises(ValueError):
+        incremental.changed_nodes(
+            standard, standard.with_state((0, 0, 0), (0, 0, 0)))
+
+
+@pytest.mark.parametrize('edit', EDITS)
+def test_derive_matches_full_computation(s, edit, monkeypatch):
+    monkeypatch.setattr(config, 'PARALLEL_CUT_EVALUATION', False)
+    analysis = incremental.Analysis(s)
+    assert utils.phi_eq(analysis.big_mip.phi, compute.big_mip(s).phi)
+    derived = analysis.derive(**edit)
+    network = incremental.derive(s.network, **edit)
+    expected = compute.big_mip(Subsystem(s.node_indices, network))
+    assert derived.subsystem.network == network
+    assert utils.phi_eq(derived.big_mip.phi, expected.phi)
+    assert (sorted(round(c.phi, 5)
+                   for c in derived.big_mip.unpartitioned_constellation) ==
+            sorted(round(c.phi, 5)
+                   for c in expected.unpartitioned_constellation))
+
+
+def test_only_affected_causes_are_recomputed(s, monkeypatch):
+    monkeypatch.setattr(config, 'PARALLEL_CUT_EVALUATION', False)
+    analysis = incremental.Analysis(s)
+    mechanisms = []
+    core_cause = Subsystem.core_cause
+
+    def record(self, mechanism, purviews=False):
+        mechanisms.append(tuple(n.index for n in mechanism))
+        return core_cause(self, mechanism, purviews=purviews)
+
+    monkeypatch.setattr(Subsystem, 'core_cause', record)
+    analysis.derive(node_tpms={1: 0.5})
+    assert mechanisms
+    assert all(1 in mechanism for mechanism in mechanisms)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import json as _json
+
+import numpy as np
+import pytest
+
+from pyphi import json
+
+
+def test_iterencode_matches_dumps(s, big_mip):
+    assert ''.join(json.iterencode(big_mip)) == json.dumps(big_mip)
+    concept = big_mip.unpartitioned_constellation[0]
+    assert ''.join(json.iterencode(concept)) == json.dumps(concept)
+    assert ''.join(json.iterencode(concept.cause)) == json.dumps(concept.cause)
+    assert ''.join(json.iterencode(s.network)) == json.dumps(s.network)
+
+
+def test_arrays_are_encoded_in_chunks(monkeypatch):
+    monkeypatch.setattr(json, 'ARRAY_CHUNK_SIZE', 3)
+    array = np.arange(14, dtype=float).reshape(2, 7)
+    chunks = list(json.iterencode(array))
+    assert ''.join(chunks) == json.dumps(array.tolist())
+    assert max(len(chunk) for chunk in chunks) < len(json.dumps([0.0] * 4))
+    assert ''.join(json.iterencode(np.array([]))) == '[]'
+
+
+def test_dump_converts_keys_like_dumps():
+    obj = {1: 2, 1.5: 3, True: 4, None: 5, 'a': 6}
+    f = io.StringIO()
+    json.dump(obj, f)
+    assert f.getvalue() == json.dumps(obj)
+    with pytest.raises(TypeError):
+        json.dump({(1, 2): 3}, io.StringIO())
+
+
+def test_dump_without_partitioned_repertoires(big_mip):
+    f = io.StringIO()
+    json.dump(big_mip, f, partitioned_repertoires=False)
+    loaded = _json.loads(f.getvalue())
+    full = _json.loads(json.dumps(big_mip))
+    for concept, expected in zip(loaded['unpartitioned_constellation'],
+                                 full['unpartitioned_constellation']):
+        assert 'partitioned_repertoire' not in concept['cause']
+        assert 'partitioned_repertoire' not in concept['cause']['mip']
+        del expected['cause']['partitioned_repertoire']
+        del expected['cause']['mip']['partitioned_repertoire']
+        del expected['effect']['partitioned_repertoire']
+        del expected['effect']['mip']['partitioned_repertoire']
+        assert concept == expected
+
+
+def test_dump_does_not_cache_expanded_repertoires(big_mip):
+    subsystems = (big_mip.subsystem, big_mip.cut_subsystem)
+    sizes = [len(subsystem._expanded_repertoires) for subsystem in subsystems]
+    json.dump(big_mip, io.StringIO())
+    assert [len(subsystem._expanded_repertoires)
+            for subsystem in subsystems] == sizes
+
+
+def test_loads_rebuilds_big_mip(s, big_mip):
+    encoded = json.dumps(big_mip)
+    assert _json.loads(encoded)['pyphi']['class'] == 'BigMip'
+    loaded = json.loads(encoded)
+    assert loaded == big_mip
+    assert loaded.cut == big_mip.cut
+    assert loaded.subsystem.network == s.network
+    assert loaded.cut_subsystem.network is loaded.subsystem.network
+    concept = loaded.unpartitioned_constellation[0]
+    assert concept.subsystem is loaded.subsystem
+    # Repertoires are converted to arrays when first accessed.
+    mip = concept.cause.mip
+    assert '_partitioned_repertoire' not in mip.__dict__
+    assert isinstance(mip.partitioned_repertoire, np.ndarray)
+    assert np.array_equal(
+        mip.partitioned_repertoire,
+        big_mip.unpartitioned_constellation[0].cause.mip.partitioned_repertoire)
+    # Decoded objects are encoded as the originals.
+    assert json.dumps(loaded) == encoded
+
+
+def test_loads_concept_needs_subsystem(s, big_mip):
+    concept = big_mip.unpartitioned_constellation[1]
+    encoded = json.dumps(concept)
+    with pytest.raises(ValueError):
+        json.loads(encoded)
+    assert json.loads(encoded, subsystem=s) == concept
+    assert json.load(io.StringIO(encoded), subsystem=s) == concept
+
+
+def test_loads_plain_values():
+    assert json.loads(json.dumps({'a': [1, 2]})) == {'a': [1, 2]}
+    assert json.loads(json.dumps(np.arange(3))) == [0, 1, 2]
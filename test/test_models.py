@@ -2,9 +2,11 @@
 # -*- coding: utf-8 -*-
 
 from collections import namedtuple
+import pickle
+
 import numpy as np
 
-from pyphi import models
+from pyphi import models, compute, Subsystem
 from pyphi import constants
 
 
@@ -273,6 +275,61 @@ def test_concept_equality():
     assert concept != not_quite
 
 
+def test_concept_fingerprint(s):
+    concept = s.concept(s.nodes[1:])
+    # The same concept in the subsystem with a cut applied.
+    cut_subsystem = Subsystem(s.node_indices, s.network,
+                              cut=models.Cut((0,), (1, 2)))
+    same = concept._replace(subsystem=cut_subsystem)
+    assert concept.emd_eq(same)
+    assert concept.fingerprint == same.fingerprint
+    other = s.concept(s.nodes[:1])
+    assert not concept.emd_eq(other)
+    assert concept.fingerprint != other.fingerprint
+    # Repertoires whose zeros have different signs are equal.
+    repertoire = concept.effect.repertoire
+    effect = models.Mice(concept.effect.mip._replace(
+        unpartitioned_repertoire=np.where(repertoire == 0, -0.0, repertoire)))
+    assert concept._replace(effect=effect).fingerprint == concept.fingerprint
+
+
+def test_constellation_columns(s):
+    constellation = compute.constellation(s)
+    assert isinstance(constellation, models.Constellation)
+    assert constellation == tuple(constellation)
+    assert np.array_equal(constellation.phis,
+                          [c.phi for c in constellation])
+    for concept, repertoire in zip(constellation,
+                                   constellation.expanded_cause_repertoires):
+        assert np.array_equal(concept.expand_cause_repertoire(), repertoire)
+    subset = constellation.take([2, 0])
+    assert subset == (constellation[2], constellation[0])
+    assert np.array_equal(subset.phis, constellation.phis[[2, 0]])
+    # Columns are recomputed rather than pickled.
+    unpickled = pickle.loads(pickle.dumps(constellation))
+    assert unpickled == constellation
+    assert isinstance(unpickled, models.Constellation)
+    assert not unpickled._columns
+    assert np.array_equal(unpickled.phis, constellation.phis)
+
+
+def test_concept_equality_ignores_normalization(s):
+    concept = s.concept(s.nodes)
+    assert concept._replace(normalized=object()) == concept
+
+
+def test_hashes_are_memoized_but_not_pickled(s):
+    concept = s.concept(s.nodes)
+    assert hash(concept) == hash(concept)
+    assert '_hash' in concept.__dict__
+    assert not hasattr(concept.cause, '__dict__')
+    unpickled = pickle.loads(pickle.dumps(concept))
+    assert unpickled == concept
+    assert '_hash' not in unpickled.__dict__
+    assert '_hash' not in unpickled.cause.mip.__dict__
+    assert hash(unpickled) == hash(concept)
+
+
 def test_concept_repr_str():
     r = namedtuple('object_with_repertoire', ['repertoire'])
     concept = models.Concept(
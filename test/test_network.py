@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import copy
+import pickle
+from collections import OrderedDict
+
 import pytest
 import numpy as np
 
 from pyphi.network import Network
 from pyphi.node import Node
+from pyphi.models import Cut
+from pyphi.subsystem import Subsystem
+from pyphi import network as network_module, utils, cache_stats
 
 
 @pytest.fixture()
@@ -43,3 +50,61 @@ def test_repr(standard):
 
 def test_str(standard):
     print(str(standard))
+
+
+def test_with_state(standard):
+    network = standard.with_state((0, 1, 1), (1, 1, 0))
+    assert network.current_state == (0, 1, 1)
+    assert network.past_state == (1, 1, 0)
+    assert network.tpm is standard.tpm
+    assert network._marbl_cache is standard._marbl_cache
+    expected = Network(standard.tpm, (0, 1, 1), (1, 1, 0),
+                       connectivity_matrix=standard.connectivity_matrix)
+    assert network == expected
+    assert hash(network) == hash(expected)
+    assert utils.stable_hash(network) == utils.stable_hash(expected)
+    assert standard.current_state != network.current_state
+    with pytest.raises(ValueError):
+        standard.with_state((0, 1), (1, 1, 0))
+
+
+def test_node_caches_are_bounded(standard, monkeypatch):
+    monkeypatch.setattr(network_module, '_NODE_CACHE_SIZE', 2)
+    network = Network(standard.tpm, standard.current_state,
+                      standard.past_state,
+                      connectivity_matrix=standard.connectivity_matrix)
+    cache_stats.reset()
+    Subsystem(range(network.size), network)
+    assert len(network._node_tpm_cache) == 2
+    stats = cache_stats.snapshot()['pyphi.network.node_tpm_cache']
+    assert (stats.misses, stats.evictions) == (3, 1)
+    # The TPMs are still cached across states.
+    Subsystem((1, 2), network.with_state((1, 0, 0), (0, 0, 0)),
+              cut=Cut((1,), (2,)))
+    Subsystem((1, 2), network.with_state((1, 0, 0), (0, 0, 0)),
+              cut=Cut((1,), (2,)))
+    stats = cache_stats.snapshot()['pyphi.network.node_tpm_cache']
+    assert stats.hits == 2
+
+
+def test_pickle_shares_caches_of_unpickled_networks(standard, monkeypatch):
+    monkeypatch.setattr(network_module, '_registry', OrderedDict())
+    other = Network(standard.tpm, (0, 0, 0), (0, 0, 0),
+                    connectivity_matrix=standard.connectivity_matrix)
+    data = pickle.dumps(standard)
+    # Pickling doesn't register the network.
+    assert not network_module._registry
+    first = pickle.loads(data)
+    assert first == standard
+    assert first is not standard
+    # Networks unpickled later share the caches of the first one, in the same
+    # or another state, but are new objects.
+    second = pickle.loads(data)
+    assert second == standard
+    assert second is not first
+    assert second._marbl_cache is first._marbl_cache
+    unpickled = pickle.loads(pickle.dumps(other))
+    assert unpickled == other
+    assert unpickled._marbl_cache is first._marbl_cache
+    assert copy.deepcopy(standard) is not standard
+
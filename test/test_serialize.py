@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pickle
+
+import joblib
+import numpy as np
+import pytest
+
+from pyphi import compute, config, constants, memory, serialize
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib', 'lzma'])
+def test_round_trip(s, big_mip, compression, monkeypatch):
+    monkeypatch.setitem(config.CACHE_ENCODING, 'compression', compression)
+    data = serialize.dumps(big_mip)
+    assert data.startswith(serialize.MAGIC)
+    result = serialize.loads(data, subsystem=s)
+    assert result == big_mip
+    assert result.cut == big_mip.cut
+    assert result.cut_subsystem.cut == big_mip.cut_subsystem.cut
+
+
+def test_encoding_is_compact(big_mip):
+    assert len(serialize.dumps(big_mip)) < len(pickle.dumps(big_mip)) / 2
+
+
+def test_float32(s, big_mip, monkeypatch):
+    monkeypatch.setitem(config.CACHE_ENCODING, 'float32', True)
+    encoded = serialize.encode(big_mip)
+    assert encoded['value']['data'].dtype == np.float32
+    result = serialize.decode(encoded, subsystem=s)
+    assert result.phi == big_mip.phi
+    for c, expected in zip(result.unpartitioned_constellation,
+                           big_mip.unpartitioned_constellation):
+        assert c.cause.repertoire.dtype == np.float64
+        assert np.allclose(c.cause.repertoire, expected.cause.repertoire)
+
+
+def test_summary(big_mip):
+    summary = serialize.encode(big_mip)['value']['summary']
+    assert summary['phi'] == big_mip.phi
+    assert summary['cut'] == tuple(big_mip.cut)
+    assert [phi for _, phi in summary['concepts']] == [
+        c.phi for c in big_mip.unpartitioned_constellation]
+
+
+def test_other_values_are_unchanged():
+    assert serialize.loads(serialize.dumps((1, 'a'))) == (1, 'a')
+    # Values stored before the encoding was introduced.
+    assert serialize.loads(None) is None
+    assert serialize.loads({'a': 1}) == {'a': 1}
+
+
+def test_format_version_is_checked(big_mip):
+    data = bytearray(serialize.dumps(big_mip))
+    data[len(serialize.MAGIC)] += 1
+    with pytest.raises(serialize.FormatError):
+        serialize.loads(bytes(data))
+
+
+def _memoized(tmpdir, monkeypatch, calls, **kwargs):
+    """Return a function memoized on the filesystem that computes a
+    BigMip."""
+    monkeypatch.setattr(config, 'CACHING_BACKEND', constants.FILESYSTEM)
+    monkeypatch.setattr(constants, 'joblib_memory',
+                        joblib.Memory(str(tmpdir), verbose=0,
+                                      **kwargs))
+
+    @memory.cache(ignore=['subsystem'])
+    def memoized(cache_key, subsystem):
+        calls.append(cache_key)
+        return compute.big_mip(subsystem)
+
+    return memoized
+
+
+def test_joblib_memoization(s, big_mip, tmpdir, monkeypatch):
+    calls = []
+    memoized = _memoized(tmpdir, monkeypatch, calls)
+    assert memoized(1, s) == big_mip
+    assert memoized(1, s) == big_mip
+    assert calls == [1]
+
+
+def test_cache_misses_return_the_computed_output(s, big_mip, tmpdir,
+                                                monkeypatch):
+    monkeypatch.setattr(config, 'CACHING_BACKEND', constants.FILESYSTEM)
+    monkeypatch.setattr(constants, 'joblib_memory',
+                        joblib.Memory(str(tmpdir), verbose=0))
+
+    @memory.cache(ignore=['subsystem'])
+    def memoized(cache_key, subsystem):
+        return big_mip
+
+    # The computed output isn't decoded from its encoding, which may have
+    # been rounded; only values loaded from the cache are.
+    assert memoized(1, s) is big_mip
+    cached = memoized(1, s)
+    assert cached is not big_mip
+    assert cached == big_mip
+
+
+def test_memory_mapped_loading(s, big_mip, tmpdir, monkeypatch):
+    calls = []
+    memoized = _memoized(tmpdir, monkeypatch, calls, mmap_mode='r')
+    memoized(1, s)
+    result = memoized(1, s)
+    assert result == big_mip
+    repertoire = result.unpartitioned_constellation[0].cause.repertoire
+    assert isinstance(repertoire, np.memmap)
+
+
+def test_summaries(s, big_mip, tmpdir, monkeypatch):
+    memoized = _memoized(tmpdir, monkeypatch, [])
+    assert memory.load_summary(memoized, 1, s) is None
+    memoized(1, s)
+    # Summaries are read from their own files, not from the compressed
+    # outputs.
+    monkeypatch.setattr(memory.joblib, 'load', None)
+    assert memory.load_summary(memoized, 1, s) == serialize.summary(big_mip)
+    assert list(memory.cached_summaries(memoized)) == [
+        serialize.summary(big_mip)]
+
+
+def test_summary_of_uncached_big_mip(s, flushcache, restore_fs_cache):
+    flushcache()
+    assert compute.big_mip_summary(s) is None
+    if config.CACHE_BIGMIPS:
+        big_mip = compute.big_mip(s)
+        assert compute.big_mip_summary(s) == serialize.summary(big_mip)
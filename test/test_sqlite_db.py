@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import numpy as np
+import pytest
+from joblib import Parallel, delayed
+
+from pyphi import config, memory, sqlite_db
+
+
+@pytest.fixture
+def sqlite_config(tmpdir, monkeypatch):
+    """Point the SQLite backend at a fresh database file."""
+    filename = str(tmpdir.join('cache.sqlite3'))
+    monkeypatch.setattr(config, 'SQLITE_CONFIG', {
+        'filename': filename,
+        'batch_size': 3,
+        'timeout': 5
+    })
+    sqlite_db.close()
+    yield filename
+    sqlite_db.close()
+
+
+def _committed_keys(filename):
+    with sqlite3.connect(filename) as connection:
+        return sorted(row[0] for row in
+                      connection.execute('SELECT k FROM cache'))
+
+
+def test_find_missing_key(sqlite_config):
+    assert sqlite_db.find(12345) is None
+
+
+def test_insert_and_find(sqlite_config):
+    value = {'phi': 0.5, 'repertoire': np.arange(4)}
+    sqlite_db.insert(1, value)
+    result = sqlite_db.find(1)
+    assert result['phi'] == 0.5
+    assert np.array_equal(result['repertoire'], np.arange(4))
+
+
+def test_writes_are_batched(sqlite_config):
+    sqlite_db.insert(1, 'a')
+    sqlite_db.insert(2, 'b')
+    # Pending values are visible in this process but not yet committed.
+    assert sqlite_db.find(2) == 'b'
+    assert _committed_keys(sqlite_config) == []
+    # The third value fills the batch.
+    sqlite_db.insert(3, 'c')
+    assert _committed_keys(sqlite_config) == ['1', '2', '3']
+    sqlite_db.insert(4, 'd')
+    sqlite_db.flush()
+    assert _committed_keys(sqlite_config) == ['1', '2', '3', '4']
+
+
+def test_duplicate_keys_are_ignored(sqlite_config):
+    sqlite_db.insert(1, 'first')
+    sqlite_db.flush()
+    sqlite_db.insert(1, 'second')
+    sqlite_db.flush()
+    assert sqlite_db.find(1) == 'first'
+
+
+def test_wal_mode(sqlite_config):
+    sqlite_db.insert(1, 'a')
+    sqlite_db.flush()
+    with sqlite3.connect(sqlite_config) as connection:
+        mode = connection.execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal'
+
+
+def test_clear_and_size(sqlite_config):
+    sqlite_db.insert(1, 'a')
+    sqlite_db.flush()
+    sqlite_db.insert(2, 'b')
+    count, nbytes = sqlite_db.size()
+    assert count == 2
+    assert nbytes > 0
+    sqlite_db.clear()
+    assert sqlite_db.size() == (0, 0)
+    assert sqlite_db.find(1) is None
+
+
+def test_find_many_and_insert_many(sqlite_config, monkeypatch):
+    sqlite_db.insert_many([('a', 1), ('b', 2)])
+    # These are still pending.
+    assert _committed_keys(sqlite_config) == []
+    sqlite_db.insert_many([('c', 3), ('a', 4)])
+    assert _committed_keys(sqlite_config) == ['a', 'b', 'c']
+    sqlite_db.insert('d', 5)
+    monkeypatch.setattr(sqlite_db, '_MAX_PARAMETERS', 2)
+    assert sqlite_db.find_many(['a', 'b', 'c', 'd', 'e']) == {
+        'a': 1, 'b': 2, 'c': 3, 'd': 5}
+
+
+def _square(x):
+    return x * x
+
+
+_memoized_square = memory.DbMemoizedFunc(_square, [], store=sqlite_db)
+
+
+def _call_memoized_square(x):
+    return _memoized_square(x)
+
+
+def test_memoized_values_are_stored_by_worker_processes(sqlite_config):
+    # Workers don't fill a batch, and exit without running ``atexit``.
+    config.SQLITE_CONFIG['batch_size'] = 100
+    args = range(4)
+    results = Parallel(n_jobs=2, backend='multiprocessing')(
+        delayed(_call_memoized_square)(x) for x in args)
+    assert results == [0, 1, 4, 9]
+    committed = _committed_keys(sqlite_config)
+    keys = [str(_memoized_square.get_output_key((x,), {})) for x in args]
+    assert all(key in committed for key in keys)
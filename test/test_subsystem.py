@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import pickle
+
+import numpy as np
+
+from pyphi import cache_stats, compute, config, subsystem
+from pyphi.models import Cut
 from pyphi.subsystem import Subsystem
 
 
@@ -34,3 +40,53 @@ def test_len(s, big_subsys_0_thru_3, big_subsys_all):
 
 def test_hash(s):
     print(hash(s))
+
+
+def test_expand_repertoire_is_cached(s):
+    name = 'pyphi.subsystem.expanded_repertoire_cache'
+    concept = compute.concept(s, s.nodes)
+    before = cache_stats.snapshot(name)
+    expanded = concept.expand_cause_repertoire()
+    again = concept.expand_cause_repertoire()
+    stats = cache_stats.diff(before, cache_stats.snapshot(name))[name]
+    assert (stats.hits, stats.misses) == (1, 1)
+    assert again is expanded
+    assert not expanded.flags.writeable
+    # Equal repertoires share an entry.
+    assert s.expand_cause_repertoire(concept.cause.purview,
+                                     np.array(concept.cause.repertoire)) is \
+        expanded
+
+
+def test_expanded_repertoire_cache_is_bounded(s, monkeypatch):
+    monkeypatch.setattr(subsystem, '_EXPANDED_REPERTOIRE_CACHE_SIZE', 2)
+    s = Subsystem(s.node_indices, s.network)
+    concepts = [compute.concept(s, (node,)) for node in s.nodes]
+    for concept in concepts:
+        concept.expand_cause_repertoire()
+    assert len(s._expanded_repertoires) == 2
+    # Partitioned and uncached repertoires aren't stored.
+    concepts[0].expand_partitioned_cause_repertoire()
+    concepts[0].expand_effect_repertoire(cache=False)
+    concepts[0].json_dict()
+    assert len(s._expanded_repertoires) == 2
+    assert all(key[0] == 'past' for key in s._expanded_repertoires)
+
+
+def test_pickle(s, monkeypatch):
+    monkeypatch.setattr(config, 'PARALLEL_CUT_EVALUATION', False)
+    cut = Subsystem(s.node_indices, s.network, cut=Cut((0,), (1, 2)))
+    unpickled = pickle.loads(pickle.dumps(cut))
+    assert unpickled == cut and unpickled.cut == cut.cut
+    assert np.array_equal(unpickled.connectivity_matrix,
+                          cut.connectivity_matrix)
+    mip = compute.big_mip(s)
+    unpickled = pickle.loads(pickle.dumps(mip))
+    assert unpickled == mip
+    assert unpickled.subsystem.network == s.network
+    # The networks of unpickled results share their caches.
+    again = pickle.loads(pickle.dumps(mip))
+    assert (again.subsystem.network._marbl_cache is
+            unpickled.subsystem.network._marbl_cache)
+    assert unpickled.cut == mip.cut
+
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from pyphi import compute, config, symmetry
+
+
+def test_automorphisms(s, rule152_s):
+    assert symmetry.automorphisms(s) == (tuple(range(3)),)
+    rotations = symmetry.automorphisms(rule152_s)
+    assert len(rotations) == 5
+    assert tuple(range(5)) in rotations
+    assert (1, 2, 3, 4, 0) in rotations
+
+
+def test_relabel_concept(rule152_s):
+    sigma = (1, 2, 3, 4, 0)
+    concept = rule152_s.concept(rule152_s.nodes[:2])
+    relabeled = symmetry.relabel_concept(concept, sigma, rule152_s)
+    expected = rule152_s.concept(rule152_s.nodes[1:3])
+    assert relabeled == expected
+    assert relabeled.cause.purview == expected.cause.purview
+    assert np.array_equal(relabeled.cause.mip.partitioned_repertoire,
+                          expected.cause.mip.partitioned_repertoire)
+
+
+def test_orbits(rule152_s):
+    mechanisms = [rule152_s.indices2nodes(m) for m in
+                  [(0,), (1,), (2,), (0, 1), (1, 3), (2, 3), (0, 2)]]
+    orbits = symmetry.orbits(rule152_s, mechanisms)
+    assert sorted(orbits) == [0, 3, 4]
+    assert [i for i, _ in orbits[0]] == [1, 2]
+    assert [i for i, _ in orbits[3]] == [5]
+    assert [i for i, _ in orbits[4]] == [6]
+
+
+def test_constellation_reuses_symmetric_concepts(micro_s, monkeypatch):
+    expected = compute.constellation(micro_s)
+    monkeypatch.setattr(config, 'REUSE_SYMMETRIC_CONCEPTS', True)
+    result = compute.constellation(micro_s)
+    assert len(result) == len(expected)
+    for concept, other in zip(result, expected):
+        assert concept == other
+        assert concept.mechanism == other.mechanism
+        assert np.array_equal(concept.cause.repertoire, other.cause.repertoire)
+        assert np.array_equal(concept.effect.repertoire,
+                              other.effect.repertoire)
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
+import subprocess
+import sys
 import numpy as np
 
-from pyphi import utils, constants, models
+import pyphi
+from pyphi import utils, constants, models, examples
 
 
 def test_apply_cut():
@@ -111,3 +115,50 @@ def test_emd_same_distributions():
 def test_uniform_distribution():
     assert np.array_equal(utils.uniform_distribution(3),
                           (np.ones(8)/8).reshape([2]*3))
+
+
+def test_stable_hash():
+    a = np.arange(4).reshape(2, 2)
+    assert utils.stable_hash(a) == utils.stable_hash(np.asfortranarray(a))
+    assert utils.stable_hash(a) != utils.stable_hash(a.reshape(4))
+    assert utils.stable_hash(a) != utils.stable_hash(a.astype(float))
+    assert (utils.stable_hash({'a': 1, 'b': (2, None)}) ==
+            utils.stable_hash({'b': (2, None), 'a': 1}))
+    assert utils.stable_hash((1, 2)) != utils.stable_hash(((1, 2),))
+    assert utils.stable_hash(1) != utils.stable_hash('1')
+
+
+def test_stable_hash_is_the_same_in_other_processes():
+    # String hashing is randomized per process, so the built-in hash of a
+    # subsystem would not be stable.
+    code = ('from pyphi import examples, utils; '
+            'print(utils.stable_hash(examples.basic_subsystem()))')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(pyphi.__file__)))
+    env = dict(os.environ, PYTHONHASHSEED='random', PYTHONPATH=root)
+    digests = {subprocess.check_output([sys.executable, '-c', code],
+                                       env=env).decode().split()[-1]
+               for i in range(2)}
+    assert digests == {utils.stable_hash(examples.basic_subsystem())}
+
+
+def test_hamming_emd_matrix():
+    np.random.seed(0)
+    d1s = np.random.random((3, 2, 1, 2))
+    d1s /= d1s.sum(axis=(1, 2, 3), keepdims=True)
+    d2s = np.concatenate([d1s[:1], np.random.random((2, 2, 1, 2))])
+    d2s[1:] /= d2s[1:].sum(axis=(1, 2, 3), keepdims=True)
+    distances = utils.hamming_emd_matrix(d1s, d2s)
+    assert distances.shape == (3, 3)
+    assert distances[0, 0] == 0
+    for i in range(3):
+        for j in range(3):
+            assert np.isclose(distances[i, j],
+                              utils.hamming_emd(d1s[i], d2s[j]))
+    assert utils.hamming_emd_matrix(d1s, d2s[:0]).shape == (3, 0)
+
+
+def test_unique_rows():
+    rows = np.array([[0.5, 0.5], [1.0, 0.0], [0.5, 0.5], [0.0, 1.0]])
+    unique, inverse = utils._unique_rows(rows)
+    assert len(unique) == 3
+    assert np.array_equal(unique[inverse], rows)
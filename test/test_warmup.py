@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pytest
+
+from pyphi import (config, constants, utils, warmup, subsystem, Subsystem,
+                   cache_stats)
+from pyphi.models import Cut
+
+
+@pytest.fixture
+def cache_dir(tmpdir, monkeypatch):
+    """Store precomputed values in a temporary filesystem cache."""
+    monkeypatch.setattr(config, 'PERSISTENT_CACHE_DIRECTORY', str(tmpdir))
+    monkeypatch.setattr(constants, 'joblib_memory',
+                        joblib.Memory(str(tmpdir), verbose=0))
+    monkeypatch.setattr(subsystem, '_unconstrained_repertoires',
+                        OrderedDict())
+    return tmpdir
+
+
+@pytest.mark.skipif(config.CACHING_BACKEND != constants.FILESYSTEM,
+                    reason='Only the filesystem cache is redirected.')
+def test_precompute(cache_dir, standard, monkeypatch):
+    counts = warmup.precompute(standard, parallel=False)
+    assert counts == {'hamming_matrices': 3, 'bipartition_tables': 4,
+                      'subsystems': 1, 'cuts': 6}
+    for N in range(1, 4):
+        assert np.array_equal(np.load(utils.hamming_matrix_filename(N)),
+                              utils.compute_hamming_matrix(N))
+
+    # Repertoires are looked up rather than computed.
+    s = Subsystem(range(3), standard)
+    expected = s.effect_repertoire((), s.nodes[:2])
+    # The node TPMs of the cuts are cached.
+    cut = Cut((0,), (1, 2))
+    assert ((s.node_indices, cut, s._boundary_state, 0) in
+            standard._node_tpm_cache)
+    monkeypatch.setattr(Subsystem, '_get_repertoire', None)
+    assert np.array_equal(s.unconstrained_effect_repertoire(s.nodes[:2]),
+                          expected)
+    # They are shared by the cuts and other states of the subsystem.
+    for other in (Subsystem(range(3), standard, cut=cut),
+                  Subsystem(range(3), standard.with_state((1, 1, 1),
+                                                          (1, 1, 1)))):
+        assert np.array_equal(
+            other.unconstrained_effect_repertoire(other.nodes[:2]), expected)
+
+    # Precomputing again loads the stored values.
+    calls = []
+    monkeypatch.setattr(warmup, 'unconstrained_repertoires', calls.append)
+    monkeypatch.setattr(subsystem, '_unconstrained_repertoires',
+                        OrderedDict())
+    warmup.precompute(standard, parallel=False)
+    assert calls == []
+    assert np.array_equal(s.unconstrained_effect_repertoire(s.nodes[:2]),
+                          expected)
+
+
+@pytest.mark.skipif(config.CACHING_BACKEND != constants.FILESYSTEM,
+                    reason='Only the filesystem cache is redirected.')
+def test_stored_repertoires_are_loaded_in_other_processes(cache_dir, standard,
+                                                          monkeypatch):
+    s = Subsystem(range(3), standard)
+    expected = s.effect_repertoire((), s.nodes[:2])
+    warmup.precompute(standard, parallel=False)
+    # A new process starts without the precomputed tables.
+    monkeypatch.setattr(subsystem, '_unconstrained_repertoires',
+                        OrderedDict())
+    monkeypatch.setattr(Subsystem, '_get_repertoire', None)
+    assert np.array_equal(s.unconstrained_effect_repertoire(s.nodes[:2]),
+                          expected)
+
+
+def test_unconstrained_repertoire_cache_is_bounded(cache_dir, standard,
+                                                   monkeypatch):
+    monkeypatch.setattr(subsystem, '_UNCONSTRAINED_REPERTOIRES_CACHE_SIZE', 2)
+    name = 'pyphi.subsystem.unconstrained_repertoires'
+    before = cache_stats.snapshot(name)
+    for indices in [(0,), (1,), (2,)]:
+        s = Subsystem(indices, standard)
+        s.unconstrained_cause_repertoire(s.nodes)
+    stats = cache_stats.diff(before, cache_stats.snapshot(name))[name]
+    assert stats.size == 2
+    assert stats.evictions == 1
+    assert stats.misses == 3
+
+
+def test_command_line(cache_dir, capsys):
+    warmup.main(['basic_network', '--serial', '--all-subsystems'])
+    out = capsys.readouterr()[0]
+    assert 'subsystems: 7' in out
+    assert os.path.exists(utils.hamming_matrix_filename(3))